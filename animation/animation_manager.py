@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from animation.frameworks.kivsee.renderer.render import Render
-from constants import ANIMATION_OUT_TEMP_DIR, XLIGHTS_SEQUENCE_PATH, CONCEPTUAL_SEQUENCE_PATH
+from animation.frameworks.kivsee.renderer.render import Render, TRANSPORT_JSON
+from constants import ANIMATION_OUT_TEMP_DIR, ANIMATION_HISTORY_FILE, XLIGHTS_SEQUENCE_PATH, CONCEPTUAL_SEQUENCE_PATH
 from animation.frameworks.kivsee.kivsee_framework import KivseeFramework
 from animation.frameworks.framework import Framework
 from animation.frameworks.xlights.xlights_framework import XLightsFramework
@@ -9,6 +9,7 @@ from animation.frameworks.kivsee.kivsee_sequence import KivseeSequence
 from animation.frameworks.conceptual.conceptual_framework import ConceptualFramework
 from animation.frameworks.conceptual.conceptual_sequence import ConceptualSequence
 from animation.frameworks.sequence import Sequence
+from animation.frameworks.step_history import natural_key
 from prompts.knowledge import knowledge_prompts
 import os
 
@@ -28,7 +29,9 @@ class AnimationManager:
         if self.framework_name == 'kivsee':
             self.sequence_manager = KivseeSequence()
             self.framework = KivseeFramework(config=self.config)  # Pass config to KivseeFramework
-            self.renderer = Render()
+            self.renderer = Render(
+                local_stats=self.config.get("local_stats", False),
+                transport=self.config.get("transport", TRANSPORT_JSON))
         elif self.framework_name == 'xlights':
             self.sequence_manager = XlightsSequence(XLIGHTS_SEQUENCE_PATH)
             self.framework = XLightsFramework()
@@ -73,14 +76,42 @@ class AnimationManager:
         else:
             print("Replay method is not available for this framework.")
 
-    def render(self, animation_data, song_name, store_animation=False):
-        """Render the animation using the current framework's renderer."""
+    def render(self,
+               animation_data,
+               song_name,
+               store_animation=False,
+               force=False):
+        """Render the animation using the current framework's renderer.
+        Set force to re-upload every element, even the ones that did not change."""
         if not self.renderer:
             self.renderer = self._create_renderer()
         return self.renderer.render(animation_data,
                                     animation_name=song_name,
                                     playback_offest=0,
-                                    store_animation=store_animation)
+                                    store_animation=store_animation,
+                                    force=force)
+
+    def store(self, animation_data, song_name, force=False, clear_elements=()):
+        """Preprocess and upload the animation without playing it.
+        Elements in clear_elements that the animation has no effects for are
+        stored without effects, replacing what was uploaded to them before.
+        Returns the upload report, or None if the framework has no renderer."""
+        if not self.renderer:
+            return None
+        preprocessed_animation_data = self.renderer.preprocess_animation({
+            **animation_data, "name": song_name
+        })
+        animation_details = animation_data.get("animation", {})
+        for element in clear_elements:
+            preprocessed_animation_data[
+                "animation_data_per_element"].setdefault(
+                    element, {
+                        "duration_ms": animation_details.get("duration_ms", 0),
+                        "num_repeats": animation_details.get("num_repeats", 1),
+                        "effects": []
+                    })
+        return self.renderer.store_animation(preprocessed_animation_data,
+                                             force=force)
 
     def stop_rendering(self):
         if self.renderer:
@@ -92,10 +123,23 @@ class AnimationManager:
         return "".join(knowledge_prompts)
 
     def get_latest_sequence(self):
-        latest_sequence = self.sequence_manager.get_latest_sequence()
-        if not latest_sequence:
+        latest_step = self.sequence_manager.get_latest_step()
+        if not latest_step or not latest_step.raw:
             return None
-        return f"{latest_sequence}"
+        return latest_step.text
+
+    def get_current_step(self):
+        return self.sequence_manager.get_current_step()
+
+    def get_latest_step(self):
+        """Returns the cached SequenceStep view of the latest sequence, or None."""
+        return self.sequence_manager.get_latest_step()
+
+    def get_step(self, step_number: int):
+        return self.sequence_manager.get_step(step_number)
+
+    def get_all_steps(self):
+        return self.sequence_manager.get_all_steps()
 
     def get_latest_sequence_with_step(self):
         """Returns the latest sequence and its step number."""
@@ -110,20 +154,52 @@ class AnimationManager:
     def load_sequences(self, animations):
         self.sequence_manager.load_sequences(animations)
 
+    def load_animations_from_snapshot(self, snapshot_dir):
+        """
+        Load the animation steps of a snapshot, from the compact history file
+        if there is one, otherwise from the animations/animation_{i} files.
+        """
+        history_path = os.path.join(snapshot_dir, ANIMATION_HISTORY_FILE)
+        if os.path.exists(history_path):
+            self.sequence_manager.load_history(history_path)
+            return
+
+        animations_dir = os.path.join(snapshot_dir, "animations")
+        if not os.path.exists(animations_dir):
+            raise FileNotFoundError(
+                "Animations directory is missing in the snapshot directory.")
+        animations = []
+        # Natural order, so animation_10 is loaded after animation_2
+        for animation_file in sorted(os.listdir(animations_dir), key=natural_key):
+            animation_path = os.path.join(animations_dir, animation_file)
+            with open(animation_path, "r") as file:
+                animations.append(file.read())
+        self.load_sequences(animations)
+
     def add_sequence(self, sequence):
         """Add a sequence using the sequence manager and return the step number."""
         return self.sequence_manager.add_sequence(sequence)
 
-    def save_all_animations(self, snapshot_dir, animation_suffix):
-        """Save all animations to the specified directory."""
-        all_animations = self.get_all_sequences()
+    def save_all_animations(self, snapshot_dir, animation_suffix, compact=True):
+        """
+        Save all animations to the specified directory.
+        With compact, all steps go to a single checkpoint + delta history file
+        (ANIMATION_HISTORY_FILE). Otherwise every step is written to its own
+        animations/animation_{i} file.
+        """
+        if compact:
+            self.sequence_manager.save_history(
+                os.path.join(snapshot_dir, ANIMATION_HISTORY_FILE))
+            return
+
+        all_animations = self.get_all_steps()
         animations_dir = os.path.join(snapshot_dir, "animations")
         os.makedirs(animations_dir, exist_ok=True)
         for i, animation in enumerate(all_animations, start=1):
             animation_file = os.path.join(animations_dir,
                                           f"animation_{i}.{animation_suffix}")
             with open(animation_file, "w") as file:
-                file.write(animation)
+                file.write(animation.text)
 
     def get_suffix(self):
         return self.sequence_manager.get_suffix()
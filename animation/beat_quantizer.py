@@ -0,0 +1,98 @@
+import copy
+
+import numpy as np
+
+from music.song_timeline import SongTimeline, snap_to_grid
+
+# Grid points per beat that effect boundaries are snapped to (4 = sixteenth notes)
+DEFAULT_SUBDIVISION = 4
+# Boundaries further than this from the grid are left where the LLM put them
+DEFAULT_TOLERANCE_MS = 30
+
+TIME_FIELDS = ("start_time", "end_time")
+
+
+def quantize_effects(animation_sequence,
+                     timeline: SongTimeline,
+                     subdivision=DEFAULT_SUBDIVISION,
+                     tolerance_ms=DEFAULT_TOLERANCE_MS):
+    """
+    Snaps the effect_config start_time and end_time of every effect to the
+    nearest beat (or beat subdivision) of the song, when it is within tolerance.
+
+    Boundaries of all the effects are snapped together, with one vectorized
+    search over the beat grid. An effect whose snapped end would not be after
+    its snapped start is left unchanged. The input is not modified.
+
+    Args:
+        animation_sequence (dict): Animation with an "animation": {"effects": [...]} list.
+        timeline (SongTimeline): Timeline of the animation's song.
+        subdivision (int): Grid points per beat.
+        tolerance_ms (float): Maximum distance in milliseconds a boundary is moved.
+
+    Returns:
+        tuple: (quantized_sequence, moves), where moves lists a dict
+            {"effect_number", "field", "from", "to"} for each moved boundary.
+    """
+    animation = animation_sequence.get("animation") if isinstance(
+        animation_sequence, dict) else None
+    effects = animation.get("effects") if isinstance(animation, dict) else None
+    if not isinstance(effects, list):
+        return animation_sequence, []
+
+    configs = []
+    for index, effect in enumerate(effects):
+        effect_config = effect.get("effect_config") if isinstance(
+            effect, dict) else None
+        if isinstance(effect_config, dict) and all(
+                isinstance(effect_config.get(field), (int, float))
+                for field in TIME_FIELDS):
+            configs.append((index, effect_config))
+    grid_ms = timeline.get_grid(subdivision) * 1000
+    if not configs or not len(grid_ms):
+        return animation_sequence, []
+
+    times = np.array([[effect_config[field] for field in TIME_FIELDS]
+                      for _, effect_config in configs],
+                     dtype=float)
+    snapped = snap_to_grid(times.ravel(), grid_ms,
+                           tolerance_ms).reshape(times.shape)
+    snapped = np.where(snapped != times, np.rint(snapped), times)
+    moved = (snapped != times) & (snapped[:, 1:] > snapped[:, :1])
+    if not moved.any():
+        return animation_sequence, []
+
+    quantized = copy.copy(animation_sequence)
+    quantized["animation"] = {**animation, "effects": list(effects)}
+    moves = []
+    for row in np.flatnonzero(moved.any(axis=1)):
+        index, effect_config = configs[row]
+        new_config = dict(effect_config)
+        for column, field in enumerate(TIME_FIELDS):
+            if moved[row, column]:
+                new_config[field] = int(snapped[row, column])
+                moves.append({
+                    "effect_number":
+                    effects[index].get("effect_number", index),
+                    "field": field,
+                    "from": effect_config[field],
+                    "to": new_config[field],
+                })
+        quantized["animation"]["effects"][index] = {
+            **effects[index], "effect_config": new_config
+        }
+    return quantized, moves
+
+
+def describe_moves(moves, max_listed=20):
+    """Returns a short text report of the boundaries moved by quantize_effects."""
+    if not moves:
+        return "No effect boundaries were snapped to the beat grid."
+    lines = [
+        f"effect {move['effect_number']} {move['field']}: {move['from']} -> {move['to']} ms"
+        for move in moves[:max_listed]
+    ]
+    if len(moves) > max_listed:
+        lines.append(f"... and {len(moves) - max_listed} more")
+    return f"Snapped {len(moves)} effect boundaries to the beat grid:\n" + "\n".join(
+        lines)
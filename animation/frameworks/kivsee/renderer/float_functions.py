@@ -0,0 +1,150 @@
+"""
+Local, vectorized evaluation of Kivsee FloatFunction curves.
+
+A FloatFunction (see schemes/kivsee_scheme/functions.proto) describes a value
+over the relative time of an effect, where 0.0 is the effect start and 1.0 is
+its end. The functions here compile a FloatFunction tree once into a plain
+Python callable that maps a NumPy array of relative times to a NumPy array of
+values, so a whole song can be sampled in a single call instead of asking the
+Raspberry Pi renderer.
+"""
+from typing import Any, Callable, Dict, Union
+
+import numpy as np
+
+CompiledFloatFunction = Callable[[np.ndarray], np.ndarray]
+
+FLOAT_FUNCTION_TYPES = ("const_value", "linear", "sin", "steps", "repeat",
+                        "half", "comb2")
+
+
+def _as_dict(float_function: Union[Dict[str, Any], Any]) -> Dict[str, Any]:
+    """Accept both the JSON dict format and the pydantic FloatFunction model."""
+    if hasattr(float_function, "model_dump"):
+        return float_function.model_dump(exclude_none=True)
+    return float_function
+
+
+def _get_function_type(float_function: Dict[str, Any]) -> str:
+    function_types = [
+        function_type for function_type in FLOAT_FUNCTION_TYPES
+        if float_function.get(function_type) is not None
+    ]
+    if len(function_types) != 1:
+        raise ValueError(
+            f"Exactly one float function type must be set. Found {len(function_types)} types: {function_types}"
+        )
+    return function_types[0]
+
+
+def _compile_const_value(config: Dict[str, Any]) -> CompiledFloatFunction:
+    value = float(config.get("value", 0.0))
+    return lambda t: np.full(t.shape, value, dtype=np.float64)
+
+
+def _compile_linear(config: Dict[str, Any]) -> CompiledFloatFunction:
+    start = float(config.get("start", 0.0))
+    diff = float(config.get("end", 0.0)) - start
+    return lambda t: start + diff * t
+
+
+def _compile_sin(config: Dict[str, Any]) -> CompiledFloatFunction:
+    min_value = float(config.get("min", 0.0))
+    amplitude = float(config.get("max", 0.0)) - min_value
+    phase = float(config.get("phase", 0.0))
+    repeats = float(config.get("repeats", 0.0))
+
+    def evaluate(t):
+        radians = 2.0 * np.pi * (t * repeats + phase)
+        return min_value + amplitude * (np.sin(radians) + 1.0) * 0.5
+
+    return evaluate
+
+
+def _compile_steps(config: Dict[str, Any]) -> CompiledFloatFunction:
+    first_step_value = float(config.get("first_step_value", 0.0))
+    diff_per_step = float(config.get("diff_per_step", 0.0))
+    num_steps = float(config.get("num_steps", 0.0))
+    if num_steps <= 0:
+        return lambda t: np.full(t.shape, first_step_value, dtype=np.float64)
+    last_step = np.ceil(num_steps) - 1
+
+    def evaluate(t):
+        step = np.clip(np.floor(t * num_steps), 0, last_step)
+        return first_step_value + diff_per_step * step
+
+    return evaluate
+
+
+def _compile_repeat(config: Dict[str, Any]) -> CompiledFloatFunction:
+    number_of_times = float(config.get("numberOfTimes", 0.0))
+    func_to_repeat = compile_float_function(config["funcToRepeat"])
+    if number_of_times <= 0:
+        return func_to_repeat
+    return lambda t: func_to_repeat(np.mod(t * number_of_times, 1.0))
+
+
+def _compile_half(config: Dict[str, Any]) -> CompiledFloatFunction:
+    f1 = compile_float_function(config["f1"])
+    f2 = compile_float_function(config["f2"])
+
+    def evaluate(t):
+        return np.where(t < 0.5, f1(t * 2.0), f2(t * 2.0 - 1.0))
+
+    return evaluate
+
+
+def _compile_comb2(config: Dict[str, Any]) -> CompiledFloatFunction:
+    f1 = compile_float_function(config["f1"])
+    f2 = compile_float_function(config["f2"])
+    amount1 = float(config.get("amount1", 0.0))
+    amount2 = float(config.get("amount2", 0.0))
+    return lambda t: amount1 * f1(t) + amount2 * f2(t)
+
+
+_COMPILERS = {
+    "const_value": _compile_const_value,
+    "linear": _compile_linear,
+    "sin": _compile_sin,
+    "steps": _compile_steps,
+    "repeat": _compile_repeat,
+    "half": _compile_half,
+    "comb2": _compile_comb2,
+}
+
+
+def compile_float_function(
+        float_function: Union[Dict[str, Any], Any]) -> CompiledFloatFunction:
+    """
+    Compile a FloatFunction tree into a vectorized callable.
+
+    Args:
+        float_function: The FloatFunction as a JSON dict (e.g. {"linear": {"start": 0, "end": 1}})
+            or as a pydantic FloatFunction model.
+
+    Returns:
+        A callable that takes a NumPy array of relative times (0.0 - 1.0) and
+        returns a float64 array of the same shape.
+
+    Raises:
+        ValueError: If the function does not have exactly one known type set.
+    """
+    float_function = _as_dict(float_function)
+    function_type = _get_function_type(float_function)
+    return _COMPILERS[function_type](float_function[function_type])
+
+
+def evaluate_float_function(float_function: Union[Dict[str, Any], Any],
+                            relative_times) -> np.ndarray:
+    """
+    Compile and evaluate a FloatFunction over an array of relative times.
+
+    Args:
+        float_function: The FloatFunction as a JSON dict or pydantic model.
+        relative_times: Array-like of relative times (0.0 - 1.0).
+
+    Returns:
+        np.ndarray: The function values, one per time sample.
+    """
+    relative_times = np.asarray(relative_times, dtype=np.float64)
+    return compile_float_function(float_function)(relative_times)
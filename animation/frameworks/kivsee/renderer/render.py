@@ -1,5 +1,11 @@
+import hashlib
 import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from animation.frameworks.kivsee.kivsee_sequence import KivseeSequence
 import os
 from datetime import datetime
@@ -7,7 +13,8 @@ from pathlib import Path
 import base64
 from animation.frameworks.kivsee.renderer.proto.effects_pb2 import AnimationProto
 from animation.frameworks.kivsee.renderer.proto.stats_request import RING_OBJECT_PROTO
-from constants import ANIMATION_OUT_TEMP_DIR, SNAPSHOTS_DIR
+from animation.frameworks.kivsee.renderer.simulator import Simulator
+from constants import ANIMATION_HISTORY_FILE, ANIMATION_OUT_TEMP_DIR, SNAPSHOTS_DIR
 
 from google.protobuf.json_format import ParseDict
 
@@ -51,6 +58,39 @@ PUT_ANIMATION_URL_TEMPLATE = "{SEQUENCE_URL}/triggers/{animation_name}/objects/{
 #     "ring9", "ring10", "ring11", "ring12"
 # ]
 
+# Maximum number of elements uploaded concurrently. Also used as the size of
+# the keep-alive connection pool shared by all requests to the Pi.
+MAX_UPLOAD_WORKERS = 12
+
+# How element payloads are sent to the sequence service:
+# "json" sends the JSON payload, "protobuf" sends the serialized AnimationProto bytes.
+TRANSPORT_JSON = "json"
+TRANSPORT_PROTOBUF = "protobuf"
+TRANSPORT_MODES = (TRANSPORT_JSON, TRANSPORT_PROTOBUF)
+
+# Number of serialized AnimationProto payloads kept in memory, keyed by payload digest
+MAX_PROTO_CACHE_ENTRIES = 256
+
+
+def payload_digest(animation_payload: dict) -> str:
+    """Hash of the canonical JSON form of an element payload (key order and whitespace independent)."""
+    canonical = json.dumps(animation_payload,
+                           sort_keys=True,
+                           separators=(",", ":"),
+                           ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# Effect types that become separate EffectProtos, in the order they are applied
+EFFECT_TYPES = ("const_color", "rainbow", "brightness", "hue", "saturation",
+                "snake")
+EFFECT_TYPE_ORDER = {
+    effect_type: index
+    for index, effect_type in enumerate(EFFECT_TYPES)
+}
+
+logger = logging.getLogger(__name__)
+
 # TODO(sapir): pull the offset from the song file
 ADD_OFFSET = False
 offset = 575
@@ -59,18 +99,48 @@ class Render:
 
     def __init__(self,
                  sequence_service_url: str = None,
-                 snapshot_dir: str = None):
+                 snapshot_dir: str = None,
+                 local_stats: bool = False,
+                 transport: str = TRANSPORT_JSON):
+        if transport not in TRANSPORT_MODES:
+            raise ValueError(
+                f"Unsupported transport: {transport}. Expected one of {TRANSPORT_MODES}"
+            )
         self.sequence_service_url = sequence_service_url if sequence_service_url else SEQUENCE_URL
+        # Compute stats with the offline simulator instead of the SIMULATION_URL endpoint.
+        # Opt-in: the simulator reports its own per-thing keys, not the endpoint's response.
+        self.local_stats = local_stats
+        self.transport = transport
+        self.simulator = Simulator()
         self.log_dir = Path("animation/frameworks/kivsee/renderer/animation_logs")
         self.log_dir.mkdir(exist_ok=True)
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.log_file = self.log_dir / f"animation_log_{self.timestamp}.txt"
         # Initialize sequence manager with snapshot directory if provided
         self.sequence_manager = KivseeSequence()
+        # Keep-alive connections shared by all requests, sized for concurrent uploads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_UPLOAD_WORKERS,
+                              pool_maxsize=MAX_UPLOAD_WORKERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._log_lock = threading.Lock()
+        # Digest of the last successfully stored payload per (animation_name, element_name)
+        self._stored_digests = {}
+        self._digest_lock = threading.Lock()
+        # Serialized AnimationProto bytes per payload digest, so each payload is converted once
+        self._proto_cache = {}
+        self._proto_cache_lock = threading.Lock()
 
     def _save_animation_log(self, current_log_path, element_name: str,
                             animation_payload: dict, response_text: str):
         """Save animation response to both individual and combined log files."""
+        with self._log_lock:
+            self._write_animation_log(current_log_path, element_name,
+                                      animation_payload, response_text)
+
+    def _write_animation_log(self, current_log_path, element_name: str,
+                             animation_payload: dict, response_text: str):
         # Save individual element animation
         element_file = current_log_path / f"{element_name}.json"
         with open(element_file, 'w') as f:
@@ -91,7 +161,35 @@ class Render:
 
     def store_single_animation(self, animation_name: str, element_name: str,
                                animation_payload: dict) -> bool:
+        return self._store_element(animation_name, element_name,
+                                   animation_payload)["ok"]
+
+    def _store_element(self,
+                       animation_name: str,
+                       element_name: str,
+                       animation_payload: dict,
+                       digest: str = None) -> dict:
+        """
+        Upload a single element's animation and report how it went.
+        The body is JSON or serialized AnimationProto bytes, depending on self.transport.
+
+        Args:
+            digest: payload_digest of animation_payload, if the caller already computed it.
+
+        Returns:
+            dict: {"element", "ok", "status_code", "latency_ms", "error"}
+        """
+        result = {
+            "element": element_name,
+            "ok": False,
+            "status_code": None,
+            "latency_ms": None,
+            "error": None,
+        }
+        start = time.perf_counter()
         try:
+            if digest is None:
+                digest = payload_digest(animation_payload)
             url = PUT_ANIMATION_URL_TEMPLATE.format(
                 SEQUENCE_URL=SEQUENCE_URL,
                 animation_name=animation_name,
@@ -99,7 +197,16 @@ class Render:
             print(
                 f"Storing animation for element: {element_name} at URL: {url}")
 
-            response = self._put_request(url, animation_payload)
+            if self.transport == TRANSPORT_PROTOBUF:
+                body = self._convert_animation_to_proto(element_name,
+                                                        animation_payload,
+                                                        digest=digest)
+            else:
+                body = animation_payload
+            response = self._put_request(url, body)
+            result["latency_ms"] = (time.perf_counter() - start) * 1000
+            result["status_code"] = response.status_code
+            result["ok"] = 200 <= response.status_code < 300
 
             response_text = f"Store animation for {element_name} response: {response.status_code}, {response.text}"
             print(response_text)
@@ -107,38 +214,50 @@ class Render:
             self._save_animation_log(self.log_dir, element_name,
                                      animation_payload, response_text)
 
-            print(f"Successfully stored animation for element: {element_name}")
-            return True
+            if result["ok"]:
+                self._remember_digest(animation_name, element_name, digest)
+                print(
+                    f"Successfully stored animation for element: {element_name}"
+                )
+            else:
+                result["error"] = response.text
         except Exception as e:
+            result["latency_ms"] = (time.perf_counter() - start) * 1000
+            result["error"] = str(e)
             print(f"Error storing animation for {element_name}: {str(e)}")
-            return False
+        return result
 
-    def _convert_animation_to_proto(self, element_name: str,
-                                    animation_payload: dict) -> dict:
+    def _convert_animation_to_proto(self,
+                                    element_name: str,
+                                    animation_payload: dict,
+                                    digest: str = None) -> bytes:
+        """
+        Serialize an element payload to AnimationProto bytes.
+        Conversions are cached by payload digest, so unchanged payloads are converted once.
+        """
+        if digest is None:
+            digest = payload_digest(animation_payload)
+        with self._proto_cache_lock:
+            serialized_message = self._proto_cache.get(digest)
+        if serialized_message is not None:
+            return serialized_message
 
         message = ParseDict(animation_payload, AnimationProto())
         serialized_message = message.SerializeToString()
+
+        with self._proto_cache_lock:
+            if len(self._proto_cache) >= MAX_PROTO_CACHE_ENTRIES:
+                # Dicts keep insertion order, drop the oldest conversion
+                del self._proto_cache[next(iter(self._proto_cache))]
+            self._proto_cache[digest] = serialized_message
         return serialized_message
 
     def get_animation_proto(self, element_name: str,
-                            animation_payload: dict) -> dict:
-
-        animation_name = "conversion_path"
-        url = PUT_ANIMATION_URL_TEMPLATE.format(SEQUENCE_URL=SEQUENCE_URL,
-                                                animation_name=animation_name,
-                                                element_name=element_name)
-
+                            animation_payload: dict) -> bytes:
+        """Convert an element payload to AnimationProto bytes locally (no round trip to the Pi)."""
         try:
-            response = self._put_request(url, animation_payload)
-            response = requests.get(
-                url, headers={"accept": "application/x-protobuf"})
-            if response.status_code == 200:
-                return response.content
-            else:
-                print(
-                    f"Failed to get animation proto: {response.status_code}, {response.text}"
-                )
-                return None
+            return self._convert_animation_to_proto(element_name,
+                                                    animation_payload)
         except Exception as e:
             print(f"Error getting animation proto: {str(e)}")
             return None
@@ -147,6 +266,36 @@ class Render:
 
     def _get_animation_stats(self, animations_per_element: dict,
                              start_time: int, end_time: int) -> dict:
+        if self.local_stats:
+            return self._get_local_animation_stats(animations_per_element,
+                                                   start_time, end_time)
+        return self._get_remote_animation_stats(animations_per_element,
+                                                start_time, end_time)
+
+    def _get_local_animation_stats(self, animations_per_element: dict,
+                                   start_time: int, end_time: int) -> dict:
+        """
+        Compute the animation stats with the offline pixel simulator.
+
+        The per-thing keys are the simulator's own (see Simulator.get_stats), so
+        callers reading the SIMULATION_URL response keys must not use this mode.
+        """
+        if not animations_per_element:
+            print("No valid animations found to analyze")
+            return None
+
+        try:
+            stats = self.simulator.get_stats(animations_per_element,
+                                             start_time, end_time)
+            print("Animation stats:", json.dumps(stats, indent=2))
+            return stats
+        except Exception as e:
+            print(f"Error simulating animation stats: {str(e)}")
+            return None
+
+    def _get_remote_animation_stats(self, animations_per_element: dict,
+                                    start_time: int, end_time: int) -> dict:
+        """Compute the animation stats on the Raspberry Pi SIMULATION_URL endpoint."""
         all_protos = []
         for element_name, animation_data in animations_per_element.items():
             # proto = self.get_animation_proto(element_name, animation_data)
@@ -174,7 +323,7 @@ class Render:
                 "endTimeMs": end_time
             }
 
-            response = requests.post(url, json=request_payload)
+            response = self.session.post(url, json=request_payload)
             if response.status_code == 200:
                 stats = response.json()
                 print("Animation stats:", json.dumps(stats, indent=2))
@@ -209,10 +358,48 @@ class Render:
             preprocessed_animation_data["animation_data_per_element"],
             start_time, end_time)
 
-    def store_animation(self, preprocessed_animation_data: dict):
+    def _remember_digest(self, animation_name: str, element_name: str,
+                         digest: str):
+        with self._digest_lock:
+            self._stored_digests[(animation_name, element_name)] = digest
+
+    def _is_unchanged(self, animation_name: str, element_name: str,
+                      digest: str) -> bool:
+        with self._digest_lock:
+            stored_digest = self._stored_digests.get(
+                (animation_name, element_name))
+        return stored_digest == digest
+
+    def clear_stored_digests(self, animation_name: str = None):
+        """Forget what was stored, for one animation or for all of them."""
+        with self._digest_lock:
+            if animation_name is None:
+                self._stored_digests.clear()
+            else:
+                for key in [
+                        key for key in self._stored_digests
+                        if key[0] == animation_name
+                ]:
+                    del self._stored_digests[key]
+
+    def store_animation(self,
+                        preprocessed_animation_data: dict,
+                        force: bool = False) -> dict:
         """
-        Sends POST requests to store the animation data for each element.
+        Sends PUT requests to store the animation data for each element.
         The animation data is now preprocessed to be specific to each element.
+        Elements are uploaded concurrently over the shared keep-alive session.
+        Elements whose payload is identical to the last one successfully stored
+        for the same animation are skipped, unless force is set.
+
+        Args:
+            preprocessed_animation_data: Output of preprocess_animation.
+            force: Upload every element, even if it did not change (full resync).
+
+        Returns:
+            dict: Upload report with the per-element results, e.g.
+                {"name", "results": [{"element", "ok", "status_code", "latency_ms", "error"}],
+                 "succeeded": [...], "failed": [...], "skipped": [...], "total_ms"}
         """
         animation_name = preprocessed_animation_data.get(
             "name", "default_animation")
@@ -220,19 +407,64 @@ class Render:
         animations_per_element = preprocessed_animation_data.get(
             "animation_data_per_element", {})
 
+        report = {
+            "name": animation_name,
+            "results": [],
+            "succeeded": [],
+            "failed": [],
+            "skipped": [],
+            "total_ms": 0.0,
+        }
+
         if not animations_per_element:
             print(
                 "No animation data generated for any element. Skipping storage."
             )
-            return
+            return report
+
+        changed_elements = {}
+        for element_name, animation_payload in animations_per_element.items():
+            digest = payload_digest(animation_payload)
+            if not force and self._is_unchanged(animation_name, element_name,
+                                                digest):
+                report["skipped"].append(element_name)
+            else:
+                changed_elements[element_name] = (animation_payload, digest)
+
+        if report["skipped"]:
+            print(f"Skipping unchanged elements: {report['skipped']}")
+        if not changed_elements:
+            print("All elements are up to date. Nothing to store.")
+            return report
 
         current_log_path = self.log_dir
         current_log_path.mkdir(exist_ok=True)
 
-        # Iterate through each element and its specific animation payload
-        for element_name, animation_payload in animations_per_element.items():
-            self.store_single_animation(animation_name, element_name,
-                                        animation_payload)
+        start = time.perf_counter()
+        max_workers = min(MAX_UPLOAD_WORKERS, len(changed_elements))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._store_element, animation_name,
+                                element_name, animation_payload, digest)
+                for element_name, (animation_payload,
+                                   digest) in changed_elements.items()
+            ]
+            results = [future.result() for future in futures]
+        report["total_ms"] = (time.perf_counter() - start) * 1000
+
+        for result in results:
+            report["results"].append(result)
+            if result["ok"]:
+                report["succeeded"].append(result["element"])
+            else:
+                report["failed"].append(result["element"])
+
+        print(
+            f"Stored {len(report['succeeded'])}/{len(results)} elements in {report['total_ms']:.0f} ms"
+        )
+        if report["failed"]:
+            print(f"Failed to store elements: {report['failed']}")
+        return report
 
     def trigger_animation(self, animation_name: str, playback_offest: int = 0):
         """
@@ -267,11 +499,18 @@ class Render:
         response = self._post_request(url, {})
         print(f"Stop response: {response.status_code}, {response.text}")
 
-    def _put_request(self, url: str, payload: dict):
-        """Helper method to send a PUT request."""
-        headers = {"Content-Type": "application/json"}
+    def _put_request(self, url: str, payload):
+        """
+        Helper method to send a PUT request.
+        A dict payload is sent as JSON, bytes are sent as a serialized protobuf.
+        """
         try:
-            response = requests.put(url, json=payload, headers=headers)
+            if isinstance(payload, bytes):
+                headers = {"Content-Type": "application/x-protobuf"}
+                response = self.session.put(url, data=payload, headers=headers)
+            else:
+                headers = {"Content-Type": "application/json"}
+                response = self.session.put(url, json=payload, headers=headers)
             return response
         except requests.exceptions.ConnectionError as e:
             print(
@@ -299,7 +538,7 @@ class Render:
         """Helper method to send a POST request."""
         headers = {"Content-Type": "application/json"}
         try:
-            response = requests.post(url, json=payload, headers=headers)
+            response = self.session.post(url, json=payload, headers=headers)
             return response
         except requests.exceptions.ConnectionError as e:
             print(
@@ -364,43 +603,55 @@ class Render:
             snapshot_dir (str): Path to the snapshot directory containing an 'animations' subdirectory
             playback_offest (int): Offset in milliseconds for playback timing
         """
-        # Check for animations directory in snapshot
-        animations_dir = os.path.join(SNAPSHOTS_DIR, snapshot_dir,
-                                      "animations")
-        if not os.path.exists(animations_dir):
-            raise FileNotFoundError(
-                "Animations directory is missing in the snapshot directory.")
-
-        # Load all animation files from the directory
-        animations = []
-        for file in os.listdir(animations_dir):
-            if file.endswith(self.sequence_manager.get_suffix()):
-                with open(os.path.join(animations_dir, file), 'r') as f:
-                    animations.append(json.load(f))
-
-        # Load the sequences into the manager
-        self.sequence_manager.load_sequences(animations)
+        history_path = os.path.join(SNAPSHOTS_DIR, snapshot_dir,
+                                    ANIMATION_HISTORY_FILE)
+        if os.path.exists(history_path):
+            self.sequence_manager.load_history(history_path)
+        else:
+            # Check for animations directory in snapshot
+            animations_dir = os.path.join(SNAPSHOTS_DIR, snapshot_dir,
+                                          "animations")
+            if not os.path.exists(animations_dir):
+                raise FileNotFoundError(
+                    "Animations directory is missing in the snapshot directory."
+                )
+
+            # Load all animation files from the directory
+            animations = []
+            for file in os.listdir(animations_dir):
+                if file.endswith(self.sequence_manager.get_suffix()):
+                    with open(os.path.join(animations_dir, file), 'r') as f:
+                        animations.append(json.load(f))
+
+            # Load the sequences into the manager
+            self.sequence_manager.load_sequences(animations)
 
         # Use the latest animation for rendering
-        animation_data = self.sequence_manager.get_latest_sequence()
-        if not animation_data:
+        latest_step = self.sequence_manager.get_latest_step()
+        if not latest_step:
             raise ValueError("No animations found in the snapshot directory.")
+        animation_data = latest_step.to_dict()
 
         self.render(animation_data, animation_name, playback_offest)
 
-    def render_unpacked_animation(self, preprocessed_animation_data: dict):
-        self.store_animation(preprocessed_animation_data)
+    def render_unpacked_animation(self,
+                                  preprocessed_animation_data: dict,
+                                  force: bool = False):
+        self.store_animation(preprocessed_animation_data, force=force)
         self.trigger_animation(preprocessed_animation_data['name'])
 
     def render(self,
                animation_data: dict,
                animation_name: str,
                playback_offest: int = 0,
-               store_animation: bool = False):
+               store_animation: bool = False,
+               force: bool = False):
         """
         Orchestrates the preprocessing, storing, and triggering of the animation.
+        Set force to re-upload every element even if it did not change since the last store.
         """
-        animation_data['name'] = animation_name
+        # Work on a shallow copy so the caller's animation data is not modified
+        animation_data = {**animation_data, "name": animation_name}
         print(f"Hardcoded animation name to: {animation_data['name']}")
 
         print("Rendering animation...")
@@ -408,7 +659,7 @@ class Render:
         preprocessed_animation_data = self.preprocess_animation(animation_data)
 
         if store_animation:
-            self.store_animation(preprocessed_animation_data)
+            self.store_animation(preprocessed_animation_data, force=force)
 
         # Trigger the song immediately
         self.trigger_song(preprocessed_animation_data['name'], playback_offest)
@@ -417,11 +668,16 @@ class Render:
         """
         Preprocesses the raw animation data, extracting effects and grouping them
         by the elements they apply to.
-        This method generates a 'slim' version of each effect by removing
-        metadata fields not needed by the rendering engine and then organizing
-        these slim effects into a dictionary where keys are element names.
-        Each EffectProto will have exactly one effect type (either color or other effect).
+        Each effect is split into one slim EffectProto per effect type (either color
+        or other effect), holding only the effect_config and that type, and the
+        split effects are appended to every element the effect applies to.
+        The input is never modified.
+
+        Returns:
+            dict: {"name", "animation_data_per_element", "stats"}, where stats holds
+                num_effects, num_split_effects, num_elements and elapsed_ms.
         """
+        start = time.perf_counter()
         animation_details = input_data.get("animation", {})
         effects = animation_details.get("effects", [])
 
@@ -435,89 +691,79 @@ class Render:
         animation_name = input_data.get("name", "default_animation")
 
         if not effects:
-            print(
+            logger.debug(
                 "No effects found in the animation data. Returning empty per-element animations."
             )
-            return {"name": animation_name, "animation_data_per_element": {}}
-
-        print(f"Preprocessing {len(effects)} effects...")
 
+        num_split_effects = 0
         for effect in effects:
-            # Create base slim effect with common fields
-            base_slim_effect = {
-                key: value
-                for key, value in effect.items() if key not in {
-                    "effect_number",
-                    "title",
-                    "beat_and_bar",
-                    "effect_summary",
-                    "reasoning",
-                    "elements",
-                }
-            }
-
-            # Add offset to the start_time and end_time of the effect if enabled
-            if ADD_OFFSET:
-                slim_config = base_slim_effect.get("effect_config", {})
-                slim_config["start_time"] = slim_config.get("start_time",
-                                                            0) + offset
-                slim_config["end_time"] = slim_config.get("end_time",
-                                                          0) + offset
-
-            # --- Support for segments as a list ---
-            # If effect_config exists and has 'segments', ensure it's a list
-            effect_config = base_slim_effect.get("effect_config", {})
-            
-            if "segments" in effect_config and isinstance(effect_config["segments"], list):
-                # If segments is not a list, convert it to a list with one item
-                effect_config["segments"] = effect_config["segments"][0]
-            else:
-                print(f"the type of segmenets is: {type(effect_config.get('segments'))}")
-                
-            
-            # Determine which elements this effect applies to
-            effect_elements = effect.get("elements", [])
-            if not effect_elements:
-                # If the 'elements' list is empty, apply this effect to the special "all" element.
-                print(
-                    f"Effect {effect.get('effect_number', 'N/A')} has no specific elements, applying to element: 'all'"
-                )
-                effect_elements = ["all"]
-
-            # Create separate EffectProtos for each effect type
-            split_effects = []
-
-            # Handle all effects in the same way
-            for effect_type in [
-                    "const_color", "rainbow", "brightness", "hue",
-                    "saturation", "snake"
-            ]:
-                if effect.get(effect_type):
-                    split_effect = {
-                        "effect_config": base_slim_effect["effect_config"],
-                        effect_type: effect[effect_type]
-                    }
-                    split_effects.append(split_effect)
+            effect_config = self._slim_effect_config(
+                effect.get("effect_config", {}))
+
+            # Split the effect into one EffectProto per effect type, in EFFECT_TYPES order
+            effect_types = sorted(
+                (key for key in effect
+                 if key in EFFECT_TYPE_ORDER and effect[key]),
+                key=EFFECT_TYPE_ORDER.__getitem__)
+            split_effects = [{
+                "effect_config": effect_config,
+                effect_type: effect[effect_type]
+            } for effect_type in effect_types]
+
+            # Determine which elements this effect applies to.
+            # If the 'elements' list is empty, apply this effect to the special "all" element.
+            effect_elements = effect.get("elements") or ("all", )
 
-
-            # Add effects to each element
             for element in effect_elements:
-                if element not in animations_per_element:
-                    animations_per_element[element] = {
+                element_animation = animations_per_element.get(element)
+                if element_animation is None:
+                    element_animation = animations_per_element[element] = {
                         "duration_ms": duration_ms,
                         "num_repeats": num_repeats,
                         "effects": []
                     }
-
-                # Add all split effects
-                animations_per_element[element]["effects"].extend(
-                    split_effects)
+                element_animation["effects"].extend(split_effects)
+                num_split_effects += len(split_effects)
+
+        stats = {
+            "num_effects": len(effects),
+            "num_split_effects": num_split_effects,
+            "num_elements": len(animations_per_element),
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+        logger.debug(f"Preprocessed animation '{animation_name}': {stats}")
 
         return {
             "name": animation_name,
-            "animation_data_per_element": animations_per_element
+            "animation_data_per_element": animations_per_element,
+            "stats": stats,
         }
 
+    @staticmethod
+    def _slim_effect_config(effect_config: dict) -> dict:
+        """
+        Returns a copy of the effect_config as the rendering engine expects it:
+        a segments list is replaced by its first segment (an empty list is
+        dropped), and the global offset is added to the times if enabled.
+        """
+        effect_config = dict(effect_config)
+
+        # --- Support for segments as a list ---
+        segments = effect_config.get("segments")
+        if isinstance(segments, list):
+            if segments:
+                effect_config["segments"] = segments[0]
+            else:
+                del effect_config["segments"]
+
+        # Add offset to the start_time and end_time of the effect if enabled
+        if ADD_OFFSET:
+            effect_config["start_time"] = effect_config.get("start_time",
+                                                            0) + offset
+            effect_config["end_time"] = effect_config.get("end_time",
+                                                          0) + offset
+        return effect_config
+
 
 def main():
     render = Render()
@@ -0,0 +1,383 @@
+"""
+Offline, pixel-level simulator for Kivsee animations.
+
+The simulator decodes an object proto (e.g. RING_OBJECT_PROTO) into segments
+of pixel indices, then composites the per-element effects produced by
+Render.preprocess_animation into a (frames, pixels, 3) RGB buffer. Render uses
+it to compute animation stats locally when created with local_stats=True,
+instead of calling the SIMULATION_URL stats endpoint on the Raspberry Pi.
+
+The stats follow the endpoint's request layout ("things" with a "thingName",
+"startTimeMs", "endTimeMs"), but the per-thing metrics are computed here and
+do not share the endpoint's response keys, so the endpoint stays the default.
+"""
+import base64
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from animation.frameworks.kivsee.renderer.float_functions import compile_float_function
+from animation.frameworks.kivsee.renderer.proto.stats_request import RING_OBJECT_PROTO
+
+SIMULATION_FPS = 60
+
+# A pixel counts as lit when its brightness (HSV value) is above this threshold
+LIT_THRESHOLD = 0.05
+
+# Object proto wire types
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_FIXED32 = 5
+
+
+def _read_varint(buffer: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _iter_fields(buffer: bytes):
+    """Yield (field_number, wire_type, value) for a serialized proto message."""
+    pos = 0
+    while pos < len(buffer):
+        key, pos = _read_varint(buffer, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == _WIRE_VARINT:
+            value, pos = _read_varint(buffer, pos)
+        elif wire_type == _WIRE_LENGTH_DELIMITED:
+            length, pos = _read_varint(buffer, pos)
+            value = buffer[pos:pos + length]
+            pos += length
+        elif wire_type == _WIRE_FIXED32:
+            value = buffer[pos:pos + 4]
+            pos += 4
+        elif wire_type == _WIRE_FIXED64:
+            value = buffer[pos:pos + 8]
+            pos += 8
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type} in object proto")
+        yield field_number, wire_type, value
+
+
+class ObjectLayout:
+    """Pixel layout of a single thing: its pixel count and named segments."""
+
+    def __init__(self, num_pixels: int,
+                 segments: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        """
+        :param num_pixels: Total number of pixels of the thing.
+        :param segments: Segment name -> (pixel indices, relative positions 0.0 - 1.0).
+        """
+        self.num_pixels = num_pixels
+        self.segments = segments
+
+    @classmethod
+    def from_object_proto(cls, object_proto: str) -> 'ObjectLayout':
+        """Decode a base64 encoded object proto.
+
+        The object proto holds the pixel count (field 2) and repeated segments
+        (field 3), each with a name (field 1) and repeated pixels (field 2) of
+        {index: uint32 = 1, position: float = 2}.
+        """
+        num_pixels = 0
+        segments = {}
+        for field_number, wire_type, value in _iter_fields(
+                base64.b64decode(object_proto)):
+            if field_number == 2 and wire_type == _WIRE_VARINT:
+                num_pixels = value
+            elif field_number == 3 and wire_type == _WIRE_LENGTH_DELIMITED:
+                name, indices, positions = cls._decode_segment(value)
+                segments[name] = (np.array(indices, dtype=np.intp),
+                                  np.array(positions, dtype=np.float32))
+
+        if not num_pixels and segments:
+            num_pixels = 1 + max(
+                int(indices.max()) for indices, _ in segments.values()
+                if indices.size)
+        return cls(num_pixels, segments)
+
+    @staticmethod
+    def _decode_segment(buffer: bytes):
+        name = ""
+        indices = []
+        positions = []
+        for field_number, wire_type, value in _iter_fields(buffer):
+            if field_number == 1 and wire_type == _WIRE_LENGTH_DELIMITED:
+                name = value.decode("utf-8")
+            elif field_number == 2 and wire_type == _WIRE_LENGTH_DELIMITED:
+                index, position = 0, 0.0
+                for pixel_field, pixel_wire_type, pixel_value in _iter_fields(
+                        value):
+                    if pixel_field == 1 and pixel_wire_type == _WIRE_VARINT:
+                        index = pixel_value
+                    elif pixel_field == 2 and pixel_wire_type == _WIRE_FIXED32:
+                        position = struct.unpack("<f", pixel_value)[0]
+                indices.append(index)
+                positions.append(position)
+        return name, indices, positions
+
+
+def hsv_to_rgb(hue: np.ndarray, sat: np.ndarray, val: np.ndarray) -> np.ndarray:
+    """Vectorized HSV (0.0 - 1.0) to RGB (0.0 - 1.0) conversion, stacked on the last axis."""
+    h6 = np.mod(hue, 1.0) * 6.0
+    sector = np.floor(h6).astype(np.int8) % 6
+    fraction = h6 - np.floor(h6)
+    p = val * (1.0 - sat)
+    q = val * (1.0 - sat * fraction)
+    t = val * (1.0 - sat * (1.0 - fraction))
+
+    red = np.choose(sector, [val, q, p, p, t, val])
+    green = np.choose(sector, [t, val, val, q, p, p])
+    blue = np.choose(sector, [p, p, t, val, val, q])
+    return np.stack([red, green, blue], axis=-1)
+
+
+def rgb_to_hsv(rgb: np.ndarray):
+    """Vectorized RGB (0 - 255) to (hue, sat, val) arrays (0.0 - 1.0), the inverse of hsv_to_rgb."""
+    rgb = rgb.astype(np.float32) / 255.0
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    val = rgb.max(axis=-1)
+    delta = val - rgb.min(axis=-1)
+    sat = np.divide(delta, val, out=np.zeros_like(val), where=val > 0)
+    safe_delta = np.where(delta > 0, delta, 1.0)
+    hue = np.where(val == red, (green - blue) / safe_delta,
+                   np.where(val == green, 2.0 + (blue - red) / safe_delta,
+                            4.0 + (red - green) / safe_delta))
+    hue = np.where(delta > 0, np.mod(hue / 6.0, 1.0), 0.0)
+    return hue, sat, val
+
+
+class Simulator:
+    """Composites per-element Kivsee animations into RGB frames."""
+
+    def __init__(self,
+                 object_protos: Optional[Dict[str, str]] = None,
+                 default_object_proto: str = RING_OBJECT_PROTO,
+                 fps: int = SIMULATION_FPS):
+        """
+        :param object_protos: Optional element name -> base64 object proto mapping.
+        :param default_object_proto: Object proto used for elements without a specific one.
+        :param fps: Number of simulated frames per second.
+        """
+        self.object_protos = object_protos or {}
+        self.default_object_proto = default_object_proto
+        self.fps = fps
+        self._layouts = {}
+
+    def get_layout(self, element_name: str) -> ObjectLayout:
+        """Return the (cached) pixel layout for an element."""
+        object_proto = self.object_protos.get(element_name,
+                                              self.default_object_proto)
+        layout = self._layouts.get(object_proto)
+        if layout is None:
+            layout = ObjectLayout.from_object_proto(object_proto)
+            self._layouts[object_proto] = layout
+        return layout
+
+    def get_frame_times(self, start_time: int, end_time: int) -> np.ndarray:
+        """Return the frame timestamps in milliseconds for [start_time, end_time)."""
+        frame_interval_ms = 1000.0 / self.fps
+        return np.arange(start_time, end_time, frame_interval_ms,
+                         dtype=np.float64)
+
+    def render_element(self, animation_payload: dict,
+                       times_ms: np.ndarray,
+                       element_name: str = "") -> np.ndarray:
+        """
+        Render a single element's animation payload.
+
+        Args:
+            animation_payload (dict): A per-element payload as produced by Render.preprocess_animation
+                ({"duration_ms", "num_repeats", "effects": [...]}).
+            times_ms (np.ndarray): Frame timestamps in milliseconds.
+            element_name (str): Element name, used to pick the object layout.
+
+        Returns:
+            np.ndarray: A uint8 buffer of shape (frames, pixels, 3) with RGB values.
+        """
+        hue, sat, val = self._render_element_hsv(animation_payload, times_ms,
+                                                 element_name)
+        rgb = hsv_to_rgb(hue, sat, val)
+        return np.round(rgb * 255.0).astype(np.uint8)
+
+    def _render_element_hsv(self, animation_payload: dict,
+                            times_ms: np.ndarray, element_name: str):
+        layout = self.get_layout(element_name)
+        num_frames = len(times_ms)
+        hue = np.zeros((num_frames, layout.num_pixels), dtype=np.float32)
+        sat = np.zeros((num_frames, layout.num_pixels), dtype=np.float32)
+        val = np.zeros((num_frames, layout.num_pixels), dtype=np.float32)
+
+        local_times = self._get_local_times(animation_payload, times_ms)
+
+        for effect in animation_payload.get("effects", []):
+            effect_config = effect.get("effect_config", {})
+            start = effect_config.get("start_time", 0)
+            end = effect_config.get("end_time", 0)
+            if end <= start:
+                continue
+
+            frames = np.nonzero((local_times >= start)
+                                & (local_times < end))[0]
+            if not frames.size:
+                continue
+
+            relative_times = self._get_relative_times(
+                effect_config, local_times[frames], start, end)
+
+            for segment_name in self._get_segment_names(effect_config):
+                segment = layout.segments.get(segment_name)
+                if segment is None:
+                    continue
+                pixels, positions = segment
+                index = np.ix_(frames, pixels)
+                self._apply_effect(effect, relative_times, positions, index,
+                                   hue, sat, val)
+
+        np.clip(sat, 0.0, 1.0, out=sat)
+        np.clip(val, 0.0, 1.0, out=val)
+        return hue, sat, val
+
+    @staticmethod
+    def _get_local_times(animation_payload: dict,
+                         times_ms: np.ndarray) -> np.ndarray:
+        """Map global times into the animation's own timeline, honouring num_repeats."""
+        duration_ms = animation_payload.get("duration_ms", 0)
+        num_repeats = animation_payload.get("num_repeats", 1)
+        if duration_ms <= 0:
+            return times_ms
+        repeating = times_ms >= 0
+        if num_repeats > 0:
+            repeating &= times_ms < duration_ms * num_repeats
+        return np.where(repeating, np.mod(times_ms, duration_ms), times_ms)
+
+    @staticmethod
+    def _get_relative_times(effect_config: dict, times_ms: np.ndarray,
+                            start: int, end: int) -> np.ndarray:
+        relative_times = (times_ms - start) / float(end - start)
+        repeat_num = effect_config.get("repeat_num", 0)
+        if repeat_num and repeat_num > 0:
+            repeat_start = effect_config.get("repeat_start", 0.0)
+            repeat_end = effect_config.get("repeat_end", 1.0) or 1.0
+            relative_times = repeat_start + np.mod(
+                relative_times * repeat_num, 1.0) * (repeat_end - repeat_start)
+        return relative_times
+
+    @staticmethod
+    def _get_segment_names(effect_config: dict) -> List[str]:
+        segments = effect_config.get("segments") or "all"
+        if isinstance(segments, str):
+            return [segments]
+        return list(segments)
+
+    @staticmethod
+    def _apply_effect(effect, relative_times, positions, index, hue, sat,
+                      val):
+        """Composite a single split effect onto the HSV buffers in place."""
+        if effect.get("const_color"):
+            color = effect["const_color"].get("color", {})
+            hue[index] = color.get("hue", 0.0)
+            sat[index] = color.get("sat", 1.0)
+            val[index] = color.get("val", 1.0)
+        elif effect.get("rainbow"):
+            rainbow = effect["rainbow"]
+            hue_start = compile_float_function(
+                rainbow["hue_start"])(relative_times)
+            hue_end = compile_float_function(rainbow["hue_end"])(relative_times)
+            hue[index] = hue_start[:, None] + (
+                hue_end - hue_start)[:, None] * positions[None, :]
+            sat[index] = 1.0
+            val[index] = 1.0
+        elif effect.get("brightness"):
+            mult_factor = compile_float_function(
+                effect["brightness"]["mult_factor"])(relative_times)
+            val[index] *= mult_factor[:, None]
+        elif effect.get("hue"):
+            offset_factor = compile_float_function(
+                effect["hue"]["offset_factor"])(relative_times)
+            hue[index] += offset_factor[:, None]
+        elif effect.get("saturation"):
+            mult_factor = compile_float_function(
+                effect["saturation"]["mult_factor"])(relative_times)
+            sat[index] *= mult_factor[:, None]
+        elif effect.get("snake"):
+            snake = effect["snake"]
+            head = compile_float_function(snake["head"])(relative_times)
+            tail_length = compile_float_function(
+                snake["tail_length"])(relative_times)
+            distance = head[:, None] - positions[None, :]
+            if snake.get("cyclic", False):
+                distance = np.mod(distance, 1.0)
+            tail_length = np.maximum(tail_length, 1e-6)[:, None]
+            in_tail = (distance >= 0.0) & (distance <= tail_length)
+            val[index] *= np.where(in_tail, 1.0 - distance / tail_length, 0.0)
+
+    def get_stats(self, animations_per_element: dict, start_time: int,
+                  end_time: int) -> dict:
+        """
+        Simulate all elements and summarize them per thing.
+
+        Each element is rendered into its (frames, pixels, 3) RGB buffer (see
+        render_element) and the stats are computed from those frames. The
+        per-thing metrics are the simulator's own, not the keys of the
+        SIMULATION_URL stats response.
+
+        Args:
+            animations_per_element (dict): Element name -> per-element animation payload.
+            start_time (int): Start time in milliseconds for the stats analysis.
+            end_time (int): End time in milliseconds for the stats analysis.
+
+        Returns:
+            dict: {"startTimeMs", "endTimeMs", "things": [per-thing stats]}
+        """
+        times_ms = self.get_frame_times(start_time, end_time)
+        things = []
+        for element_name, animation_payload in animations_per_element.items():
+            frames = self.render_element(animation_payload, times_ms,
+                                         element_name)
+            things.append(self._summarize(element_name, frames))
+
+        return {
+            "startTimeMs": start_time,
+            "endTimeMs": end_time,
+            "things": things,
+        }
+
+    def _summarize(self, element_name: str, frames: np.ndarray) -> dict:
+        num_frames, num_pixels = frames.shape[:2]
+        if not num_frames or not num_pixels:
+            return {
+                "thingName": element_name,
+                "numFrames": num_frames,
+                "numPixels": num_pixels,
+            }
+
+        hue, sat, val = rgb_to_hsv(frames)
+        lit = val > LIT_THRESHOLD
+        lit_per_frame = lit.mean(axis=1)
+        brightness_per_frame = val.mean(axis=1)
+        dark_frames = ~lit.any(axis=1)
+        hue_values = np.mod(hue[lit], 1.0) if lit.any() else np.zeros(0)
+
+        return {
+            "thingName": element_name,
+            "numFrames": int(num_frames),
+            "numPixels": int(num_pixels),
+            "avgBrightness": float(brightness_per_frame.mean()),
+            "maxBrightness": float(val.max()),
+            "litPixelsRatio": float(lit_per_frame.mean()),
+            "darkTimeMs": float(np.count_nonzero(dark_frames) * 1000.0 /
+                                self.fps),
+            "avgSaturation": float(sat[lit].mean()) if lit.any() else 0.0,
+            "avgHue": float(hue_values.mean()) if hue_values.size else 0.0,
+            "brightnessChanges": int(
+                np.count_nonzero(np.abs(np.diff(brightness_per_frame)) > LIT_THRESHOLD)),
+        }
@@ -1,19 +1,46 @@
 from abc import ABC, abstractmethod
 import os
 
+from animation.frameworks.sequence_step import SequenceStep
+from animation.frameworks.step_history import StepHistory
 from constants import ANIMATION_OUT_TEMP_DIR
 
 
 class Sequence(ABC):
 
     def __init__(self):
-        self.sequences = []
+        # Steps as checkpoints and deltas. Indexing returns the raw sequence
+        # (JSON string or dict), get_step returns the cached SequenceStep view.
+        self.sequences = StepHistory()
 
     def add_sequence(self, sequence):
-        """Add a new sequence to the end of the array and return the current step number."""
+        """
+        Add a new sequence to the end of the array and return the current step number.
+        The sequence can be a JSON string, a dict or a SequenceStep.
+        """
         self.sequences.append(sequence)
         return f"Animation sequence added to step {len(self.sequences)}"
 
+    def get_step(self, step_number: int) -> SequenceStep:
+        """Return the cached SequenceStep view of a step (1-based)."""
+        if (step_number > 0 and step_number <= len(self.sequences)):
+            return self.sequences.get_step(step_number - 1)
+        else:
+            raise ValueError(f"Step number {step_number} is out of range")
+
+    def get_latest_step(self):
+        """Return the SequenceStep view of the latest sequence, or None."""
+        if not self.sequences:
+            return None
+        return self.sequences.get_step(-1)
+
+    def get_all_steps(self):
+        """Return the SequenceStep views of all sequences."""
+        return [
+            self.sequences.get_step(index)
+            for index in range(len(self.sequences))
+        ]
+
     def get_latest_sequence(self):
         """Return the latest sequence available."""
         if not self.sequences:
@@ -38,11 +65,19 @@ class Sequence(ABC):
 
     def get_all_sequences(self):
         """Return all sequences as a list."""
-        return self.sequences
+        return self.sequences.copy()
 
     def load_sequences(self, sequences):
         """Load sequences from a list."""
-        self.sequences = sequences.copy()
+        self.sequences = StepHistory(sequences)
+
+    def save_history(self, path: str):
+        """Save all steps to a compact checkpoint + delta history file."""
+        self.sequences.dump(path)
+
+    def load_history(self, path: str):
+        """Load the steps from a history file written by save_history."""
+        self.sequences = StepHistory.load(path)
 
     @abstractmethod
     def get_suffix(self):
@@ -0,0 +1,118 @@
+import hashlib
+import json
+
+_NOT_PARSED = object()
+# Cached result of a parse that failed, so non JSON steps are parsed only once
+_NOT_JSON = object()
+
+
+class SequenceStep:
+    """
+    A single animation step in the sequence store.
+
+    Wraps the raw sequence (a JSON string, or an already parsed dict) and computes
+    the parsed data, the canonical minified JSON and its content hash lazily, at most
+    once per step. Steps are immutable: render, diff, stats and prompt building all
+    share the same parsed data, so callers must treat `data` as read-only and use
+    `to_dict()` when they need a copy they can modify (or pass it to code that might).
+    """
+
+    __slots__ = ("_raw", "_text", "_data", "_parse_error", "_canonical",
+                 "_digest")
+
+    def __init__(self, sequence, data=_NOT_PARSED):
+        """
+        Args:
+            sequence: The raw sequence, a JSON string or a dict.
+            data: The parsed form of sequence, if the caller already has it.
+        """
+        if isinstance(sequence, SequenceStep):
+            raise TypeError("sequence is already a SequenceStep")
+        object.__setattr__(self, "_raw", sequence)
+        object.__setattr__(self, "_text",
+                           sequence if isinstance(sequence, str) else None)
+        if data is _NOT_PARSED and not isinstance(sequence, str):
+            data = sequence
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_parse_error", None)
+        object.__setattr__(self, "_canonical", None)
+        object.__setattr__(self, "_digest", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SequenceStep is immutable")
+
+    def _cache(self, name, value):
+        object.__setattr__(self, name, value)
+        return value
+
+    @property
+    def raw(self):
+        """The sequence exactly as it was added to the store."""
+        return self._raw
+
+    @property
+    def text(self) -> str:
+        """The sequence as text, as shown to the LLM and saved in snapshots."""
+        if self._text is None:
+            return self._cache("_text", json.dumps(self._raw, indent=4))
+        return self._text
+
+    @property
+    def data(self):
+        """
+        The parsed sequence (read-only, shared by all readers).
+
+        Raises:
+            json.JSONDecodeError: If the sequence text is not valid JSON.
+        """
+        if self._data is _NOT_PARSED:
+            try:
+                return self._cache("_data", json.loads(self._raw))
+            except json.JSONDecodeError as e:
+                self._cache("_parse_error", e)
+                self._cache("_data", _NOT_JSON)
+                raise
+        if self._data is _NOT_JSON:
+            raise self._parse_error
+        return self._data
+
+    def is_json(self) -> bool:
+        if self._data is _NOT_PARSED:
+            try:
+                self.data
+            except json.JSONDecodeError:
+                pass
+        return self._data is not _NOT_JSON
+
+    def to_dict(self):
+        """A deep copy of the parsed sequence that the caller may modify."""
+        return json.loads(self.canonical)
+
+    @property
+    def canonical(self) -> str:
+        """Minified JSON with sorted keys. Falls back to the text for non JSON sequences."""
+        if self._canonical is None:
+            if self.is_json():
+                canonical = json.dumps(self.data,
+                                       sort_keys=True,
+                                       separators=(",", ":"),
+                                       ensure_ascii=False)
+            else:
+                canonical = self.text
+            return self._cache("_canonical", canonical)
+        return self._canonical
+
+    @property
+    def digest(self) -> str:
+        """sha256 of the canonical form, equal for steps with the same content."""
+        if self._digest is None:
+            return self._cache(
+                "_digest",
+                hashlib.sha256(self.canonical.encode("utf-8")).hexdigest())
+        return self._digest
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"SequenceStep(digest={self.digest[:12]})"
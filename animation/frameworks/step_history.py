@@ -0,0 +1,385 @@
+"""
+Delta-encoded storage for the animation steps of a Sequence.
+
+Each step is stored either as a checkpoint (the full minified JSON) or as a
+JSON-patch style list of operations (RFC 6902 "add", "remove" and "replace"
+with RFC 6901 paths) against the previous step. A checkpoint is written every
+CHECKPOINT_INTERVAL steps, so reading any step parses one checkpoint and
+applies at most CHECKPOINT_INTERVAL - 1 patches. Steps that are not valid JSON
+are kept verbatim.
+
+JSON text steps in the format UpdateAnimationAction writes (4-space indented
+JSON) are rebuilt from their content. Text steps in any other format also keep
+their original text, so every step reads back exactly as it was added: in full
+at a checkpoint, otherwise as a text delta against the previous step's text.
+"""
+import copy
+import json
+import re
+from collections import OrderedDict
+
+from animation.frameworks.sequence_step import SequenceStep
+
+CHECKPOINT_INTERVAL = 10
+# Number of materialized older steps kept in memory, the latest step is always kept
+STEP_CACHE_SIZE = 4
+TEXT_INDENT = 4
+
+HISTORY_FORMAT = "lol-step-history"
+HISTORY_FORMAT_VERSION = 1
+
+# Record kinds: how the step was added to the store
+KIND_TEXT = "text"  # JSON string
+KIND_DICT = "dict"  # parsed dict
+KIND_RAW = "raw"  # string that is not valid JSON, stored verbatim
+
+
+def _escape_token(token) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape_token(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _equal(old, new) -> bool:
+    """Like ==, but values of different types (1, 1.0 and True) are not equal."""
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, dict):
+        return old.keys() == new.keys() and all(
+            _equal(value, new[key]) for key, value in old.items())
+    if isinstance(old, list):
+        return len(old) == len(new) and all(
+            _equal(old_item, new_item) for old_item, new_item in zip(old, new))
+    return old == new
+
+
+def _diff(old, new, path: str, ops: list):
+    # Values written into ops are copies, so later changes to new do not alter the patch
+    if type(old) is not type(new):
+        ops.append({
+            "op": "replace",
+            "path": path,
+            "value": copy.deepcopy(new)
+        })
+    elif isinstance(old, dict):
+        for key in old:
+            if key not in new:
+                ops.append({
+                    "op": "remove",
+                    "path": f"{path}/{_escape_token(key)}"
+                })
+        for key, value in new.items():
+            key_path = f"{path}/{_escape_token(key)}"
+            if key not in old:
+                ops.append({
+                    "op": "add",
+                    "path": key_path,
+                    "value": copy.deepcopy(value)
+                })
+            elif not _equal(old[key], value):
+                _diff(old[key], value, key_path, ops)
+    elif isinstance(old, list):
+        # Skip the common head and tail, so an edit in the middle of a list
+        # does not rewrite every element after it
+        prefix = 0
+        max_prefix = min(len(old), len(new))
+        while prefix < max_prefix and _equal(old[prefix], new[prefix]):
+            prefix += 1
+        suffix = 0
+        max_suffix = max_prefix - prefix
+        while suffix < max_suffix and _equal(old[-1 - suffix],
+                                                  new[-1 - suffix]):
+            suffix += 1
+        old_middle = old[prefix:len(old) - suffix]
+        new_middle = new[prefix:len(new) - suffix]
+        common = min(len(old_middle), len(new_middle))
+        for index in range(common):
+            _diff(old_middle[index], new_middle[index],
+                  f"{path}/{prefix + index}", ops)
+        for _ in range(len(old_middle) - common):
+            ops.append({"op": "remove", "path": f"{path}/{prefix + common}"})
+        for index in range(common, len(new_middle)):
+            ops.append({
+                "op": "add",
+                "path": f"{path}/{prefix + index}",
+                "value": copy.deepcopy(new_middle[index])
+            })
+    elif old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+def make_patch(old, new) -> list:
+    """Return the list of JSON-patch operations that turn old into new."""
+    ops = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def apply_patch(document, ops: list):
+    """
+    Apply JSON-patch operations to document, in place where possible.
+
+    Values are copied from the patch, so the patch can be applied again later.
+
+    Returns:
+        The patched document (a new object if the root was replaced).
+    """
+    for op in ops:
+        path = op["path"]
+        if path == "":
+            document = copy.deepcopy(op["value"])
+            continue
+        tokens = [_unescape_token(token) for token in path.split("/")[1:]]
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent,
+                                                      list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            index = int(last)
+            if op["op"] == "add":
+                parent.insert(index, copy.deepcopy(op["value"]))
+            elif op["op"] == "remove":
+                del parent[index]
+            else:
+                parent[index] = copy.deepcopy(op["value"])
+        else:
+            if op["op"] == "remove":
+                del parent[last]
+            else:
+                parent[last] = copy.deepcopy(op["value"])
+    return document
+
+
+def natural_key(file_name):
+    """Sort key that orders numbered file names by number (animation_2 before animation_10)."""
+    return [
+        int(part) if part.isdigit() else part
+        for part in re.split(r"(\d+)", file_name)
+    ]
+
+
+def make_text_delta(old: str, new: str) -> list:
+    """Return [prefix length, suffix length, middle], the edit that turns old into new."""
+    prefix = 0
+    max_prefix = min(len(old), len(new))
+    while prefix < max_prefix and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return [prefix, suffix, new[prefix:len(new) - suffix]]
+
+
+def apply_text_delta(text: str, delta: list) -> str:
+    prefix, suffix, middle = delta
+    return text[:prefix] + middle + text[len(text) - suffix:]
+
+
+def _minify(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class StepHistory:
+    """
+    List-like store of animation steps, encoded as checkpoints and deltas.
+
+    Indexing and iteration return the steps in the same form they were added
+    (a JSON string or a dict), so it can stand in for the plain list in
+    Sequence.sequences. get_step returns the SequenceStep view of a step.
+    """
+
+    def __init__(self, sequences=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self._records = []
+        self._latest_step = None
+        self._step_cache = OrderedDict()
+        for sequence in sequences or []:
+            self.append(sequence)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        for index in range(len(self._records)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.get_step(index).raw
+
+    def copy(self):
+        """Return the steps as a plain list, like list.copy()."""
+        return list(self)
+
+    def append(self, sequence):
+        """Add a step: a JSON string, a dict or a SequenceStep."""
+        step = sequence if isinstance(sequence,
+                                      SequenceStep) else SequenceStep(sequence)
+        if not step.is_json():
+            record = {"kind": KIND_RAW, "text": step.text}
+        else:
+            kind = KIND_TEXT if isinstance(step.raw, str) else KIND_DICT
+            previous = self._latest_step
+            if (len(self._records) % self.checkpoint_interval == 0
+                    or previous is None or not previous.is_json()):
+                record = {"kind": kind, "checkpoint": _minify(step.data)}
+            else:
+                record = {
+                    "kind": kind,
+                    "patch": make_patch(previous.data, step.data)
+                }
+            # Text that _materialize would not rebuild as is is stored verbatim at
+            # a checkpoint, and as a delta against the previous step's text otherwise
+            if kind == KIND_TEXT and step.text != json.dumps(step.data,
+                                                             indent=TEXT_INDENT):
+                if "checkpoint" in record:
+                    record["text"] = step.text
+                else:
+                    record["text_delta"] = make_text_delta(
+                        previous.text, step.text)
+        self._records.append(record)
+        self._latest_step = step
+
+    def get_step(self, index: int) -> SequenceStep:
+        """Return the SequenceStep view of a step (0-based, negative indexes allowed)."""
+        if index < 0:
+            index += len(self._records)
+        if index < 0 or index >= len(self._records):
+            raise IndexError("step index out of range")
+        if index == len(self._records) - 1:
+            return self._latest_step
+        step = self._step_cache.get(index)
+        if step is None:
+            step = self._materialize(index)
+            self._step_cache[index] = step
+            if len(self._step_cache) > STEP_CACHE_SIZE:
+                self._step_cache.popitem(last=False)
+        else:
+            self._step_cache.move_to_end(index)
+        return step
+
+    def _materialize(self, index: int) -> SequenceStep:
+        record = self._records[index]
+        if record["kind"] == KIND_RAW:
+            return SequenceStep(record["text"])
+
+        start = index
+        while "checkpoint" not in self._records[start]:
+            start -= 1
+        data = json.loads(self._records[start]["checkpoint"])
+        # Stored text of the step reached so far, None if it is the indented JSON
+        text = self._records[start].get("text")
+        for record_index in range(start + 1, index + 1):
+            step_record = self._records[record_index]
+            if "text_delta" in step_record:
+                previous_text = text if text is not None else json.dumps(
+                    data, indent=TEXT_INDENT)
+                text = apply_text_delta(previous_text,
+                                        step_record["text_delta"])
+            else:
+                text = step_record.get("text")
+            data = apply_patch(data, step_record["patch"])
+
+        if record["kind"] == KIND_DICT:
+            return SequenceStep(data)
+        if text is None:
+            text = json.dumps(data, indent=TEXT_INDENT)
+        return SequenceStep(text, data=data)
+
+    def dump(self, path: str):
+        """Write the history to a compact JSONL file (a header line, then one record per step)."""
+        with open(path, "w") as f:
+            f.write(
+                json.dumps({
+                    "format": HISTORY_FORMAT,
+                    "version": HISTORY_FORMAT_VERSION,
+                    "checkpoint_interval": self.checkpoint_interval,
+                    "num_steps": len(self._records),
+                }) + "\n")
+            for record in self._records:
+                f.write(_minify(record) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "StepHistory":
+        """Read a history written by dump."""
+        with open(path, "r") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != HISTORY_FORMAT:
+                raise ValueError(f"{path} is not a step history file")
+            if header.get("version") != HISTORY_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported step history version: {header.get('version')}"
+                )
+            history = cls(checkpoint_interval=header.get(
+                "checkpoint_interval", CHECKPOINT_INTERVAL))
+            history._records = [json.loads(line) for line in f if line.strip()]
+        if history._records:
+            history._latest_step = history._materialize(
+                len(history._records) - 1)
+        return history
+
+
+def effects_by_number(data):
+    """Map the effect_number (or position) of each effect of an animation step to the effect, None if it has no effects list."""
+    animation = data.get("animation") if isinstance(data, dict) else None
+    effects = animation.get("effects") if isinstance(animation, dict) else None
+    if not isinstance(effects, list):
+        return None
+    return {
+        effect.get("effect_number", index) if isinstance(effect, dict) else index:
+        effect
+        for index, effect in enumerate(effects)
+    }
+
+
+def diff_effects(old, new) -> dict:
+    """
+    Summarize what changed between two animation steps.
+
+    Effects are matched by effect_number (or by position when it is missing).
+
+    Returns:
+        dict: {"added": [...], "changed": [...], "removed": [...]} effect numbers,
+            and "fields": JSON-patch paths of changes outside the effects list.
+    """
+    old_effects = effects_by_number(old) or {}
+    new_effects = effects_by_number(new) or {}
+    changes = {
+        "added": [number for number in new_effects if number not in old_effects],
+        "changed": [
+            number for number in new_effects
+            if number in old_effects and old_effects[number] != new_effects[number]
+        ],
+        "removed":
+        [number for number in old_effects if number not in new_effects],
+    }
+
+    old_rest, new_rest = old, new
+    if isinstance(old, dict) and isinstance(new, dict):
+        old_rest = {
+            key: value
+            for key, value in old.items() if key != "animation"
+        }
+        new_rest = {
+            key: value
+            for key, value in new.items() if key != "animation"
+        }
+        if isinstance(old.get("animation"), dict) and isinstance(
+                new.get("animation"), dict):
+            old_rest["animation"] = {
+                key: value
+                for key, value in old["animation"].items() if key != "effects"
+            }
+            new_rest["animation"] = {
+                key: value
+                for key, value in new["animation"].items() if key != "effects"
+            }
+    changes["fields"] = sorted(
+        {op["path"] or "/"
+         for op in make_patch(old_rest, new_rest)})
+    return changes
@@ -6,16 +6,32 @@ API_TIMEOUT = 10
 
 # XML sequence tag
 TIME_FORMAT = "%d-%m-%Y %H:%M:%S"
-LOG_INTERVAL_IN_SECONDS = 60
+# Message journal: maximum seconds between fsyncs, and pending messages that trigger an early flush
+JOURNAL_FLUSH_INTERVAL_IN_SECONDS = 1
+JOURNAL_BATCH_SIZE = 32
 
 # Snapshots
 SNAPSHOTS_DIR = "ui/tkinter/snapshots"
 MESSAGE_SNAPSHOT_FILE = "messages.json"
 CONFIG_FILE = "config.json"
+# Compact checkpoint + delta history of all animation steps
+ANIMATION_HISTORY_FILE = "animation_history.jsonl"
 
 # Animations
 ANIMATION_OUT_TEMP_DIR = "tmp_animation/"
 
+# Prompt capture: content-addressed copies of the prompts sent to the LLM
+PROMPT_CAPTURE_DIR = "prompts/captures"
+PROMPT_CAPTURE_MAX_CAPTURES = 100
+PROMPT_CAPTURE_QUEUE_SIZE = 16
+PROMPT_CAPTURE_LATEST_PROMPT_FILE = "prompts/prompt_with_all_messages_music_and_animation.md"
+PROMPT_CAPTURE_LATEST_SKELETON_FILE = "prompts/skeleton_prompt.md"
+
+# Response cache: validated LLM responses keyed by a hash of the request
+RESPONSE_CACHE_FILE = "cache/response_cache.sqlite3"
+RESPONSE_CACHE_MAX_BYTES = 100 * 1024 * 1024
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
 # Kivsee
 KIVSEE_HOUSE_PATH = "animation/frameworks/kivsee/world_structure.txt"
 KIVSEE_LEARNING_PATH = "prompts/kivsee/learning.json"
@@ -1,9 +1,12 @@
+import copy
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional, Union, List
 import json
 import logging
 import typing
 from animation.animation_manager import AnimationManager
+from animation.frameworks.sequence_step import SequenceStep
+from animation.beat_quantizer import DEFAULT_SUBDIVISION, DEFAULT_TOLERANCE_MS, describe_moves, quantize_effects
 from memory.memory_manager import MemoryManager
 from controller.message_streamer import TAG_SYSTEM_INTERNAL
 from music.song_provider import SongProvider
@@ -70,10 +73,14 @@ class Action(ABC):
 
 class UpdateAnimationAction(Action):
 
-    def __init__(self, animation_manager: AnimationManager, message_streamer,
-                 config: Dict[str, Any]):
+    def __init__(self,
+                 animation_manager: AnimationManager,
+                 message_streamer,
+                 config: Dict[str, Any],
+                 song_provider: Optional[SongProvider] = None):
         super().__init__(message_streamer)
         self.animation_manager = animation_manager
+        self.song_provider = song_provider
         self._purpose = "Create or update an animation sequence. This action will add the animation to the sequence manager."
         self.config = config
         self._song_name = config.get("song_name")
@@ -83,6 +90,8 @@ class UpdateAnimationAction(Action):
             # "step_number":
             # "The step number that will be assigned if confirmed",
         }
+        # Elements uploaded by store_partial since the last complete animation was stored
+        self._partial_elements = set()
 
     def _get_params_dict(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Convert params to dictionary if it's a Pydantic model"""
@@ -107,13 +116,89 @@ class UpdateAnimationAction(Action):
         except Exception as e:
             return f"Error rendering animation preview: {e}"
 
+    def store_partial(self, animation_sequence):
+        """
+        Upload an animation that is still being generated, without playing it.
+        It is quantized as execute() would, so elements whose effects are already
+        complete are skipped as unchanged when the final animation is rendered.
+        """
+        # Validated and dumped as the action params are, so the payloads match
+        sequence_model = self.animation_manager.get_response_object()
+        animation_sequence = sequence_model.model_validate(
+            animation_sequence).model_dump(exclude_unset=True,
+                                           exclude_none=True)
+        animation_sequence, _ = self.quantize(animation_sequence)
+        report = self.animation_manager.store(animation_sequence,
+                                              self._song_name)
+        if report:
+            self._partial_elements.update(report["succeeded"] +
+                                          report["failed"])
+        return report
+
+    def restore_stored_animation(self):
+        """
+        Undo the uploads of store_partial when the streamed animation did not
+        complete: the latest animation step is stored again, and elements only
+        the partial animation had effects for are cleared. Elements that were
+        not changed since are skipped as unchanged.
+
+        Returns the upload report, or None if there was nothing to restore.
+        """
+        if not self._partial_elements:
+            return None
+        latest_step = self.animation_manager.get_latest_step()
+        previous_animation = latest_step.to_dict() if latest_step else {
+            "animation": {
+                "effects": []
+            }
+        }
+        try:
+            report = self.animation_manager.store(
+                previous_animation,
+                self._song_name,
+                clear_elements=self._partial_elements)
+            self._partial_elements = set()
+            return report
+        except Exception as e:
+            self.logger.error(f"Error restoring the stored animation: {e}")
+            return None
+
+    def quantize(self, animation_sequence):
+        """
+        Snap the effect boundaries to the song's beat grid, if enabled in the config.
+
+        Returns:
+            tuple: (animation_sequence, moves), see quantize_effects.
+        """
+        if (not self.config.get("quantize_to_beats", False)
+                or not self.song_provider or not self._song_name):
+            return animation_sequence, []
+        try:
+            timeline = self.song_provider.get_timeline(self._song_name)
+        except ValueError as e:
+            self.logger.warning(f"Skipping beat quantization: {e}")
+            return animation_sequence, []
+        return quantize_effects(
+            animation_sequence, timeline,
+            self.config.get("quantize_subdivision", DEFAULT_SUBDIVISION),
+            self.config.get("quantize_tolerance_ms", DEFAULT_TOLERANCE_MS))
+
     def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         params_dict = self._get_params_dict(params)
-        animation_str = json.dumps(params_dict["animation_sequence"], indent=4)
 
         try:
+            animation_sequence, moves = self.quantize(
+                params_dict["animation_sequence"])
+            if moves:
+                self.logger.info(describe_moves(moves))
+            animation_str = json.dumps(animation_sequence, indent=4)
+
             # Directly add the animation to the sequence manager
-            result_message = self.animation_manager.add_sequence(animation_str)
+            # The parsed sequence is already at hand, so the stored step does not re-parse it.
+            # The step gets its own copy, the caller's params stay free to change.
+            result_message = self.animation_manager.add_sequence(
+                SequenceStep(animation_str,
+                             data=copy.deepcopy(animation_sequence)))
             # current_steps_count = len(
             #     self.animation_manager.sequence_manager.steps)
 
@@ -125,13 +210,17 @@ class UpdateAnimationAction(Action):
                 #     "step_number": current_steps_count
                 # }
             }
+            if moves:
+                result["message"] += f"\n{describe_moves(moves)}"
+                result["quantized_boundaries"] = moves
 
             # Auto-render if configured
             if self.config.get("auto_render", False):
-                render_result = self.render_preview(
-                    params_dict["animation_sequence"])
+                render_result = self.render_preview(animation_sequence)
                 result[
                     "message"] += f"\nRendering animation preview...\n{render_result}"
+                # The complete animation replaced the partial uploads
+                self._partial_elements = set()
 
             self._log_action_result("update_animation", result)
             return result
@@ -142,6 +231,7 @@ class UpdateAnimationAction(Action):
                 "message": f"Error adding animation sequence: {str(e)}",
                 "confirmation_type": self.confirmation_type
             }
+            self.restore_stored_animation()
             self._log_action_result("update_animation", error_result)
             return error_result
 
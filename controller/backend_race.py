@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("BackendRace")
+
+
+async def race_backends(backends, messages, response_schema=None, timeout=None):
+    """
+    Sends the same messages to several backends and returns the first valid response.
+
+    Every backend validates its response against the schema (agenerate_response
+    raises when it does not), so the first backend to return wins and the other
+    requests are cancelled. Backends that fail are skipped while the others are
+    still running.
+
+    :param backends: The LLMBackend instances to race.
+    :param messages: The messages sent to every backend.
+    :param response_schema: Optional schema, each backend's response_schema_obj if None.
+    :param timeout: Optional number of seconds to wait for a valid response.
+    :return: dict with the "response", the winning "backend" name, its "latency"
+        in seconds, the "cancelled" backend names and the "errors" of the failed ones.
+    :raises RuntimeError: If no backend returned a valid response.
+    """
+    if not backends:
+        raise ValueError("No backends to race.")
+
+    start_time = time.monotonic()
+    tasks = {
+        asyncio.create_task(
+            backend.agenerate_response(messages, response_schema)):
+        backend.name
+        for backend in backends
+    }
+    errors = {}
+    deadline = None if timeout is None else start_time + timeout
+    try:
+        pending = set(tasks)
+        while pending:
+            remaining = None if deadline is None else max(
+                0.0, deadline - time.monotonic())
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            # Several requests can finish in the same iteration, the earliest
+            # started one of them is kept so the result does not depend on set order
+            for task in sorted(done, key=list(tasks).index):
+                name = tasks[task]
+                if task.exception() is not None:
+                    errors[name] = str(task.exception())
+                    logger.warning(
+                        f"Backend {name} failed in race: {task.exception()}")
+                    continue
+                latency = time.monotonic() - start_time
+                return {
+                    "response": task.result(),
+                    "backend": name,
+                    "latency": latency,
+                    "cancelled": sorted(tasks[other] for other in pending),
+                    "errors": errors,
+                }
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if len(errors) < len(tasks):
+        raise RuntimeError(
+            f"No backend returned a valid response within {timeout} seconds.")
+    raise RuntimeError("All raced backends failed: " + "; ".join(
+        f"{name}: {error}" for name, error in errors.items()))
@@ -1,18 +1,80 @@
+import asyncio
+import json
 import logging
+import random
+import threading
+import time
+import weakref
 from abc import ABC, abstractmethod
 
 import anthropic
 import instructor
 import openai
 import tiktoken  # Kept for potential fallback or other uses, but not for primary token logging
+from controller.token_budget import TokenCounter
+from controller.response_cache import ResponseCache, CACHE_REFRESH, CACHE_BYPASS, CACHE_MODES
+from controller.replay import load_recorded_responses, complete_response
 from lol_secrets import OPENAI_API_KEY, CLAUDE_API_KEY, GEMINI_API_KEY
 from pydantic import BaseModel, ValidationError
+from pydantic_core import from_json
+from instructor import openai_schema
 from instructor.exceptions import InstructorRetryException
 import google.generativeai as genai
-from constants import MODEL_CONFIGS
+from constants import MODEL_CONFIGS, RESPONSE_CACHE_FILE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS
 
 MAX_RETRIES = 1
 INSTRACTOR_RETRIES = 0
+# A streamed response is re-parsed after this many new characters, or when an
+# object closes, so callers see partial responses without parsing every chunk
+STREAM_PARSE_MIN_CHARS = 64
+# Characters per chunk when the replay backend streams a recorded response
+REPLAY_STREAM_CHUNK_CHARS = 64
+
+# Message key set by the Formatter on the leading messages that are identical on
+# every turn. Backends use it to enable provider prompt caching, and strip it
+# before sending the messages.
+CACHE_PREFIX_KEY = "cache_prefix"
+
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+# Async clients hold connection pools bound to the event loop that uses them,
+# so they are shared per event loop (a single one in a typical process)
+_shared_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_shared_client(key, factory):
+    """
+    Return the process wide client for key, creating it with factory on first use.
+    Backends share their provider clients (and connection pools) this way.
+    """
+    with _shared_clients_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            client = _shared_clients[key] = factory()
+        return client
+
+
+def get_shared_async_client(key, factory):
+    """
+    Return the async client for key shared by all backends on the running event
+    loop, creating it with factory on first use. Must be called from a coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    with _shared_clients_lock:
+        clients = _shared_async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = factory()
+        return client
+
+
+def strip_cache_markers(messages):
+    """Return the messages without the CACHE_PREFIX_KEY marker."""
+    return [{
+        key: value
+        for key, value in message.items() if key != CACHE_PREFIX_KEY
+    } for message in messages]
 
 
 class LLMBackend(ABC):  # Inherit from ABC for abstract methods
@@ -30,6 +92,66 @@ class LLMBackend(ABC):  # Inherit from ABC for abstract methods
         self.response_schema_obj = response_schema_obj
         self.intstructor_response = self.config.get("instructor_response",
                                                     False)
+        self._token_counter = None
+        # "use" serves identical requests from the disk cache, "refresh" only
+        # stores new responses, "bypass" (default) skips the cache
+        self.response_cache_mode = self.config.get("response_cache_mode",
+                                                   CACHE_BYPASS)
+        self._response_cache = None
+
+    def get_response_cache(self) -> ResponseCache:
+        """The response cache shared by the backends using the same cache file."""
+        if self._response_cache is None:
+            path = self.config.get("response_cache_file", RESPONSE_CACHE_FILE)
+            self._response_cache = get_shared_client(
+                ("response_cache", path), lambda: ResponseCache(
+                    path,
+                    max_bytes=self.config.get("response_cache_max_bytes",
+                                              RESPONSE_CACHE_MAX_BYTES),
+                    ttl_seconds=self.config.get("response_cache_ttl_seconds",
+                                                RESPONSE_CACHE_TTL_SECONDS)))
+        return self._response_cache
+
+    def _read_cache(self, messages, response_schema, cache_mode):
+        """
+        Looks the request up in the response cache.
+
+        Returns:
+            tuple: (key, response), key is None when the cache is bypassed and
+                response is None on a miss.
+        """
+        cache_mode = cache_mode or self.response_cache_mode
+        if cache_mode not in CACHE_MODES:
+            self.logger.warning(
+                f"Unknown response cache mode '{cache_mode}', bypassing the cache.")
+            return None, None
+        if cache_mode == CACHE_BYPASS:
+            return None, None
+        cache = self.get_response_cache()
+        key = cache.make_key(getattr(self, "model", self.name),
+                             self.temperature, response_schema, messages)
+        if cache_mode == CACHE_REFRESH:
+            return key, None
+        cached = cache.get(key)
+        if cached is None:
+            return key, None
+        try:
+            response = response_schema.model_validate_json(cached)
+        except ValidationError as e:
+            self.logger.warning(f"[{self.name}] Ignoring invalid cached response: {e}")
+            return key, None
+        self.logger.info(f"[{self.name}] Response served from cache")
+        return key, response
+
+    def _write_cache(self, key, response):
+        if key is not None:
+            self.get_response_cache().put(key, response.model_dump_json())
+
+    def get_token_counter(self) -> TokenCounter:
+        """Token counter for this backend's model, used to budget the prompt."""
+        if self._token_counter is None:
+            self._token_counter = TokenCounter(getattr(self, "model", None))
+        return self._token_counter
 
     @abstractmethod
     def _make_api_call(self, messages, response_schema):
@@ -47,7 +169,58 @@ class LLMBackend(ABC):  # Inherit from ABC for abstract methods
         """
         pass
 
-    def generate_response(self, messages, response_schema=None) -> BaseModel:
+    async def _amake_api_call(self, messages, response_schema):
+        """
+        Performs the API call without blocking the event loop.
+        Backends with an async provider client override this, the default runs
+        _make_api_call in a worker thread.
+        """
+        return await asyncio.to_thread(self._make_api_call, messages,
+                                       response_schema)
+
+    def _stream_api_call(self, messages, response_schema):
+        """
+        Performs the API call with streaming, yielding the response JSON in text chunks.
+        Returns None if the backend cannot stream, stream_response then falls back
+        to generate_response.
+        """
+        return None
+
+    def _get_cached_token_counts(self, response):
+        """
+        Extract (cache_read_tokens, cache_write_tokens) from the raw API response.
+        Backends without prompt caching information return (None, None).
+        """
+        return None, None
+
+    def _log_token_usage(self, response):
+        """Logs the token usage of a response, using _get_token_counts."""
+        prompt_tokens, completion_tokens = self._get_token_counts(response)
+        if prompt_tokens is not None and completion_tokens is not None:
+            self.logger.info(
+                f"[{self.name}] Tokens sent: {prompt_tokens}, Tokens received: {completion_tokens}"
+            )
+            cache_read, cache_write = self._get_cached_token_counts(response)
+            if cache_read is not None or cache_write is not None:
+                self.logger.info(
+                    f"[{self.name}] Prompt cache tokens read: {cache_read or 0}, written: {cache_write or 0}"
+                )
+        else:
+            self.logger.warning(
+                f"[{self.name}] Could not retrieve token usage information from response."
+            )
+
+    def _handle_validation_error(self, error, attempt, current_messages):
+        self.logger.warning(
+            f"\n\nValidation failed on attempt {attempt + 1}: {error}")
+        # Append error message to messages for re-attempt
+        error_message = f"The previous response did not match the expected schema. Error: {error}"
+        current_messages.append({"role": "system", "content": error_message})
+
+    def generate_response(self,
+                          messages,
+                          response_schema=None,
+                          cache_mode=None) -> BaseModel:
         """
         Generates a response from the LLM, handling retries and validation.
         Logs token usage by calling _get_token_counts.
@@ -55,39 +228,138 @@ class LLMBackend(ABC):  # Inherit from ABC for abstract methods
         Args:
             messages: List of messages to send to the LLM
             response_schema: Optional schema to use for response validation. If None, uses self.response_schema_obj
+            cache_mode: Optional response cache mode for this call ("use", "refresh" or "bypass"). If None, uses self.response_cache_mode
         """
+        response_schema = response_schema or self.response_schema_obj
+        cache_key, cached_response = self._read_cache(messages,
+                                                      response_schema,
+                                                      cache_mode)
+        if cached_response is not None:
+            return cached_response
+
         current_messages = list(
             messages)  # Create a mutable copy for appending error messages
 
         for attempt in range(MAX_RETRIES):
             try:
                 # Perform the API call specific to the backend
-                response = self._make_api_call(
-                    current_messages, response_schema
-                    or self.response_schema_obj)
-
-                # Extract and log token usage
-                prompt_tokens, completion_tokens = self._get_token_counts(
-                    response)
-                if prompt_tokens is not None and completion_tokens is not None:
-                    self.logger.info(
-                        f"[{self.name}] Tokens sent: {prompt_tokens}, Tokens received: {completion_tokens}"
-                    )
-                else:
-                    self.logger.warning(
-                        f"[{self.name}] Could not retrieve token usage information from response."
-                    )
+                response = self._make_api_call(current_messages,
+                                               response_schema)
+                self._log_token_usage(response)
+                self._write_cache(cache_key, response)
+                return response
+            except (ValidationError, InstructorRetryException) as e:
+                self._handle_validation_error(e, attempt, current_messages)
+            except Exception as e:
+                self.logger.error(
+                    f"Error communicating with {self.name} API on attempt {attempt + 1}: {e}"
+                )
+                raise
+
+        raise RuntimeError(
+            f"Max retries exceeded for {self.name} response generation.")
+
+    def stream_response(self,
+                        messages,
+                        on_partial,
+                        response_schema=None,
+                        cache_mode=None) -> BaseModel:
+        """
+        Generates a response from the LLM while it is streamed.
+        on_partial(partial, done) is called with the response JSON parsed so far
+        (incomplete strings are cut, unfinished objects hold the keys seen so far),
+        and once more with done=True when the whole response arrived.
+        The full response is validated against the schema at the end, as in generate_response.
+
+        Args:
+            messages: List of messages to send to the LLM
+            on_partial: Callback receiving (partial_dict, done)
+            response_schema: Optional schema to use for response validation. If None, uses self.response_schema_obj
+            cache_mode: Optional response cache mode for this call, see generate_response
+        """
+        response_schema = response_schema or self.response_schema_obj
+        cache_key, cached_response = self._read_cache(messages,
+                                                      response_schema,
+                                                      cache_mode)
+        if cached_response is not None:
+            on_partial(cached_response.model_dump(), True)
+            return cached_response
+
+        current_messages = list(messages)
 
+        for attempt in range(MAX_RETRIES):
+            chunks = self._stream_api_call(current_messages, response_schema)
+            if chunks is None:
+                response = self.generate_response(current_messages,
+                                                  response_schema,
+                                                  cache_mode=CACHE_BYPASS)
+                self._write_cache(cache_key, response)
+                on_partial(response.model_dump(), True)
+                return response
+            try:
+                text = ""
+                parsed_length = 0
+                for chunk in chunks:
+                    text += chunk
+                    if len(text) - parsed_length < STREAM_PARSE_MIN_CHARS and "}" not in chunk:
+                        continue
+                    parsed_length = len(text)
+                    try:
+                        partial = from_json(text, allow_partial="trailing-strings")
+                    except ValueError:
+                        continue
+                    if isinstance(partial, dict):
+                        on_partial(partial, False)
+
+                response = response_schema.model_validate_json(text)
+                self.logger.info(
+                    f"[{self.name}] Streamed response of {len(text)} characters")
+                self._write_cache(cache_key, response)
+                on_partial(from_json(text), True)
+                return response
+            except ValidationError as e:
+                self._handle_validation_error(e, attempt, current_messages)
+            except Exception as e:
+                self.logger.error(
+                    f"Error communicating with {self.name} API on attempt {attempt + 1}: {e}"
+                )
+                raise
+
+        raise RuntimeError(
+            f"Max retries exceeded for {self.name} response generation.")
+
+    async def agenerate_response(self,
+                                 messages,
+                                 response_schema=None,
+                                 cache_mode=None) -> BaseModel:
+        """
+        Async version of generate_response. The provider call runs on the event
+        loop through the backend's shared async client, so many requests can be
+        in flight without a thread each.
+
+        Args:
+            messages: List of messages to send to the LLM
+            response_schema: Optional schema to use for response validation. If None, uses self.response_schema_obj
+            cache_mode: Optional response cache mode for this call, see generate_response
+        """
+        response_schema = response_schema or self.response_schema_obj
+        cache_key, cached_response = self._read_cache(messages,
+                                                      response_schema,
+                                                      cache_mode)
+        if cached_response is not None:
+            return cached_response
+
+        current_messages = list(messages)
+
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = await self._amake_api_call(current_messages,
+                                                      response_schema)
+                self._log_token_usage(response)
+                self._write_cache(cache_key, response)
                 return response
             except (ValidationError, InstructorRetryException) as e:
-                self.logger.warning(
-                    f"\n\nValidation failed on attempt {attempt + 1}: {e}")
-                # Append error message to messages for re-attempt
-                error_message = f"The previous response did not match the expected schema. Error: {e}"
-                current_messages.append({
-                    "role": "system",
-                    "content": error_message
-                })
+                self._handle_validation_error(e, attempt, current_messages)
             except Exception as e:
                 self.logger.error(
                     f"Error communicating with {self.name} API on attempt {attempt + 1}: {e}"
@@ -114,25 +386,68 @@ class GPTBackend(LLMBackend):
         self.logger.info(f"Using {name} model: {self.model}")
 
         try:
-            self.client = instructor.from_openai(
-                openai.OpenAI(api_key=OPENAI_API_KEY))
+            self.client = get_shared_client(
+                "openai", lambda: instructor.from_openai(
+                    openai.OpenAI(api_key=OPENAI_API_KEY)))
         except Exception as e:
             self.logger.error(f"Error initializing OpenAI client: {e}")
             raise
 
-    def _make_api_call(self, messages, response_schema):
-        """
-        Performs the OpenAI API call.
-        """
-        return self.client.chat.completions.create(
+    def _get_request(self, messages, response_schema):
+        return dict(
             model=self.model,
-            messages=messages,
+            messages=strip_cache_markers(messages),
             max_tokens=self.max_tokens,
             temperature=self.temperature,
             response_model=response_schema,
             max_retries=INSTRACTOR_RETRIES,
         )
 
+    def _make_api_call(self, messages, response_schema):
+        """
+        Performs the OpenAI API call.
+        OpenAI caches long prompt prefixes automatically, the Formatter keeps the
+        leading messages byte-identical across turns so the cache is hit.
+        """
+        return self.client.chat.completions.create(
+            **self._get_request(messages, response_schema))
+
+    def _stream_api_call(self, messages, response_schema):
+        """
+        Streams the arguments of a forced tool call with the schema, as instructor
+        builds it, from the underlying OpenAI client.
+        """
+        request = self._get_request(messages, response_schema)
+        del request["response_model"], request["max_retries"]
+        tool = openai_schema(response_schema).openai_schema
+        stream = self.client.client.chat.completions.create(
+            **request,
+            tools=[{
+                "type": "function",
+                "function": tool
+            }],
+            tool_choice={
+                "type": "function",
+                "function": {
+                    "name": tool["name"]
+                }
+            },
+            stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.tool_calls:
+                continue
+            for tool_call in chunk.choices[0].delta.tool_calls:
+                if tool_call.function and tool_call.function.arguments:
+                    yield tool_call.function.arguments
+
+    async def _amake_api_call(self, messages, response_schema):
+        client = get_shared_async_client(
+            "openai", lambda: instructor.from_openai(
+                openai.AsyncOpenAI(api_key=OPENAI_API_KEY)))
+        return await client.chat.completions.create(
+            **self._get_request(messages, response_schema))
+
     def _get_token_counts(self, response):
         """
         Extracts token counts from GPT API response.
@@ -141,6 +456,13 @@ class GPTBackend(LLMBackend):
             return response.usage.prompt_tokens, response.usage.completion_tokens
         return None, None
 
+    def _get_cached_token_counts(self, response):
+        usage = getattr(response, 'usage', None)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        if details is not None:
+            return getattr(details, 'cached_tokens', None), None
+        return None, None
+
 
 class ClaudeBackend(LLMBackend):
     """Implementation of LLMBackend for Claude models."""
@@ -158,43 +480,103 @@ class ClaudeBackend(LLMBackend):
         self.logger.info(f"Using {name} model: {self.model}")
 
         try:
-            self.client = instructor.from_anthropic(
-                anthropic.Anthropic(api_key=CLAUDE_API_KEY))
+            self.client = get_shared_client(
+                "anthropic", lambda: instructor.from_anthropic(
+                    anthropic.Anthropic(api_key=CLAUDE_API_KEY)))
         except Exception as e:
             self.logger.error(f"Error initializing Anthropic client: {e}")
             raise
 
-    def _make_api_call(self, messages, response_schema):
+    def _get_request(self, messages, response_schema):
         """
-        Performs the Claude API call, handling system messages.
+        Builds the Claude API call arguments, handling system messages.
+        The leading cache-prefix messages become system blocks, the last one marked
+        with cache_control, so repeated turns read them from the prompt cache.
+        The other system messages follow them as one more system block.
         """
+        num_prefix = 0
+        while (num_prefix < len(messages)
+               and messages[num_prefix].get(CACHE_PREFIX_KEY)
+               and messages[num_prefix]["role"] == "system"):
+            num_prefix += 1
+
         system_messages = [
-            m["content"] for m in messages if m["role"] == "system"
+            m["content"] for m in messages[num_prefix:] if m["role"] == "system"
         ]
         chat_messages = [{
             "role": m["role"],
             "content": m["content"]
         } for m in messages if m["role"] != "system"]
 
-        if system_messages:
-            system_prompt = "\n".join(system_messages)
-            if chat_messages:
-                # Prepend system prompt to the first user message
-                chat_messages[0][
-                    "content"] = f"{system_prompt}\n{chat_messages[0]['content']}"
-            else:
-                # If only system messages, make them a user message for the API
-                chat_messages = [{"role": "user", "content": system_prompt}]
+        if not chat_messages:
+            # If only system messages, make them a user message for the API
+            system_prompt = "\n".join(
+                [m["content"] for m in messages[:num_prefix]] + system_messages)
+            chat_messages = [{"role": "user", "content": system_prompt}]
+            system_blocks = []
+        else:
+            system_blocks = [{
+                "type": "text",
+                "text": m["content"]
+            } for m in messages[:num_prefix]]
+            if system_blocks:
+                system_blocks[-1]["cache_control"] = {"type": "ephemeral"}
+            if system_messages:
+                system_blocks.append({
+                    "type": "text",
+                    "text": "\n".join(system_messages)
+                })
 
-        return self.client.messages.create(
+        kwargs = {}
+        if system_blocks:
+            kwargs["system"] = system_blocks
+
+        return dict(
             model=self.model,
             messages=chat_messages,
             max_tokens=self.max_tokens,
             temperature=self.temperature,
             response_model=response_schema,
             max_retries=INSTRACTOR_RETRIES,
+            **kwargs,
         )
 
+    def _make_api_call(self, messages, response_schema):
+        """
+        Performs the Claude API call.
+        """
+        return self.client.messages.create(
+            **self._get_request(messages, response_schema))
+
+    def _stream_api_call(self, messages, response_schema):
+        """
+        Streams the input of a forced tool call with the schema, as instructor
+        builds it, from the underlying Anthropic client.
+        """
+        request = self._get_request(messages, response_schema)
+        del request["response_model"], request["max_retries"]
+        tool = openai_schema(response_schema).anthropic_schema
+        stream = self.client.client.messages.create(
+            **request,
+            tools=[tool],
+            tool_choice={
+                "type": "tool",
+                "name": tool["name"]
+            },
+            stream=True,
+        )
+        for event in stream:
+            if (event.type == "content_block_delta"
+                    and event.delta.type == "input_json_delta"):
+                yield event.delta.partial_json
+
+    async def _amake_api_call(self, messages, response_schema):
+        client = get_shared_async_client(
+            "anthropic", lambda: instructor.from_anthropic(
+                anthropic.AsyncAnthropic(api_key=CLAUDE_API_KEY)))
+        return await client.messages.create(
+            **self._get_request(messages, response_schema))
+
     def _get_token_counts(self, response):
         """
         Extracts token counts from Claude API response.
@@ -203,6 +585,13 @@ class ClaudeBackend(LLMBackend):
             return response.usage.input_tokens, response.usage.output_tokens
         return None, None
 
+    def _get_cached_token_counts(self, response):
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return None, None
+        return (getattr(usage, 'cache_read_input_tokens', None),
+                getattr(usage, 'cache_creation_input_tokens', None))
+
 
 class GeminiBackend(LLMBackend):
     """Implementation of LLMBackend for Gemini models."""
@@ -221,10 +610,11 @@ class GeminiBackend(LLMBackend):
 
         try:
             genai.configure(api_key=GEMINI_API_KEY)
-            self.client = instructor.from_gemini(
-                client=genai.GenerativeModel(model_name=self.model),
-                mode=instructor.Mode.GEMINI_JSON,
-            )
+            self.client = get_shared_client(
+                ("gemini", self.model), lambda: instructor.from_gemini(
+                    client=genai.GenerativeModel(model_name=self.model),
+                    mode=instructor.Mode.GEMINI_JSON,
+                ))
         except Exception as e:
             self.logger.error(f"Error initializing Gemini client: {e}")
             raise
@@ -233,10 +623,22 @@ class GeminiBackend(LLMBackend):
         """
         Performs the Gemini API call.
         """
-        return self.client.messages.create(messages=messages,
+        return self.client.messages.create(messages=strip_cache_markers(messages),
                                            response_model=response_schema,
                                            max_retries=INSTRACTOR_RETRIES)
 
+    async def _amake_api_call(self, messages, response_schema):
+        client = get_shared_async_client(
+            ("gemini", self.model), lambda: instructor.from_gemini(
+                client=genai.GenerativeModel(model_name=self.model),
+                mode=instructor.Mode.GEMINI_JSON,
+                use_async=True,
+            ))
+        return await client.messages.create(
+            messages=strip_cache_markers(messages),
+            response_model=response_schema,
+            max_retries=INSTRACTOR_RETRIES)
+
     def _get_token_counts(self, response):
         """
         Extracts token counts from Gemini API response.
@@ -244,3 +646,99 @@ class GeminiBackend(LLMBackend):
         if hasattr(response, 'usage_metadata') and response.usage_metadata:
             return response.usage_metadata.prompt_token_count, response.usage_metadata.candidates_token_count
         return None, None
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Offline backend serving recorded responses instead of calling an LLM.
+
+    The responses are read from the "replay_source" config, a snapshot directory
+    or a fixture directory (see controller/replay.py), or given directly. They
+    are served in order, starting over after the last one, each after an
+    artificial latency. This runs the controller, the actions and the render
+    pipeline deterministically without API keys or network.
+    """
+
+    def __init__(self,
+                 name,
+                 response_schema_obj: BaseModel,
+                 config=None,
+                 responses=None):
+        """
+        Args:
+            name: Name of the backend
+            response_schema_obj: Schema the responses are validated against (see complete_response), responses that do not validate are dropped
+            config: Config with "replay_source", "replay_latency_s", "replay_latency_jitter_s" and "replay_seed"
+            responses: Optional list of response dicts, replaces the ones of replay_source
+        """
+        super().__init__(name=name,
+                         response_schema_obj=response_schema_obj,
+                         config=config)
+        self.model = "replay"
+        self.latency_s = self.config.get("replay_latency_s", 0.0)
+        self.latency_jitter_s = self.config.get("replay_latency_jitter_s", 0.0)
+        self._random = random.Random(self.config.get("replay_seed", 0))
+        self._lock = threading.Lock()
+        self._next_index = 0
+
+        num_skipped = 0
+        if responses is None:
+            source = self.config.get("replay_source")
+            if not source:
+                raise ValueError(
+                    "ReplayBackend needs recorded responses or a replay_source.")
+            responses, num_skipped = load_recorded_responses(source)
+
+        self.responses = []
+        for response in responses:
+            try:
+                self.responses.append(
+                    complete_response(response, response_schema_obj))
+            except ValidationError:
+                num_skipped += 1
+        if not self.responses:
+            raise ValueError("No recorded response matches the response schema.")
+        self.logger.info(
+            f"[{self.name}] Replaying {len(self.responses)} recorded responses, {num_skipped} skipped"
+        )
+
+    def _next_response(self):
+        with self._lock:
+            response = self.responses[self._next_index % len(self.responses)]
+            self._next_index += 1
+            latency = self.latency_s + self._random.uniform(
+                -self.latency_jitter_s, self.latency_jitter_s)
+        return response, max(0.0, latency)
+
+    def _make_api_call(self, messages, response_schema):
+        """
+        Serves the next recorded response after the artificial latency.
+        """
+        response, latency = self._next_response()
+        time.sleep(latency)
+        return response_schema.model_validate(response)
+
+    async def _amake_api_call(self, messages, response_schema):
+        response, latency = self._next_response()
+        await asyncio.sleep(latency)
+        return response_schema.model_validate(response)
+
+    def _stream_api_call(self, messages, response_schema):
+        """
+        Streams the next recorded response JSON, the latency spread over its chunks.
+        """
+        response, latency = self._next_response()
+        text = json.dumps(response)
+        chunks = [
+            text[start:start + REPLAY_STREAM_CHUNK_CHARS]
+            for start in range(0, len(text), REPLAY_STREAM_CHUNK_CHARS)
+        ]
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield chunk
+
+    def _get_token_counts(self, response):
+        """
+        Estimates the tokens of the served response, nothing was sent.
+        """
+        return 0, self.get_token_counter().count(response.model_dump_json())
@@ -6,6 +6,22 @@ from memory.memory_manager import MemoryManager
 from music.song_provider import SongProvider
 from typing import Optional, Dict, Any
 from prompts.main_prompt import intro_prompt, skeleton_prompt, common_parts
+from controller.token_budget import ContextBudgeter, TokenCounter
+from controller.backends import CACHE_PREFIX_KEY
+from controller.prompt_capture import get_prompt_capture_sink
+from constants import PROMPT_CAPTURE_LATEST_PROMPT_FILE, PROMPT_CAPTURE_LATEST_SKELETON_FILE
+from animation.frameworks.step_history import diff_effects, effects_by_number
+from music.song_context import SongContextProvider
+
+# Values of config["animation_context_mode"]
+ANIMATION_CONTEXT_FULL = "full"  # the full JSON of the latest (or every) step
+ANIMATION_CONTEXT_DIFF = "diff"  # the latest step minified, and a change summary of recent steps
+DEFAULT_ANIMATION_CONTEXT_DIFF_STEPS = 3
+MAX_CACHED_STEP_DIFFS = 256
+
+# Values of config["song_context_mode"]
+SONG_CONTEXT_FULL = "full"  # every bar and beat of the song, every turn
+SONG_CONTEXT_WINDOW = "window"  # a song summary, and the song structure around the latest edited effects
 
 
 class Formatter:
@@ -32,6 +48,7 @@ class Formatter:
         self.song_provider = song_provider
         self.config = config or {}
         self.action_registry = action_registry
+        self.song_context_provider = SongContextProvider(song_provider)
 
         # Get all dynamic documentation
         actions_documentation = self.action_registry.get_actions_documentation(
@@ -47,15 +64,35 @@ class Formatter:
             result_format_doc=result_format_doc,
             response_format_doc=response_format_doc)
 
+        # Prompts are captured to disk in the background, unless disabled in the config
+        self.prompt_capture = get_prompt_capture_sink() if self.config.get(
+            "capture_prompts", True) else None
+
+        # Static prompt prefix (task, memory, song structure), rebuilt only when
+        # the memory, the song or its files change, so it is byte-identical across turns
+        self._static_prefix_key = None
+        self._static_prefix_sections = None
+
+        # Change summaries between consecutive animation steps, keyed by the step digests
+        self._step_diffs = {}
+
         # print("Formatter initialized successfully")
 
-    def build_messages(self):
+    def _get_static_prefix_sections(self):
         """
-        Constructs a list of messages for the LLM context based on the messages.
-
-        :return: List of formatted message dictionaries for the LLM.
+        Returns the (section_name, messages) pairs that start every prompt: the task,
+        the memory and the song structure. The messages are marked with CACHE_PREFIX_KEY
+        so the backends can enable provider prompt caching for them.
         """
-        messages = []
+        memory = self.memory_manager.get_memory()
+        memory_content = f"# Your Memory: {memory}" if memory else None
+        song_name = self.config.get("song_name")
+        song_window = self._is_song_window_mode()
+        song_signature = self.song_provider.get_timeline_signature(
+            song_name) if song_name else ()
+        key = (memory_content, song_name, song_window, song_signature)
+        if self._static_prefix_sections is not None and self._static_prefix_key == key:
+            return list(self._static_prefix_sections)
 
         # Build prompt content
         prompt_content = []
@@ -69,42 +106,209 @@ class Formatter:
             prompt_content.append("## Timing Knowledge\n")
             prompt_content.append(timing_knowledge)
 
-        messages.append({
+        task_messages = [{
             "role": "system",
-            "content": "\n".join(prompt_content)
-        })
+            "content": "\n".join(prompt_content),
+            CACHE_PREFIX_KEY: True
+        }]
 
         # Add memory info
-        memory = self.memory_manager.get_memory()
-        if memory:
-            messages.append({
+        memory_messages = []
+        if memory_content:
+            memory_messages.append({
                 "role": "system",
-                "content": f"# Your Memory: {memory}"
+                "content": memory_content,
+                CACHE_PREFIX_KEY: True
             })
 
+        song_messages = []
+        cacheable = True
         try:
-            song_name = self.config.get("song_name")
             if song_name:
-                song_info = self.song_provider.get_bars(
-                    song_name) + self.song_provider.get_beats(song_name)
+                # In window mode the song structure is sent after the animation,
+                # only the summary of the song is part of the static prefix
+                song_info = self.song_context_provider.get_summary(
+                    song_name) if song_window else self.song_provider.get_bars(
+                        song_name) + self.song_provider.get_beats(song_name)
                 if song_info:
-                    messages.append({
+                    song_messages.append({
                         "role": "system",
-                        "content": f"# The Song Structure:\n {song_info}"
+                        "content": f"# The Song Structure:\n {song_info}",
+                        CACHE_PREFIX_KEY: True
                     })
         except Exception as e:
-            # Log error but continue without song info
+            # Log error but continue without song info, and retry on the next turn
             print(f"Error getting song info: {e}")
+            cacheable = False
+
+        sections = [("task", task_messages), ("memory", memory_messages),
+                    ("song", song_messages)]
+        if cacheable:
+            self._static_prefix_key = key
+            self._static_prefix_sections = sections
+        return list(sections)
+
+    def _is_song_window_mode(self):
+        return self.config.get("song_context_mode",
+                               SONG_CONTEXT_FULL) == SONG_CONTEXT_WINDOW
+
+    def _get_edited_time_range(self):
+        """
+        Returns the (start_seconds, end_seconds) range of the effects that the latest
+        animation step added or changed, or of all its effects if it is the first step
+        or only removed effects. None if there is no animation to take it from.
+        """
+        num_steps = self.animation_manager.get_current_step()
+        if not num_steps:
+            return None
+        latest_step = self.animation_manager.get_latest_step()
+        if not latest_step.is_json():
+            return None
+        effects = effects_by_number(latest_step.data) or {}
+
+        numbers = list(effects)
+        if num_steps > 1:
+            changes = self._get_step_diff(
+                self.animation_manager.get_step(num_steps - 1), latest_step)
+            edited = changes.get("added", []) + changes.get("changed", [])
+            if edited:
+                numbers = edited
+
+        ranges = []
+        for number in numbers:
+            effect = effects[number]
+            effect_config = effect.get("effect_config") if isinstance(
+                effect, dict) else None
+            if isinstance(effect_config, dict):
+                ranges.append((effect_config.get("start_time", 0),
+                               effect_config.get("end_time", 0)))
+        if not ranges:
+            return None
+        return (min(start for start, _ in ranges) / 1000,
+                max(end for _, end in ranges) / 1000)
+
+    def _build_song_window_messages(self):
+        """
+        Builds the song section in window mode: the bars, beats, key points and lyrics
+        around the effects edited by the latest animation step. Before the first
+        animation, all the bars and beats are sent.
+
+        :return: List with the song window message, empty if no song is configured.
+        """
+        song_name = self.config.get("song_name")
+        if not song_name:
+            return []
+        try:
+            time_range = self._get_edited_time_range()
+            if time_range:
+                song_info = self.song_context_provider.get_window(
+                    song_name, *time_range)
+            else:
+                song_info = self.song_provider.get_bars(
+                    song_name) + self.song_provider.get_beats(song_name)
+        except Exception as e:
+            print(f"Error getting song window: {e}")
+            return []
+        return [{
+            "role": "system",
+            "content": f"# The Song Structure:\n {song_info}"
+        }]
+
+    def _get_step_diff(self, previous_step, step):
+        key = (previous_step.digest, step.digest)
+        changes = self._step_diffs.get(key)
+        if changes is None:
+            if previous_step.is_json() and step.is_json():
+                changes = diff_effects(previous_step.data, step.data)
+            else:
+                changes = {}
+            if len(self._step_diffs) >= MAX_CACHED_STEP_DIFFS:
+                del self._step_diffs[next(iter(self._step_diffs))]
+            self._step_diffs[key] = changes
+        return changes
+
+    @staticmethod
+    def _describe_changes(changes) -> str:
+        if not changes:
+            return "replaced (not valid JSON)"
+        parts = [
+            f"{label} effects {', '.join(str(number) for number in changes[label])}"
+            for label in ("added", "changed", "removed") if changes[label]
+        ]
+        if changes["fields"]:
+            parts.append(f"changed fields {', '.join(changes['fields'])}")
+        return "; ".join(parts) or "no changes"
+
+    def _build_animation_diff_messages(self, show_all):
+        """
+        Builds the animation section in diff mode: the latest step as minified canonical
+        JSON, followed by a one line summary of the effects added, changed and removed
+        by each recent step, instead of repeating the full JSON of older steps.
+
+        :param show_all: Summarize every step, not only the last config["animation_context_diff_steps"].
+        :return: List with the animation section message.
+        """
+        num_steps = self.animation_manager.get_current_step()
+        if not num_steps:
+            return [{
+                "role":
+                "system",
+                "content":
+                "# Latest Animation Sequence:\nNo animation sequences have been generated yet."
+            }]
+
+        latest_step = self.animation_manager.get_latest_step()
+        content = (
+            f"# Latest Animation Sequence (sequence {num_steps}, minified JSON):\n"
+            " Make sure to maintain a consistent animation, only change the part of animation that the user asked for. In case of doubt, ask the user for clarification.\n"
+            f"{latest_step.canonical}")
+
+        diff_steps = num_steps - 1 if show_all else min(
+            num_steps - 1,
+            self.config.get("animation_context_diff_steps",
+                            DEFAULT_ANIMATION_CONTEXT_DIFF_STEPS))
+        if diff_steps > 0:
+            first_step = num_steps - diff_steps
+            lines = []
+            previous_step = self.animation_manager.get_step(first_step)
+            for step_number in range(first_step + 1, num_steps + 1):
+                step = latest_step if step_number == num_steps else self.animation_manager.get_step(
+                    step_number)
+                lines.append(
+                    f"- Sequence {step_number}: {self._describe_changes(self._get_step_diff(previous_step, step))}"
+                )
+                previous_step = step
+            content += "\n\n# Recent Animation Changes (effect numbers, compared to the previous sequence):\n" + "\n".join(
+                lines)
+        return [{"role": "system", "content": content}]
+
+    def build_messages(self, token_counter: Optional[TokenCounter] = None):
+        """
+        Constructs a list of messages for the LLM context based on the messages.
+        The history is trimmed (oldest first) to fit config["context_token_budget"],
+        and the token count of each section is logged. With config["animation_context_mode"]
+        set to "diff", older animation steps are sent as change summaries, not full JSON.
+        With config["song_context_mode"] set to "window", only the part of the song around
+        the latest edited effects is sent, after a summary of the whole song.
+
+        :param token_counter: TokenCounter of the selected backend, defaults to the GPT tokenizer.
+        :return: List of formatted message dictionaries for the LLM.
+        """
+        sections = self._get_static_prefix_sections()
 
         # Add animation sequences based on config
+        messages = []
         show_all = self.config.get("send_llm_all_animations", False)
-        if show_all:
-            all_sequences = self.animation_manager.get_all_sequences()
+        if self.config.get("animation_context_mode",
+                           ANIMATION_CONTEXT_FULL) == ANIMATION_CONTEXT_DIFF:
+            messages = self._build_animation_diff_messages(show_all)
+        elif show_all:
+            all_sequences = self.animation_manager.get_all_steps()
             if all_sequences:
                 sequences_content = "# All Animation Sequences that you've generated so far, ordered by the time they were generated."
                 " You should maintain a consistent animation, only change the part of animation that the user asked for. In case of doubt, ask the user for clarification.\n"
                 for i, sequence in enumerate(all_sequences, 1):
-                    sequences_content += f"\n## Sequence {i}:\n{sequence}\n"
+                    sequences_content += f"\n## Sequence {i}:\n{sequence.text}\n"
                 messages.append({
                     "role": "system",
                     "content": sequences_content
@@ -126,19 +330,26 @@ class Formatter:
                     "# Latest Animation Sequence:\nNo animation sequences have been generated yet."
                 })
 
+        sections.append(("animation", messages))
+        if self._is_song_window_mode():
+            sections.append(("song_window", self._build_song_window_messages()))
+
         # Add message history
-        for message in self.message_streamer.messages:
-            if message['context']:
-                role = self._determine_role(message['tag'])
-                messages.append({"role": role, "content": message['content']})
+        history = []
+        for message in self.message_streamer.get_context_messages():
+            role = self._determine_role(message['tag'])
+            history.append({"role": role, "content": message['content']})
+
+        budgeter = ContextBudgeter(token_counter or TokenCounter(),
+                                   self.config.get("context_token_budget"))
+        messages, _ = budgeter.fit(sections, history)
 
         # Save the whole prompt to a file
-        with open("prompts/prompt_with_all_messages_music_and_animation.md",
-                  "w") as file:
-            for message in messages:
-                file.write(f"\n{'='*80}\n")
-                file.write(f"Role: {message['role']}\n\n")
-                file.write(f"{message['content']}\n")
+        if self.prompt_capture:
+            self.prompt_capture.capture(
+                "conversation",
+                messages,
+                latest_path=PROMPT_CAPTURE_LATEST_PROMPT_FILE)
 
         return messages
 
@@ -168,10 +379,9 @@ IMPORTANT: Do not include any animation code in your response. Only describe the
         messages.append(summarization_prompt)
 
         # Add message history (only context=True messages)
-        for message in self.message_streamer.messages:
-            if message['context']:
-                role = self._determine_role(message['tag'])
-                messages.append({"role": role, "content": message['content']})
+        for message in self.message_streamer.get_context_messages():
+            role = self._determine_role(message['tag'])
+            messages.append({"role": role, "content": message['content']})
 
         return messages
 
@@ -240,7 +450,10 @@ IMPORTANT: Do not include any animation code in your response. Only describe the
         })
         
         # save the skeleton prompt to a file
-        with open("prompts/skeleton_prompt.md", "w") as file:
-            file.write(skeleton_prompt)
+        if self.prompt_capture:
+            self.prompt_capture.capture(
+                "skeleton",
+                messages,
+                latest_path=PROMPT_CAPTURE_LATEST_SKELETON_FILE)
         
         return messages
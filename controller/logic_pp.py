@@ -1,11 +1,16 @@
+import asyncio
 import random
-from controller.backends import GPTBackend, ClaudeBackend, LLMBackend, GeminiBackend
+from controller.backends import GPTBackend, ClaudeBackend, LLMBackend, GeminiBackend, ReplayBackend
+from controller.backend_race import race_backends
+from controller.response_stream import (BackgroundUploader,
+                                        StreamingResponseHandler,
+                                        get_effect_validator)
 from memory.memory_manager import MemoryManager
 from music.song_provider import SongProvider
 import xml.etree.ElementTree as ET
 from controller.interpreter import Interpreter
 from controller.formatter import Formatter
-from constants import MESSAGE_SNAPSHOT_FILE, CONFIG_FILE, SNAPSHOTS_DIR
+from constants import MESSAGE_SNAPSHOT_FILE, CONFIG_FILE, SNAPSHOTS_DIR, ANIMATION_HISTORY_FILE
 from controller.message_streamer import (
     MessageStreamer,
     TAG_USER_INPUT,
@@ -84,17 +89,27 @@ def load_and_merge_configs(snapshot_config_path=None):
 
 class LogicPlusPlus:
 
-    def __init__(self, snapshot_dir=None, restart_config=None, new_config=None):
-        """Initialize the LogicPlusPlus, optionally loading from a snapshot or restarting with latest sequence."""
+    def __init__(self,
+                 snapshot_dir=None,
+                 restart_config=None,
+                 new_config=None,
+                 resume_journal=False):
+        """Initialize the LogicPlusPlus, optionally loading from a snapshot or restarting with latest sequence.
+        With resume_journal, the messages of a session that did not close are recovered from its journal."""
         self.logger = logging.getLogger("LogicPlusPPlusLogger")
         self._pending_memory = None
-        self.msgs = MessageStreamer()
+        self.msgs = MessageStreamer(resume_journal=resume_journal)
         self.msgs.clear_control_flags(
         )  # Ensure control flags are cleared on initialization
         self.song_provider = SongProvider()
         self.backends = {}
         self._is_processing = False
         self._processing_lock = threading.Lock()
+        # Event loop of the synchronous calls that race backends, kept across
+        # turns so the shared async provider clients are reused
+        self._loop = None
+        self.last_race_result = None
+        self.race_wins = {}
 
         # Initialize action registry
         self.action_registry = ActionRegistry()
@@ -153,6 +168,7 @@ class LogicPlusPlus:
                 self.animation_manager,
                 self.msgs,
                 config=self.config,
+                song_provider=self.song_provider,
             ))
         self.action_registry.register_action(
             "high_level_plan_update",
@@ -221,8 +237,13 @@ class LogicPlusPlus:
         #     self.thread_pool.shutdown(wait=False)
         #     self.thread_pool = None
 
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
         # Clear message history
         if self.msgs:
+            self.msgs.close()
             self.msgs.messages = []
             self.msgs = None
 
@@ -277,8 +298,8 @@ class LogicPlusPlus:
     def get_visible_chat(self):
         """Retrieve all visible chat messages from the message_streamer, including their tags/labels."""
         return [(message['timestamp'], message['content'], message['tag'])
-                for message in self.msgs.messages
-                if message['visible'] and 'timestamp' in message]
+                for message in self.msgs.get_visible_messages()
+                if 'timestamp' in message]
 
     def get_chat_history(self):
         """Retrieve all chat messages, including invisible ones, with visibility and context flags."""
@@ -309,8 +330,9 @@ class LogicPlusPlus:
                 error_msg = f"Required file '{file_name}' is missing in the snapshot directory."
                 raise FileNotFoundError(error_msg)
 
-        animations_dir = os.path.join(snapshot_dir, "animations")
-        if not os.path.exists(animations_dir):
+        if not os.path.exists(os.path.join(
+                snapshot_dir, ANIMATION_HISTORY_FILE)) and not os.path.exists(
+                    os.path.join(snapshot_dir, "animations")):
             raise FileNotFoundError(
                 "Animations directory is missing in the snapshot directory.")
 
@@ -335,12 +357,7 @@ class LogicPlusPlus:
             config=self.config  # Pass config (contains world)
         )
         try:
-            animations = []
-            for animation_file in sorted(os.listdir(animations_dir)):
-                animation_path = os.path.join(animations_dir, animation_file)
-                with open(animation_path, "r") as file:
-                    animations.append(file.read())
-            self.animation_manager.load_sequences(animations)
+            self.animation_manager.load_animations_from_snapshot(snapshot_dir)
         except Exception as e:
             self.logger.error(f"Error loading animations: {e}")
             raise ValueError(f"Error loading animations: {e}")
@@ -358,6 +375,12 @@ class LogicPlusPlus:
                 backend_class(name=backend_name,
                               response_schema_obj=self.response_schema,
                               config=self.config))
+        # Recorded responses, served offline by the "Replay" backend
+        if self.config.get("replay_source"):
+            self.register_backend(
+                ReplayBackend(name="Replay",
+                              response_schema_obj=self.response_schema,
+                              config=self.config))
 
     def register_backend(self, backend):
         if not isinstance(backend, LLMBackend):
@@ -379,6 +402,44 @@ class LogicPlusPlus:
 
         return random.choice(list(self.backends.values()))
 
+    def select_race_backends(self):
+        """
+        Returns the backends named in the "race_backends" config, when at least two
+        of them are available, otherwise None (a single backend is used).
+        """
+        names = self.config.get("race_backends") or []
+        backends = [self.backends[name] for name in names if name in self.backends]
+        missing = [name for name in names if name not in self.backends]
+        if missing:
+            self.logger.warning(f"Race backends not found: {missing}")
+        return backends if len(backends) >= 2 else None
+
+    def _run_async(self, coroutine):
+        """Runs a coroutine to completion on the controller's event loop."""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coroutine)
+
+    async def _arace_backends(self, backends, messages):
+        """Races the backends on the messages and records which one won and how fast."""
+        result = await race_backends(backends,
+                                     messages,
+                                     timeout=self.config.get("race_timeout_s"))
+        self.last_race_result = {
+            key: value
+            for key, value in result.items() if key != "response"
+        }
+        self.race_wins[result["backend"]] = self.race_wins.get(
+            result["backend"], 0) + 1
+        race_message = f"{result['backend']} answered first in {result['latency']:.2f}s"
+        if result["cancelled"]:
+            race_message += f", cancelled {', '.join(result['cancelled'])}"
+        if result["errors"]:
+            race_message += f", failed: {', '.join(result['errors'])}"
+        self.logger.info(race_message)
+        self.msgs.add_visible(TAG_SYSTEM, race_message, context=False)
+        return result["response"]
+
     def is_processing(self):
         """Check if the backend is currently processing a request."""
         return self._is_processing
@@ -399,6 +460,51 @@ class LogicPlusPlus:
             finally:
                 self._is_processing = False
 
+    async def acommunicate(self, user_input):
+        """
+        Async communication with the backend. The LLM call runs on the event loop,
+        actions are executed in a worker thread so rendering does not block it.
+        """
+        if not self._processing_lock.acquire(blocking=False):
+            self.msgs.add_visible(
+                "system",
+                "Still processing previous request. Please wait.",
+                context=False)
+            return
+        try:
+            if self._is_processing:
+                self.msgs.add_visible(
+                    "system",
+                    "Still processing previous request. Please wait.",
+                    context=False)
+                return
+            self._is_processing = True
+            try:
+                racers = self.select_race_backends()
+                backend = racers[0] if racers else self.select_backend()
+                messages = self.formatter.build_messages(
+                    backend.get_token_counter())
+                try:
+                    if racers:
+                        model_response = await self._arace_backends(
+                            racers, messages)
+                    elif self.config.get("stream_responses", False):
+                        model_response = await asyncio.to_thread(
+                            self._stream_model_response, backend, messages)
+                    else:
+                        model_response = await backend.agenerate_response(
+                            messages)
+                except Exception as e:
+                    error_msg = f"Error: {str(e)}"
+                    self.msgs.add_visible(TAG_SYSTEM, error_msg, context=False)
+                    return
+                await asyncio.to_thread(self._handle_model_response,
+                                        model_response)
+            finally:
+                self._is_processing = False
+        finally:
+            self._processing_lock.release()
+
     def add_user_input_to_chat(self, user_input):
         self.msgs.add_visible(TAG_USER_INPUT, user_input, context=True)
 
@@ -446,16 +552,85 @@ class LogicPlusPlus:
         #                               "Processing action result...",
         #                               context=False)
 
-        backend = self.select_backend()
-        messages = self.formatter.build_messages()
+        # With several race backends, the same messages are sent to all of them
+        racers = self.select_race_backends()
+        backend = racers[0] if racers else self.select_backend()
+        messages = self.formatter.build_messages(backend.get_token_counter())
 
         try:
-            model_response = backend.generate_response(messages)
+            if racers:
+                model_response = self._run_async(
+                    self._arace_backends(racers, messages))
+            elif self.config.get("stream_responses", False):
+                model_response = self._stream_model_response(backend, messages)
+            else:
+                model_response = backend.generate_response(messages)
         except Exception as e:
             error_msg = f"Error: {str(e)}"
             self.msgs.add_visible(TAG_SYSTEM, error_msg, context=False)
             return
 
+        self._handle_model_response(model_response)
+
+    def _stream_model_response(self, backend, messages):
+        """
+        Streams the response of the backend. The reasoning is shown as soon as it
+        is complete, and invalid effects are reported while the rest of the
+        response is generated. With auto_render, the completed effects of an
+        animation are uploaded in the background before the response ends, so the
+        final render only uploads the elements that changed since. If the stream
+        fails or ends without an animation, the previous animation is restored.
+        """
+        update_action = self.action_registry.get_action("update_animation")
+        uploader = None
+        if self.config.get("auto_render", False) and update_action:
+            uploader = BackgroundUploader(update_action.store_partial)
+
+        def on_reasoning(reasoning):
+            self.msgs.add_visible(TAG_SYSTEM,
+                                  f"Reasoning: {reasoning}",
+                                  context=False)
+
+        def on_effect(index, effect, error):
+            if error:
+                effect_number = effect.get("effect_number", index) if isinstance(
+                    effect, dict) else index
+                self.msgs.add_visible(
+                    TAG_SYSTEM,
+                    f"Effect {effect_number} is invalid: {error}",
+                    context=False)
+
+        def on_completed_effects(action_name, animation_sequence):
+            if action_name == "update_animation":
+                uploader.submit(animation_sequence)
+
+        handler = StreamingResponseHandler(
+            get_effect_validator(self.animation_manager.get_response_object()),
+            on_reasoning=on_reasoning,
+            on_effect=on_effect,
+            on_completed_effects=on_completed_effects if uploader else None)
+        model_response = None
+        try:
+            model_response = backend.stream_response(messages, handler.update)
+            return model_response
+        finally:
+            if uploader:
+                # The final render must not overlap an early upload
+                uploader.wait()
+                if uploader.num_uploads:
+                    self.logger.info(
+                        f"Uploaded completed effects {uploader.num_uploads} times while streaming"
+                    )
+                # Without a complete animation to render, the song gets back
+                # the animation the partial uploads replaced
+                if (model_response is None or
+                        model_response.action.name != "update_animation"):
+                    update_action.restore_stored_animation()
+                for error in uploader.errors:
+                    self.logger.warning(f"Early upload failed: {error}")
+
+    def _handle_model_response(self, model_response):
+        """Executes the action of a model response and adds the turn to the messages."""
         # Combine reasoning and action plan into a single message
         response_message = ""
         action_tag = f"[Action: \"{model_response.action.name}\"]: "
@@ -489,20 +664,22 @@ class LogicPlusPlus:
                 # # Set auto-continue flag to process the result
                 # self.msgs.set_control_flag("auto_continue", True)
 
-    def render(self, store_animation=False):
-        """Render the current animation sequence."""
+    def render(self, store_animation=False, force=False):
+        """Render the current animation sequence.
+        Set force to re-upload every element, even the ones that did not change."""
         try:
-            result = self.animation_manager.get_latest_sequence_with_step()
-            if not result:
+            sequence_step = self.animation_manager.get_latest_step()
+            if not sequence_step:
                 self.logger.warning(
                     "No animation sequence available to render.")
                 return "No animation sequence available to render."
+            latest_step = self.animation_manager.get_current_step()
 
-            latest_sequence, latest_step = result
-            animation_json = json.loads(latest_sequence)
-            self.animation_manager.render(animation_json,
+            # The renderer gets a copy, so it cannot change the stored step
+            self.animation_manager.render(sequence_step.to_dict(),
                                           song_name=self.config["song_name"],
-                                          store_animation=store_animation)
+                                          store_animation=store_animation,
+                                          force=force)
             self.logger.info(
                 f"Animation step {latest_step} rendered successfully.")
             return f"Animation step {latest_step} rendered successfully."
@@ -536,8 +713,7 @@ class LogicPlusPlus:
         )
 
         # Get latest sequence from old controller
-        latest_sequence = old_controller.animation_manager.get_latest_sequence(
-        )
+        latest_sequence = old_controller.animation_manager.get_latest_step()
         if latest_sequence:
             # Add the latest sequence to the new controller
             self.animation_manager.add_sequence(latest_sequence)
@@ -568,6 +744,7 @@ class LogicPlusPlus:
                 new_msgs.add_visible(TAG_ASSISTANT, summary, context=True)
 
                 # Replace the old message streamer with the new one
+                self.msgs.close()
                 self.msgs = new_msgs
 
                 return "Successfully reduced tokens by summarizing the conversation."
@@ -1,9 +1,10 @@
 import os
 import json
 from datetime import datetime, timedelta
+import queue
 import threading
-from constants import TIME_FORMAT, LOG_INTERVAL_IN_SECONDS, MESSAGE_SNAPSHOT_FILE
-from constants import SNAPSHOTS_DIR
+from constants import TIME_FORMAT, MESSAGE_SNAPSHOT_FILE
+from constants import SNAPSHOTS_DIR, JOURNAL_FLUSH_INTERVAL_IN_SECONDS, JOURNAL_BATCH_SIZE
 
 # Message tags for different types of messages in the system
 
@@ -23,6 +24,19 @@ TAG_SYSTEM_INTERNAL = "system_internal"
 TAG_ACTION_RESULTS = "action_results"
 
 
+# Default number of undelivered messages a subscriber queue holds before dropping the oldest
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Each streamer writes its own journal, named by its start time. A journal that
+# is still there after the app exits belongs to a session that did not close.
+JOURNAL_PREFIX = "message_journal_"
+JOURNAL_SUFFIX = ".jsonl"
+# Journal written by older versions, shared by all sessions
+LEGACY_JOURNAL_FILE = "message_journal.jsonl"
+# The journal of the last closed session, kept for manual recovery
+PREV_JOURNAL_FILE = "message_journal.prev.jsonl"
+
+
 def count_words(text):
     """Utility function to count words in a given text."""
     return len(text.split())
@@ -33,12 +47,118 @@ def estimate_tokens(words):
     return int(words * 1.33 + 0.5)  # Round up to nearest integer
 
 
+def read_journal(journal_path):
+    """
+    Rebuild the message list from a journal file.
+    A partially written last line (e.g. after a crash) is skipped.
+    """
+    messages = []
+    with open(journal_path, "r") as file:
+        for line in file:
+            try:
+                messages.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return messages
+
+
+def find_journal_to_resume(snapshots_dir=SNAPSHOTS_DIR):
+    """
+    Return the path of the latest non-empty journal left by a session that did
+    not close (e.g. after a crash), or None if there is none.
+    """
+    if not os.path.isdir(snapshots_dir):
+        return None
+    candidates = []
+    for file_name in os.listdir(snapshots_dir):
+        if file_name == LEGACY_JOURNAL_FILE or (
+                file_name.startswith(JOURNAL_PREFIX)
+                and file_name.endswith(JOURNAL_SUFFIX)):
+            path = os.path.join(snapshots_dir, file_name)
+            if os.path.getsize(path) > 0:
+                candidates.append(path)
+    if not candidates:
+        return None
+    return max(candidates, key=os.path.getmtime)
+
+
+class MessageSubscription:
+    """
+    A consumer of the messages appended to a MessageStreamer.
+
+    With a callback, every new message dict is passed to it right away, on the
+    thread that added the message. Without one, messages are put on a bounded
+    queue read with get() or drain(). When the queue is full the oldest message
+    is dropped (and counted in `dropped`) so the producer never blocks.
+    Message dicts are shared with the streamer and must not be modified.
+    """
+
+    def __init__(self, streamer, callback=None, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.streamer = streamer
+        self.callback = callback
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _deliver(self, message):
+        if self.callback:
+            try:
+                self.callback(message)
+            except Exception as e:
+                print(f"Error in message subscriber callback: {e}")
+            return
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Wait for the next message. Returns None if none arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Return all queued messages without waiting."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def unsubscribe(self):
+        self.streamer.unsubscribe(self)
+
+
 class MessageStreamer:
 
     def __init__(self,
                  snapshots_dir=SNAPSHOTS_DIR,
-                 snapshot_interval=LOG_INTERVAL_IN_SECONDS):
-        """Initialize the MessageStreamer with optional periodic snapshot caching."""
+                 flush_interval=JOURNAL_FLUSH_INTERVAL_IN_SECONDS,
+                 resume_journal=False):
+        """
+        Initialize the MessageStreamer with an append-only message journal.
+
+        Every message is appended once to a JSONL journal of this streamer,
+        flushed and fsynced in batches by a background thread. When the streamer
+        is closed its journal is kept as message_journal.prev.jsonl for manual
+        recovery. Journals of sessions that did not close are left untouched
+        until a streamer resumes them.
+
+        Args:
+            snapshots_dir: Directory of the journal file.
+            flush_interval: Maximum seconds between journal flushes.
+            resume_journal: Rebuild messages from the latest journal of a session
+                that did not close (see find_journal_to_resume) and keep appending
+                to it, instead of starting a new one.
+        """
 
         self.snapshots_dir = snapshots_dir
         os.makedirs(self.snapshots_dir, exist_ok=True)
@@ -46,18 +166,121 @@ class MessageStreamer:
         self.messages = []  # Unified log storage for all messages
         self.last_checked_index = 0  # Track last checked message index
         self.control_flags = {}  # Store control flags like auto_continue
-
-        self.periodic_snapshot = os.path.join(self.snapshots_dir,
-                                              "periodic_snapshot.json")
-        self.snapshot_interval = snapshot_interval
-        self._start_periodic_snapshot()
+        self._subscribers = []
+        self._reset_aggregates()
+        # Guards appends and deliveries, so subscribers see every message once and in order
+        self._subscribers_lock = threading.RLock()
+
+        self.flush_interval = flush_interval
+        self._pending = []  # Serialized messages waiting to be written
+        self._journal_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._closed = False
+
+        journal_to_resume = find_journal_to_resume(
+            self.snapshots_dir) if resume_journal else None
+        if journal_to_resume:
+            self.journal_path = journal_to_resume
+            self.messages = read_journal(self.journal_path)
+            # Rewrite the recovered messages once, dropping a partially written last line
+            self._journal_file = open(self.journal_path, "w")
+            self._pending = [
+                json.dumps(message) + "\n" for message in self.messages
+            ]
+            self.flush()
+        else:
+            self.journal_path = os.path.join(
+                self.snapshots_dir, JOURNAL_PREFIX +
+                datetime.now().strftime("%Y%m%d_%H%M%S_%f") + JOURNAL_SUFFIX)
+            self._journal_file = open(self.journal_path, "w")
+        self._start_journal_writer()
+
+    def _reset_aggregates(self):
+        # Running totals and indexes, updated by _index_message as messages are appended
+        self._indexed_messages = self.messages
+        self._indexed_count = 0
+        self.total_words = 0
+        self.total_tokens = 0
+        self.context_words = 0
+        self.context_tokens = 0
+        self._context_indices = []
+        self._visible_indices = []
+        self._tag_indices = {}
+
+    def _index_message(self, index, message):
+        words = message.get("words")
+        if words is None:
+            words = count_words(message.get("content", ""))
+        tokens = message.get("tokens_estimation")
+        if tokens is None:
+            tokens = estimate_tokens(words)
+        self.total_words += words
+        self.total_tokens += tokens
+        if message.get("context"):
+            self.context_words += words
+            self.context_tokens += tokens
+            self._context_indices.append(index)
+        if message.get("visible"):
+            self._visible_indices.append(index)
+        self._tag_indices.setdefault(message.get("tag"), []).append(index)
+        self._indexed_count = index + 1
+
+    def _ensure_indexed(self):
+        """Rebuild the aggregates if self.messages was replaced or changed directly."""
+        if (self._indexed_messages is not self.messages
+                or self._indexed_count > len(self.messages)):
+            self._reset_aggregates()
+        for index in range(self._indexed_count, len(self.messages)):
+            self._index_message(index, self.messages[index])
+
+    def _append(self, message):
+        """Append a message to the log, queue it for the journal and push it to the subscribers."""
+        with self._subscribers_lock:
+            self._ensure_indexed()
+            self.messages.append(message)
+            self._index_message(len(self.messages) - 1, message)
+            for subscription in self._subscribers:
+                subscription._deliver(message)
+        line = json.dumps(message) + "\n"
+        with self._journal_lock:
+            self._pending.append(line)
+            if len(self._pending) >= JOURNAL_BATCH_SIZE:
+                self._flush_event.set()
+
+    def subscribe(self, callback=None, maxsize=SUBSCRIBER_QUEUE_SIZE, since=None):
+        """
+        Subscribe to messages as they are appended.
+
+        Args:
+            callback: Called with each new message dict, on the thread that added it.
+                If None, messages are queued on the returned subscription instead.
+            maxsize: Size of the subscription queue (ignored with a callback).
+            since: Index of the first existing message to deliver right away,
+                e.g. last_checked_index. By default only new messages are delivered.
+
+        Returns:
+            MessageSubscription: Call unsubscribe() on it to stop receiving messages.
+        """
+        subscription = MessageSubscription(self, callback, maxsize)
+        with self._subscribers_lock:
+            if since is not None:
+                for message in self.messages[since:]:
+                    subscription._deliver(message)
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop delivering messages to a subscription."""
+        with self._subscribers_lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
 
     def _add_message(self, tag, content, visible, context):
         """Internal method to add a message to the log."""
         words = count_words(content)
         tokens_estimation = estimate_tokens(words)
         timestamp = datetime.now().strftime(TIME_FORMAT)
-        self.messages.append({
+        self._append({
             "tag": tag,
             "content": content,
             "visible": visible,
@@ -79,7 +302,7 @@ class MessageStreamer:
         """Add a system log with predefined tags and flags."""
         words = count_words(content)
         tokens_estimation = estimate_tokens(words)
-        self.messages.append({
+        self._append({
             "tag": "info_log",
             "content": content,
             "visible": False,
@@ -93,7 +316,7 @@ class MessageStreamer:
         """Log an error message."""
         words = count_words(content)
         tokens_estimation = estimate_tokens(words)
-        self.messages.append({
+        self._append({
             "tag": "error_log",
             "content": content,
             "visible": True,
@@ -130,7 +353,19 @@ class MessageStreamer:
         """Load logs from a specified file."""
         if os.path.exists(file_name):
             with open(file_name, "r") as file:
-                self.messages = json.load(file)
+                messages = json.load(file)
+            # Rewrite this streamer's journal with the loaded messages. They are
+            # not pushed to the subscribers, which only get messages added from now on.
+            with self._subscribers_lock:
+                self.messages = messages
+                self._ensure_indexed()
+                with self._journal_lock:
+                    self._journal_file.close()
+                    self._journal_file = open(self.journal_path, "w")
+                    self._pending = [
+                        json.dumps(message) + "\n" for message in messages
+                    ]
+            self.flush()
             self.last_checked_index = 0  # Reset the last checked index
             self.clear_control_flags()  # Clear any existing control flags
         else:
@@ -138,37 +373,100 @@ class MessageStreamer:
 
     def get_context_to_llm(self):
         """Retrieve the full context for LLM, including logs marked as context."""
-        return "\n".join(message["content"] for message in self.messages
-                         if message["context"])
+        return "\n".join(message["content"]
+                         for message in self.get_context_messages())
 
     def get_visible_chat(self):
         """Retrieve all visible messages as a dictionary."""
         return {
             message["tag"]: message["content"]
-            for message in self.messages if message["visible"]
+            for message in self.get_visible_messages()
         }
 
-    def _start_periodic_snapshot(self):
-        """Start a thread for periodic snapshot caching."""
-
-        def snapshot_loop():
-            while True:
-                self._cache_snapshot()
-                threading.Event().wait(self.snapshot_interval)
-
-        thread = threading.Thread(target=snapshot_loop, daemon=True)
+    def _select(self, indices, start, stop):
+        return [self.messages[i] for i in indices[start:stop]]
+
+    def get_context_messages(self, start=None, stop=None):
+        """Messages marked as context, optionally sliced (e.g. start=-10 for the last ten)."""
+        with self._subscribers_lock:
+            self._ensure_indexed()
+            return self._select(self._context_indices, start, stop)
+
+    def get_visible_messages(self, start=None, stop=None):
+        """Visible messages, optionally sliced."""
+        with self._subscribers_lock:
+            self._ensure_indexed()
+            return self._select(self._visible_indices, start, stop)
+
+    def get_messages_by_tag(self, tag, start=None, stop=None):
+        """Messages with the given tag, optionally sliced."""
+        with self._subscribers_lock:
+            self._ensure_indexed()
+            return self._select(self._tag_indices.get(tag, []), start, stop)
+
+    def get_stats(self):
+        """
+        Running totals over all messages, without walking the message list.
+
+        Returns:
+            dict: {"num_messages", "visible_count", "context_count", "total_words",
+                   "total_tokens", "context_words", "context_tokens", "tag_counts"}
+        """
+        with self._subscribers_lock:
+            self._ensure_indexed()
+            return {
+                "num_messages": len(self.messages),
+                "visible_count": len(self._visible_indices),
+                "context_count": len(self._context_indices),
+                "total_words": self.total_words,
+                "total_tokens": self.total_tokens,
+                "context_words": self.context_words,
+                "context_tokens": self.context_tokens,
+                "tag_counts": {
+                    tag: len(indices)
+                    for tag, indices in self._tag_indices.items()
+                },
+            }
+
+    def _start_journal_writer(self):
+        """Start a thread that writes the pending messages to the journal in batches."""
+
+        def journal_loop():
+            while not self._closed:
+                self._flush_event.wait(self.flush_interval)
+                self._flush_event.clear()
+                self.flush()
+
+        thread = threading.Thread(target=journal_loop, daemon=True)
         thread.start()
 
-    def _cache_snapshot(self):
-        """Periodically cache the snapshot to disk.
-        We write this only for backups incase the main file is lost or corrupted.
-        Read manually if system crashes."""
-
-        try:
-            with open(self.periodic_snapshot, "w") as file:
-                json.dump(self.messages, file, indent=4)
-        except Exception as e:
-            self.add_log(f"Error during periodic snapshot: {e}")
+    def flush(self):
+        """Write the pending messages to the journal and fsync it.
+        The journal is only a backup in case the app crashes, snapshots are saved separately."""
+        with self._journal_lock:
+            if not self._pending or self._journal_file.closed:
+                return
+            lines = "".join(self._pending)
+            self._pending.clear()
+            try:
+                self._journal_file.write(lines)
+                self._journal_file.flush()
+                os.fsync(self._journal_file.fileno())
+            except Exception as e:
+                print(f"Error writing message journal: {e}")
+
+    def close(self):
+        """Flush the journal, stop the writer thread and keep the journal as message_journal.prev.jsonl."""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        with self._journal_lock:
+            self._journal_file.close()
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path,
+                           os.path.join(self.snapshots_dir, PREV_JOURNAL_FILE))
+        self._flush_event.set()
 
     def set_control_flag(self, flag_name, value):
         """Set a control flag with a value."""
@@ -181,7 +479,8 @@ class MessageStreamer:
         return flags
 
     def get_new_messages(self):
-        """Get new messages since last check and update the last checked index."""
+        """Get new messages since last check and update the last checked index.
+        Prefer subscribe() for consumers that should get messages as they are added."""
         new_messages = []
         for i in range(self.last_checked_index, len(self.messages)):
             msg = self.messages[i]
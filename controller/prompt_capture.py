@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+
+from constants import PROMPT_CAPTURE_DIR, PROMPT_CAPTURE_MAX_CAPTURES, PROMPT_CAPTURE_QUEUE_SIZE
+
+
+class PromptCaptureSink:
+    """
+    Writes the prompts sent to the LLM to disk on a background thread.
+
+    Each message content is stored once under blobs/<sha256>.txt, and every capture
+    is a small manifest under captures/ listing the roles and blob hashes of its
+    messages, so the static prompt prefix shared by all turns is stored only once.
+    Only the newest max_captures manifests are kept, and blobs no longer referenced
+    by any manifest are deleted. Optionally the latest prompt of each kind is also
+    rendered to a readable markdown file.
+
+    capture() never blocks the caller: when the queue is full the prompt is
+    dropped and counted in `dropped`.
+    """
+
+    def __init__(self,
+                 directory=PROMPT_CAPTURE_DIR,
+                 max_captures=PROMPT_CAPTURE_MAX_CAPTURES,
+                 queue_size=PROMPT_CAPTURE_QUEUE_SIZE):
+        self.directory = directory
+        self.blobs_dir = os.path.join(directory, "blobs")
+        self.captures_dir = os.path.join(directory, "captures")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.captures_dir, exist_ok=True)
+        self.max_captures = max_captures
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+        thread = threading.Thread(target=self._writer_loop, daemon=True)
+        thread.start()
+
+    def capture(self, kind, messages, latest_path=None):
+        """
+        Queue a prompt for writing.
+
+        :param kind: Kind of prompt, used in the capture file name (e.g. "conversation").
+        :param messages: The list of message dicts sent to the LLM.
+        :param latest_path: Optional markdown file that is overwritten with this prompt.
+        """
+        with self._counter_lock:
+            self._counter += 1
+            sequence_number = self._counter
+        item = (kind, sequence_number, datetime.now(), list(messages),
+                latest_path)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Block until all queued prompts are written."""
+        self._queue.join()
+
+    def _writer_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self._write_capture(*item)
+            except Exception as e:
+                print(f"Error capturing prompt: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write_blob(self, content):
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        blob_path = os.path.join(self.blobs_dir, f"{digest}.txt")
+        if not os.path.exists(blob_path):
+            tmp_path = f"{blob_path}.tmp"
+            with open(tmp_path, "w") as file:
+                file.write(content)
+            os.replace(tmp_path, blob_path)
+        return digest
+
+    def _write_capture(self, kind, sequence_number, timestamp, messages,
+                       latest_path):
+        manifest = {
+            "kind": kind,
+            "timestamp": timestamp.isoformat(),
+            "messages": [{
+                "role": message["role"],
+                "sha256": self._write_blob(message["content"])
+            } for message in messages],
+        }
+        manifest_name = f"{timestamp.strftime('%y%m%d_%H%M%S')}_{sequence_number:06d}_{kind}.json"
+        with open(os.path.join(self.captures_dir, manifest_name), "w") as file:
+            json.dump(manifest, file)
+
+        if latest_path:
+            with open(latest_path, "w") as file:
+                for message in messages:
+                    file.write(f"\n{'='*80}\n")
+                    file.write(f"Role: {message['role']}\n\n")
+                    file.write(f"{message['content']}\n")
+
+        self._rotate()
+
+    def _rotate(self):
+        manifests = sorted(os.listdir(self.captures_dir))
+        if len(manifests) <= self.max_captures:
+            return
+        for manifest_name in manifests[:-self.max_captures]:
+            os.remove(os.path.join(self.captures_dir, manifest_name))
+
+        referenced = set()
+        for manifest_name in manifests[-self.max_captures:]:
+            with open(os.path.join(self.captures_dir, manifest_name)) as file:
+                referenced.update(message["sha256"]
+                                  for message in json.load(file)["messages"])
+        for blob_name in os.listdir(self.blobs_dir):
+            if blob_name.endswith(".txt") and blob_name[:-4] not in referenced:
+                os.remove(os.path.join(self.blobs_dir, blob_name))
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_prompt_capture_sink(directory=PROMPT_CAPTURE_DIR):
+    """Return the shared PromptCaptureSink of a directory, creating it on first use."""
+    with _sinks_lock:
+        sink = _sinks.get(directory)
+        if sink is None:
+            sink = _sinks[directory] = PromptCaptureSink(directory)
+        return sink
+
+
+def load_capture(manifest_path, directory=PROMPT_CAPTURE_DIR):
+    """Rebuild the message list of a captured prompt from its manifest."""
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    messages = []
+    for message in manifest["messages"]:
+        with open(os.path.join(directory, "blobs",
+                               f"{message['sha256']}.txt")) as file:
+            messages.append({"role": message["role"], "content": file.read()})
+    return messages
@@ -0,0 +1,220 @@
+import copy
+import json
+import os
+import re
+
+from pydantic import ValidationError
+
+from animation.frameworks.step_history import StepHistory, natural_key
+from constants import ANIMATION_HISTORY_FILE, MESSAGE_SNAPSHOT_FILE
+from controller.message_streamer import TAG_ASSISTANT, TAG_SYSTEM_INTERNAL, TAG_USER_INPUT
+
+ACTION_TAG_PATTERN = re.compile(r'\[Action: "(\w+)"\]: ')
+ACTION_RESULT_PATTERN = re.compile(
+    r"Action '(\w+)' completed with status: (\w+)\nDetails: ", re.DOTALL)
+ANIMATION_STEP_PATTERN = re.compile(r"added to step (\d+)")
+MEMORY_SAVED_PREFIX = "Memory saved:\n "
+# Tag of the raw LLM responses recorded by older snapshots
+TAG_LLM_RAW_RESPONSE = "llm_raw_response"
+MAX_COMPLETION_ROUNDS = 5
+# Actions whose only param is the message shown to the user as the action result
+MESSAGE_ACTIONS = ("question", "answer_user", "memory_suggestion")
+
+
+def load_snapshot_steps(snapshot_dir):
+    """Returns the parsed animation steps of a snapshot, in step order."""
+    history_path = os.path.join(snapshot_dir, ANIMATION_HISTORY_FILE)
+    if os.path.exists(history_path):
+        return [step.data for step in StepHistory.load(history_path)]
+
+    animations_dir = os.path.join(snapshot_dir, "animations")
+    if not os.path.exists(animations_dir):
+        return []
+    steps = []
+    for animation_file in sorted(os.listdir(animations_dir), key=natural_key):
+        with open(os.path.join(animations_dir, animation_file), "r") as file:
+            steps.append(json.load(file))
+    return steps
+
+
+def _get_params(action_name, details, steps):
+    """Rebuilds the params of a recorded action from its result, None if they cannot be."""
+    if action_name == "update_animation":
+        match = ANIMATION_STEP_PATTERN.search(details or "")
+        step = int(match.group(1)) - 1 if match else -1
+        if 0 <= step < len(steps):
+            return {"animation_sequence": steps[step]}
+        return None
+    if details is None:
+        return None
+    if action_name in MESSAGE_ACTIONS:
+        return {"message": details}
+    if action_name == "add_to_memory" and details.startswith(MEMORY_SAVED_PREFIX):
+        try:
+            (key, value), = json.loads(details[len(MEMORY_SAVED_PREFIX):]).items()
+        except ValueError:
+            return None
+        return {"key": key, "value": value}
+    return None
+
+
+def _parse_raw_response(content):
+    """
+    Parses a raw response of an older snapshot: a MainSchema response, or an
+    animation sequence from before actions, which is replayed as update_animation.
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if "action" in data:
+        return data
+    if "animation" in data:
+        return {
+            "reasoning": data.get("reasoning", ""),
+            "action": {
+                "name": "update_animation",
+                "params": {
+                    "animation_sequence": data
+                }
+            }
+        }
+    return None
+
+
+def load_snapshot_responses(snapshot_dir):
+    """
+    Rebuilds the model responses recorded in a snapshot's messages.json.
+
+    Each assistant message starting with an action tag becomes a response with
+    that action and reasoning. The action params are rebuilt from the action
+    result that follows it: animations from the animation step the result names,
+    messages and memory entries from the result details. Actions whose params
+    cannot be rebuilt are skipped. Older snapshots that recorded the raw LLM
+    responses are replayed from those.
+
+    Args:
+        snapshot_dir (str): The snapshot directory.
+
+    Returns:
+        tuple: (responses, num_skipped), the responses as MainSchema dicts.
+    """
+    with open(os.path.join(snapshot_dir, MESSAGE_SNAPSHOT_FILE), "r") as file:
+        messages = json.load(file)
+    steps = load_snapshot_steps(snapshot_dir)
+
+    responses = []
+    num_skipped = 0
+    for index, message in enumerate(messages):
+        if message.get("tag") == TAG_LLM_RAW_RESPONSE:
+            response = _parse_raw_response(message.get("content", ""))
+            if response is None:
+                num_skipped += 1
+            else:
+                responses.append(response)
+            continue
+        match = ACTION_TAG_PATTERN.match(message.get("content", "")) if (
+            message.get("tag") == TAG_ASSISTANT) else None
+        if not match:
+            continue
+        action_name = match.group(1)
+        reasoning = message["content"][match.end():]
+
+        details = None
+        for following in messages[index + 1:]:
+            if following.get("tag") == TAG_USER_INPUT or ACTION_TAG_PATTERN.match(
+                    following.get("content", "")):
+                break
+            result = ACTION_RESULT_PATTERN.match(following.get("content", ""))
+            if following.get("tag") == TAG_SYSTEM_INTERNAL and result:
+                details = following["content"][result.end():]
+                break
+        # The result message is appended to the reasoning in the same message
+        if details and reasoning.endswith("\n\n" + details):
+            reasoning = reasoning[:-len(details) - 2]
+
+        params = _get_params(action_name, details, steps)
+        if params is None:
+            num_skipped += 1
+            continue
+        responses.append({
+            "reasoning": reasoning,
+            "action": {
+                "name": action_name,
+                "params": params
+            }
+        })
+    return responses, num_skipped
+
+
+def load_fixture_responses(fixture_dir):
+    """
+    Loads the responses of a fixture directory: JSON files holding a MainSchema
+    response dict or a list of them, read in natural file name order.
+    """
+    responses = []
+    for file_name in sorted(os.listdir(fixture_dir), key=natural_key):
+        if not file_name.endswith(".json"):
+            continue
+        with open(os.path.join(fixture_dir, file_name), "r") as file:
+            data = json.load(file)
+        responses.extend(data if isinstance(data, list) else [data])
+    return responses
+
+
+def _set_none(document, loc):
+    """Sets the field at a validation error location to None. Locations may hold
+    union tags that are not keys of the document, these are skipped."""
+    *parents, field = loc
+    for key in parents:
+        if isinstance(document, dict) and key in document:
+            document = document[key]
+        elif isinstance(document, list) and isinstance(key, int) and key < len(document):
+            document = document[key]
+    if not isinstance(document, dict):
+        return False
+    document[field] = None
+    return True
+
+
+def complete_response(response, response_schema):
+    """
+    Returns a copy of a recorded response that validates against the schema.
+
+    Animations are stored without their null fields, while the schema requires
+    them to be given, so missing fields are set to None. Fields that do not
+    accept None still fail validation.
+
+    Raises:
+        ValidationError: If the response does not match the schema.
+    """
+    response = copy.deepcopy(response)
+    for _ in range(MAX_COMPLETION_ROUNDS):
+        try:
+            response_schema.model_validate(response)
+            return response
+        except ValidationError as e:
+            missing = [
+                error["loc"] for error in e.errors()
+                if error["type"] == "missing"
+            ]
+            if not missing or not all(
+                    _set_none(response, loc) for loc in missing):
+                raise
+    response_schema.model_validate(response)
+    return response
+
+
+def load_recorded_responses(source):
+    """
+    Loads recorded responses from a snapshot directory (one with a messages.json)
+    or from a fixture directory.
+
+    Returns:
+        tuple: (responses, num_skipped)
+    """
+    if os.path.exists(os.path.join(source, MESSAGE_SNAPSHOT_FILE)):
+        return load_snapshot_responses(source)
+    return load_fixture_responses(source), 0
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from constants import RESPONSE_CACHE_FILE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS
+
+# Cache modes of a request: serve and store responses, only store fresh ones, or skip the cache
+CACHE_USE = "use"
+CACHE_REFRESH = "refresh"
+CACHE_BYPASS = "bypass"
+CACHE_MODES = (CACHE_USE, CACHE_REFRESH, CACHE_BYPASS)
+
+
+def canonical_messages(messages):
+    """The role and content of each message, without keys like the Formatter's cache marker."""
+    return [{
+        "role": message.get("role"),
+        "content": message.get("content")
+    } for message in messages]
+
+
+class ResponseCache:
+    """
+    SQLite store of validated LLM responses, keyed by a hash of the request.
+
+    Entries older than ttl_seconds are not served and are deleted on the next
+    write. When the stored responses exceed max_bytes, the least recently used
+    ones are deleted.
+    """
+
+    def __init__(self,
+                 path=RESPONSE_CACHE_FILE,
+                 max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 ttl_seconds=RESPONSE_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # Hash of each schema's JSON schema, computed once per schema class
+        self._schema_digests = {}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+
+    def _schema_digest(self, response_schema):
+        digest = self._schema_digests.get(response_schema)
+        if digest is None:
+            schema_json = json.dumps(response_schema.model_json_schema(),
+                                     sort_keys=True)
+            digest = hashlib.sha256(schema_json.encode("utf-8")).hexdigest()
+            self._schema_digests[response_schema] = digest
+        return digest
+
+    def make_key(self, model, temperature, response_schema, messages):
+        """
+        Hash of a request.
+
+        :param model: Model name of the backend.
+        :param temperature: Sampling temperature.
+        :param response_schema: Pydantic model the response is validated against.
+        :param messages: The messages sent to the LLM.
+        :return: Hex digest identifying the request.
+        """
+        request = json.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "schema": self._schema_digest(response_schema),
+                "messages": canonical_messages(messages),
+            },
+            sort_keys=True,
+            separators=(",", ":"))
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the stored response JSON of a key, or None if it is missing or expired.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT response FROM responses WHERE key = ? AND created >= ?",
+                (key, now - self.ttl_seconds)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, response_json):
+        """Stores a response JSON, then evicts expired and least recently used entries."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response_json, len(response_json), now, now))
+            self._evict(now)
+
+    def _evict(self, now):
+        self._connection.execute("DELETE FROM responses WHERE created < ?",
+                                 (now - self.ttl_seconds, ))
+        total_size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        # Walk the entries from the least recently used, until enough was freed
+        excess = total_size - self.max_bytes
+        keys = []
+        for key, size in self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            keys.append((key, ))
+            excess -= size
+            if excess <= 0:
+                break
+        self._connection.executemany("DELETE FROM responses WHERE key = ?",
+                                     keys)
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def get_stats(self):
+        with self._lock:
+            count, total_size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "entries": count,
+            "size_bytes": total_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
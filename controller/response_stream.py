@@ -0,0 +1,155 @@
+import threading
+from typing import get_args
+
+from pydantic import TypeAdapter, ValidationError
+
+# Actions whose params hold an animation_sequence with an effects list
+ANIMATION_ACTIONS = ("update_animation", "high_level_plan_update")
+
+
+def get_effect_validator(framework_schema):
+    """
+    Returns a TypeAdapter validating a single effect of the framework's animation,
+    or None if the schema has no animation.effects list.
+    """
+    try:
+        animation_model = framework_schema.model_fields["animation"].annotation
+        effects_type = animation_model.model_fields["effects"].annotation
+        return TypeAdapter(get_args(effects_type)[0])
+    except (AttributeError, KeyError, IndexError):
+        return None
+
+
+def get_animation_sequence(partial):
+    """Returns the animation_sequence of a (partial) response dict, or None."""
+    action = partial.get("action")
+    if not isinstance(action, dict) or action.get("name") not in ANIMATION_ACTIONS:
+        return None
+    params = action.get("params")
+    sequence = params.get("animation_sequence") if isinstance(params, dict) else None
+    return sequence if isinstance(sequence, dict) else None
+
+
+class StreamingResponseHandler:
+    """
+    Follows a response while it is streamed (see LLMBackend.stream_response).
+
+    The reasoning is reported as soon as it is complete, that is when the action
+    starts. Effects of an animation are validated one by one as they complete:
+    an effect is complete once the next one starts, and the last one when the
+    response ends. While the response is still streaming, the animation cut to
+    its completed effects is reported, as long as all of them are valid.
+    """
+
+    def __init__(self,
+                 effect_validator=None,
+                 on_reasoning=None,
+                 on_effect=None,
+                 on_completed_effects=None):
+        """
+        Args:
+            effect_validator (TypeAdapter, optional): Validator of a single effect, see get_effect_validator.
+            on_reasoning (callable, optional): Called with the complete reasoning text.
+            on_effect (callable, optional): Called with (index, effect, error) for each completed effect,
+                error is None for a valid effect.
+            on_completed_effects (callable, optional): Called with (action_name, animation_sequence),
+                the sequence holding only the completed effects, each time more effects complete
+                before the response ends.
+        """
+        self.effect_validator = effect_validator
+        self.on_reasoning = on_reasoning
+        self.on_effect = on_effect
+        self.on_completed_effects = on_completed_effects
+        self.reasoning = None
+        self.num_completed_effects = 0
+        self.effect_errors = {}
+
+    def update(self, partial, done=False):
+        """Handles the response parsed so far, done is True for the complete response."""
+        if self.reasoning is None and isinstance(partial.get("reasoning"), str) and (
+                "action" in partial or done):
+            self.reasoning = partial["reasoning"]
+            if self.on_reasoning:
+                self.on_reasoning(self.reasoning)
+
+        sequence = get_animation_sequence(partial)
+        animation = sequence.get("animation") if sequence else None
+        effects = animation.get("effects") if isinstance(animation, dict) else None
+        if not isinstance(effects, list):
+            return
+
+        num_completed = len(effects) if done else len(effects) - 1
+        if num_completed <= self.num_completed_effects:
+            return
+        for index in range(self.num_completed_effects, num_completed):
+            error = self._validate_effect(effects[index])
+            if error:
+                self.effect_errors[index] = error
+            if self.on_effect:
+                self.on_effect(index, effects[index], error)
+        self.num_completed_effects = num_completed
+
+        if not done and not self.effect_errors and self.on_completed_effects:
+            self.on_completed_effects(
+                partial["action"]["name"], {
+                    **sequence, "animation": {
+                        **animation, "effects": effects[:num_completed]
+                    }
+                })
+
+    def _validate_effect(self, effect):
+        if self.effect_validator is None:
+            return None
+        try:
+            self.effect_validator.validate_python(effect)
+        except ValidationError as e:
+            return str(e)
+        return None
+
+
+class BackgroundUploader:
+    """
+    Runs uploads on a background thread, one at a time. When several animations
+    are submitted while an upload runs, only the latest one is uploaded next.
+    """
+
+    def __init__(self, upload):
+        """
+        Args:
+            upload (callable): Uploads an animation_sequence.
+        """
+        self._upload = upload
+        self._lock = threading.Lock()
+        self._pending = None
+        self._thread = None
+        self.num_uploads = 0
+        self.errors = []
+
+    def submit(self, animation_sequence):
+        with self._lock:
+            self._pending = animation_sequence
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                animation_sequence, self._pending = self._pending, None
+                if animation_sequence is None:
+                    self._thread = None
+                    return
+            try:
+                self._upload(animation_sequence)
+                self.num_uploads += 1
+            except Exception as e:
+                self.errors.append(str(e))
+
+    def wait(self):
+        """Waits until every submitted upload is done."""
+        while True:
+            with self._lock:
+                thread = self._thread
+            if thread is None:
+                return
+            thread.join()
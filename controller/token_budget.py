@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import threading
+
+import tiktoken
+
+from controller.message_streamer import count_words, estimate_tokens
+
+# Encoding used when the model has no tiktoken mapping. Claude and Gemini do not ship
+# a local tokenizer, cl100k_base is a close approximation for English and JSON text.
+DEFAULT_ENCODING = "cl100k_base"
+
+# Number of per-text token counts kept by each TokenCounter
+TOKEN_CACHE_SIZE = 4096
+
+OMITTED_MESSAGES_NOTE = "[{count} earlier messages ({tokens} tokens) were omitted to fit the context budget.]"
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _load_encoding(model_name):
+    """Load (once) the tiktoken encoding of a model. Returns None if tiktoken cannot load it."""
+    with _encodings_lock:
+        if model_name in _encodings:
+            return _encodings[model_name]
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = None
+        except Exception as e:
+            logging.getLogger("TokenBudget").warning(
+                f"Could not load tokenizer for {model_name}: {e}")
+            encoding = None
+        if encoding is None:
+            try:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception as e:
+                # e.g. no network to download the encoding, fall back to the word estimate
+                logging.getLogger("TokenBudget").warning(
+                    f"Could not load {DEFAULT_ENCODING} encoding, estimating tokens from words: {e}"
+                )
+                encoding = None
+        _encodings[model_name] = encoding
+        return encoding
+
+
+class TokenCounter:
+    """Counts tokens with the tokenizer of a model, caching the count of each text."""
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name or "gpt-4"
+        self.encoding = _load_encoding(self.model_name)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            tokens = self._cache.get(key)
+        if tokens is not None:
+            return tokens
+
+        if self.encoding is not None:
+            tokens = len(self.encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = estimate_tokens(count_words(text))
+
+        with self._lock:
+            if len(self._cache) >= TOKEN_CACHE_SIZE:
+                del self._cache[next(iter(self._cache))]
+            self._cache[key] = tokens
+        return tokens
+
+    def count_messages(self, messages) -> int:
+        return sum(self.count(message["content"]) for message in messages)
+
+
+class ContextBudgeter:
+    """
+    Fits a prompt into a token budget.
+
+    The prompt is made of named fixed sections (task, memory, song structure,
+    animation) and the conversation history. Fixed sections are always sent.
+    When the total is over budget, the oldest history messages are dropped
+    and replaced by a short note, but the latest message is always kept.
+    """
+
+    def __init__(self, token_counter: TokenCounter, budget_tokens=None):
+        """
+        :param token_counter: TokenCounter for the selected backend's model.
+        :param budget_tokens: Maximum prompt tokens, None or 0 for no limit.
+        """
+        self.token_counter = token_counter
+        self.budget_tokens = budget_tokens
+        self.logger = logging.getLogger("ContextBudgeter")
+
+    def fit(self, sections, history):
+        """
+        :param sections: List of (section_name, messages) pairs, sent in this order.
+        :param history: List of history messages, oldest first.
+        :return: Tuple (messages, breakdown), where breakdown maps each section,
+                 "history" and "total" to its token count and holds the number of
+                 dropped history messages under "dropped_messages".
+        """
+        breakdown = {}
+        messages = []
+        for section_name, section_messages in sections:
+            breakdown[section_name] = breakdown.get(
+                section_name, 0) + self.token_counter.count_messages(
+                    section_messages)
+            messages.extend(section_messages)
+        fixed_tokens = sum(breakdown.values())
+
+        history_tokens = [
+            self.token_counter.count(message["content"]) for message in history
+        ]
+        total_history = sum(history_tokens)
+        first_kept = 0
+        if self.budget_tokens and fixed_tokens + total_history > self.budget_tokens:
+            # Leave room for the note that replaces the dropped messages
+            available = self.budget_tokens - fixed_tokens - self.token_counter.count(
+                OMITTED_MESSAGES_NOTE.format(count=len(history),
+                                             tokens=total_history))
+            # Drop the oldest messages, always keep the latest one
+            while (first_kept < len(history) - 1
+                   and total_history > available):
+                total_history -= history_tokens[first_kept]
+                first_kept += 1
+
+        if first_kept:
+            dropped_tokens = sum(history_tokens[:first_kept])
+            note = {
+                "role":
+                "system",
+                "content":
+                OMITTED_MESSAGES_NOTE.format(count=first_kept,
+                                             tokens=dropped_tokens)
+            }
+            messages.append(note)
+            total_history += self.token_counter.count(note["content"])
+
+        messages.extend(history[first_kept:])
+        breakdown["history"] = total_history
+        breakdown["total"] = fixed_tokens + total_history
+        breakdown["dropped_messages"] = first_kept
+
+        budget = self.budget_tokens or "unlimited"
+        sections_log = ", ".join(f"{name}={tokens}"
+                                 for name, tokens in breakdown.items()
+                                 if name not in ("total", "dropped_messages"))
+        self.logger.info(
+            f"Prompt tokens ({self.token_counter.model_name}): {sections_log}, "
+            f"total={breakdown['total']}/{budget}, dropped {first_kept} history messages"
+        )
+        return messages, breakdown
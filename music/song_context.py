@@ -0,0 +1,101 @@
+from music.song_provider import SongProvider
+from music.song_timeline import INTERVAL_FORMAT, POINT_FORMAT
+
+# Bars added before and after the requested time window, so effects that
+# start or end just outside of it still see the surrounding structure
+SONG_CONTEXT_MARGIN_BARS = 1
+
+# (kind, section title) of the label tracks included in a window
+WINDOW_SECTIONS = [
+    ("bars", "Bars"),
+    ("beats", "Beats"),
+    ("key_points", "Key Points"),
+    ("lyrics", "Lyrics"),
+]
+
+# Column description of each label format
+FORMAT_DESCRIPTIONS = {
+    POINT_FORMAT: "Label | Seconds",
+    INTERVAL_FORMAT: "Start Seconds | End Seconds | Label",
+}
+
+
+class SongContextProvider:
+    """
+    Builds the song part of the prompt for a time window of the song.
+
+    Instead of every bar and beat of the song, only the bars, beats, key points
+    and lyrics that overlap the window are listed, together with a short
+    summary of the whole song (BPM, number of bars and beats, length).
+    """
+
+    def __init__(self,
+                 song_provider: SongProvider,
+                 margin_bars=SONG_CONTEXT_MARGIN_BARS):
+        """
+        Args:
+            song_provider (SongProvider): Provider of the song label files.
+            margin_bars (int): Bars of context added on each side of a window.
+        """
+        self.song_provider = song_provider
+        self.margin_bars = margin_bars
+
+    def get_summary(self, song_name):
+        """
+        Returns a compact summary of the whole song.
+
+        Args:
+            song_name (str): The name of the song.
+
+        Returns:
+            str: The formatted summary.
+        """
+        timeline = self.song_provider.get_timeline(song_name)
+        bars, beats = timeline.bars, timeline.beats
+        key_points = timeline.get_track("key_points")
+
+        content = f"### {song_name.capitalize()} Song Summary\n"
+        if timeline.bpm:
+            content += f"BPM: {timeline.bpm:g}\n"
+        if len(bars):
+            content += (
+                f"{len(bars)} bars, from {bars[0]:.3f}s to {bars[-1]:.3f}s, "
+                f"about {timeline.bar_length:.3f} seconds per bar\n")
+        if len(timeline.phrases):
+            content += f"{len(timeline.phrases)} phrases of 8 bars\n"
+        if len(beats):
+            content += f"{len(beats)} beats, from {beats[0]:.3f}s to {beats[-1]:.3f}s\n"
+        if key_points:
+            content += f"{len(key_points)} key points, ending at {key_points.ends.max():.3f}s\n"
+        content += "Only the part of the song around the effects being edited is listed in detail.\n\n"
+        return content
+
+    def get_window(self, song_name, start_seconds, end_seconds):
+        """
+        Returns the bars, beats, key points and lyrics of a time window of the song.
+
+        The window is widened by margin_bars bars on each side.
+
+        Args:
+            song_name (str): The name of the song.
+            start_seconds (float): Start of the window.
+            end_seconds (float): End of the window.
+
+        Returns:
+            str: The formatted song structure of the window.
+        """
+        timeline = self.song_provider.get_timeline(song_name)
+        margin = self.margin_bars * timeline.bar_length
+        window_start = max(0.0, start_seconds - margin)
+        window_end = end_seconds + margin
+
+        content = f"## {song_name.capitalize()} Song, from {window_start:.3f}s to {window_end:.3f}s\n"
+        for kind, title in WINDOW_SECTIONS:
+            track = timeline.get_track(kind)
+            if track is None:
+                continue
+            indices = track.overlapping(window_start, window_end)
+            if len(indices):
+                content += f"### {title}\n{FORMAT_DESCRIPTIONS[track.label_format]}\n"
+                content += track.render(indices) + "\n\n"
+        return content
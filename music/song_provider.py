@@ -1,4 +1,7 @@
 import os
+import threading
+
+from music.song_timeline import SongTimeline
 
 SONGS_BASE_PATH = "/Users/sapir/repos/lol/music/song_structure"
 
@@ -17,6 +20,9 @@ class SongProvider:
         """
         self.allowed_songs = ["aladdin", "nikki", "sandstorm"]
         self.song_name = None
+        # song_name -> (directory signature, SongTimeline)
+        self._timelines = {}
+        self._timelines_lock = threading.Lock()
 
     def _validate_song_name(self, song_name):
         """Validates that the song name is in the allowed list."""
@@ -25,16 +31,63 @@ class SongProvider:
                 f"Logger: '{song_name}' is not a valid song name. Allowed songs are: {self.allowed_songs}"
             )
 
-    def _read_file_content(self, file_path, section_title, description):
-        """Helper method to read and format file content."""
+    def get_timeline_signature(self, song_name):
+        """Get the (file name, mtime) pairs of the song's directory.
+
+        The signature changes whenever a file in the directory is added, removed
+        or modified, so callers can use it to invalidate what they built from
+        the timeline. It is empty if the directory does not exist.
+
+        Args:
+            song_name (str): The name of the song.
+
+        Returns:
+            tuple: Sorted (file name, mtime in ns) pairs.
+        """
+        song_dir = os.path.join(SONGS_BASE_PATH, song_name)
         try:
-            with open(file_path, 'r') as file:
-                content = f"### {section_title}\n"
-                content += f"{description}\n"
-                content += file.read() + "\n\n"
-                return content
+            return tuple(
+                sorted((entry.name, entry.stat().st_mtime_ns)
+                       for entry in os.scandir(song_dir) if entry.is_file()))
         except FileNotFoundError:
-            return f"### {section_title}\nFile not found: {file_path}\n\n"
+            return ()
+
+    def get_timeline(self, song_name):
+        """Get the parsed SongTimeline of a song.
+
+        The timeline is loaded once and cached. It is reloaded when a file in
+        the song's directory is added, removed or modified.
+
+        Args:
+            song_name (str): The name of the song.
+
+        Returns:
+            SongTimeline: The song's timeline.
+        """
+        self._validate_song_name(song_name)
+        song_dir = os.path.join(SONGS_BASE_PATH, song_name)
+        signature = self.get_timeline_signature(song_name)
+
+        with self._timelines_lock:
+            cached = self._timelines.get(song_name)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            timeline = SongTimeline.load(song_dir, song_name)
+            self._timelines[song_name] = (signature, timeline)
+            return timeline
+
+    def _format_track(self, song_name, kind, section_title, description):
+        """Helper method to format a label track of the song's timeline."""
+        try:
+            track = self.get_timeline(song_name).get_track(kind)
+            if track is None:
+                file_path = os.path.join(SONGS_BASE_PATH, song_name,
+                                         f"{song_name}_{kind}.txt")
+                return f"### {section_title}\nFile not found: {file_path}\n\n"
+            content = f"### {section_title}\n"
+            content += f"{description}\n"
+            content += track.render() + "\n\n"
+            return content
         except Exception as e:
             return f"### {section_title}\nError reading file: {str(e)}\n\n"
 
@@ -52,14 +105,12 @@ class SongProvider:
             raise ValueError("No song name provided")
 
         self._validate_song_name(song_name)
-        lyrics_file_path = os.path.join(SONGS_BASE_PATH, song_name,
-                                        f"{song_name}_lyrics.txt")
 
         description = "The lyrics of the song, with the first number indicating the start time in seconds and the second number indicating the end time:\n"
         description += "Aligning animation changes to the lyrics beginning and ending can enhance the visual experience and create higher quality animations.\n"
         description += "Start Seconds | End Seconds | Label\n"
 
-        return self._read_file_content(lyrics_file_path, "Lyrics", description)
+        return self._format_track(song_name, "lyrics", "Lyrics", description)
 
     def get_key_points(self, song_name=None):
         """Get the key points for a song.
@@ -75,16 +126,14 @@ class SongProvider:
             raise ValueError("No song name provided")
 
         self._validate_song_name(song_name)
-        key_points_file_path = os.path.join(SONGS_BASE_PATH, song_name,
-                                            f"{song_name}_key_points.txt")
 
         description = f"A list of {song_name} key points and their corresponding start time in seconds:\n"
         description += "Aligning animation changes to the keypoints beginning and ending can enhance the visual experience and create higher quality animations.\n"
         description += "User the labels as a guide to create the animation.\n"
         description += "Start Seconds | End Seconds | Label\n"
 
-        return self._read_file_content(key_points_file_path, "Key Points",
-                                       description)
+        return self._format_track(song_name, "key_points", "Key Points",
+                                  description)
 
     def get_drum_pattern(self, song_name=None):
         """Get the drum pattern for a song.
@@ -100,8 +149,6 @@ class SongProvider:
             raise ValueError("No song name provided")
 
         self._validate_song_name(song_name)
-        drums_pattern_file_path = os.path.join(SONGS_BASE_PATH, song_name,
-                                               f"{song_name}_pattern.txt")
 
         description = (
             "The drum pattern of the song repeats cyclically throughout its duration. "
@@ -113,8 +160,8 @@ class SongProvider:
             "Aligning animation changes to the drum pattern can enhance the visual experience and create higher quality animations.\n"
         )
 
-        return self._read_file_content(drums_pattern_file_path,
-                                       "Drums Pattern", description)
+        return self._format_track(song_name, "pattern", "Drums Pattern",
+                                  description)
 
     def get_beats(self, song_name=None):
         """Get the beats for a song.
@@ -130,13 +177,11 @@ class SongProvider:
             raise ValueError("No song name provided")
 
         self._validate_song_name(song_name)
-        beats_file_path = os.path.join(SONGS_BASE_PATH, song_name,
-                                       f"{song_name}_beats.txt")
 
         description = f"A list of {song_name} beats and their corresponding start time in seconds:\n"
         description += "Label | Seconds\n"
 
-        return self._read_file_content(beats_file_path, "Beats", description)
+        return self._format_track(song_name, "beats", "Beats", description)
 
     def get_bars(self, song_name=None):
         """Get the bars for a song.
@@ -152,14 +197,12 @@ class SongProvider:
             raise ValueError("No song name provided")
 
         self._validate_song_name(song_name)
-        bars_file_path = os.path.join(SONGS_BASE_PATH, song_name,
-                                      f"{song_name}_bars.txt")
 
         description = f"A list of {song_name} bars and "
         description += "their corresponding start time in seconds:\n"
         description += "Label | Seconds\n"
 
-        return self._read_file_content(bars_file_path, "Bars", description)
+        return self._format_track(song_name, "bars", "Bars", description)
 
     def get_song_structure(self, song_name):
         """
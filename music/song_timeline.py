@@ -0,0 +1,267 @@
+import os
+
+import numpy as np
+
+# Label file formats
+POINT_FORMAT = "point"  # label<TAB>seconds, e.g. "beat 3\t3.35"
+INTERVAL_FORMAT = "interval"  # Audacity export: start<TAB>end<TAB>label
+
+# Label files of a song, found as '{song_name}_{kind}.txt' or '{song_name}_{kind}_labels.txt'
+TRACK_KINDS = ("bars", "beats", "phrase8", "phrase16", "key_points",
+               "lyrics", "pattern")
+
+BPM_FILE_NAME = "bpm.txt"
+
+
+def find_label_file(song_dir, song_name, kind):
+    """Returns the path of a song's label file, or None if it does not exist."""
+    for file_name in (f"{song_name}_{kind}.txt",
+                      f"{song_name}_{kind}_labels.txt"):
+        file_path = os.path.join(song_dir, file_name)
+        if os.path.exists(file_path):
+            return file_path
+    return None
+
+
+class LabelTrack:
+    """
+    The labels of one label file: start and end times as NumPy arrays sorted by
+    start time, and the label texts. Point labels have equal start and end times.
+    """
+
+    def __init__(self, starts, ends, labels, label_format, file_path=None):
+        order = np.argsort(starts, kind="stable")
+        self.starts = np.asarray(starts, dtype=float)[order]
+        self.ends = np.asarray(ends, dtype=float)[order]
+        self.labels = [labels[index] for index in order]
+        self.label_format = label_format
+        self.file_path = file_path
+
+    @classmethod
+    def parse(cls, file_path):
+        """
+        Parses a label file in either format. Lines that are not labels are skipped.
+
+        Args:
+            file_path (str): Path of the label file.
+
+        Returns:
+            LabelTrack: The parsed labels.
+        """
+        starts, ends, labels = [], [], []
+        label_format = POINT_FORMAT
+        with open(file_path, 'r') as file:
+            for line in file:
+                fields = [field.strip() for field in line.split("\t")]
+                try:
+                    if len(fields) >= 3:
+                        start, end, label = float(fields[0]), float(
+                            fields[1]), fields[2]
+                        label_format = INTERVAL_FORMAT
+                    elif len(fields) == 2:
+                        label, start = fields[0], float(fields[1])
+                        end = start
+                    else:
+                        continue
+                except ValueError:
+                    continue
+                starts.append(start)
+                ends.append(end)
+                labels.append(label)
+        return cls(starts, ends, labels, label_format, file_path)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def overlapping(self, start_seconds, end_seconds):
+        """Returns the indices of the labels that overlap [start_seconds, end_seconds]."""
+        # Labels starting after the window are cut with a binary search,
+        # the rest are filtered by their end time
+        stop = np.searchsorted(self.starts, end_seconds, side="right")
+        return np.flatnonzero(self.ends[:stop] >= start_seconds)
+
+    def render(self, indices=None):
+        """
+        Renders labels as text, one per line, in the format of the label file.
+
+        Args:
+            indices (optional): Indices of the labels to render, all labels if None.
+
+        Returns:
+            str: The rendered labels.
+        """
+        if indices is None:
+            indices = range(len(self.labels))
+        if self.label_format == POINT_FORMAT:
+            lines = [
+                f"{self.labels[index]}\t{self.starts[index]:.6f}"
+                for index in indices
+            ]
+        else:
+            lines = [
+                f"{self.starts[index]:.6f}\t{self.ends[index]:.6f}\t{self.labels[index]}"
+                for index in indices
+            ]
+        return "\n".join(lines)
+
+
+class SongTimeline:
+    """
+    Parsed timing model of a song: the beat, bar and phrase times, the labeled
+    intervals (key points, lyrics, drum pattern) and the BPM.
+
+    Built once from the song's label files. locate() maps a time to its musical
+    position with a binary search over the beat and bar times.
+    """
+
+    def __init__(self, song_name, tracks, bpm=None):
+        """
+        Args:
+            song_name (str): The name of the song.
+            tracks (dict): Maps a track kind (see TRACK_KINDS) to its LabelTrack.
+            bpm (float, optional): The song's BPM.
+        """
+        self.song_name = song_name
+        self.tracks = tracks
+        self.bpm = bpm
+
+    @classmethod
+    def load(cls, song_dir, song_name):
+        """
+        Loads the timeline of a song from its directory.
+
+        Args:
+            song_dir (str): Directory of the song's label files.
+            song_name (str): The name of the song, the prefix of its label files.
+
+        Returns:
+            SongTimeline: The parsed timeline. Missing label files are left out.
+        """
+        tracks = {}
+        for kind in TRACK_KINDS:
+            file_path = find_label_file(song_dir, song_name, kind)
+            if file_path:
+                tracks[kind] = LabelTrack.parse(file_path)
+
+        bpm = None
+        try:
+            with open(os.path.join(song_dir, BPM_FILE_NAME), 'r') as file:
+                bpm = float(file.read().strip())
+        except (FileNotFoundError, ValueError):
+            pass
+        return cls(song_name, tracks, bpm)
+
+    def get_track(self, kind):
+        """Returns the LabelTrack of a kind, or None if the song has no such file."""
+        return self.tracks.get(kind)
+
+    def _get_times(self, kind):
+        track = self.tracks.get(kind)
+        return track.starts if track is not None else np.empty(0)
+
+    @property
+    def beats(self):
+        """Beat start times in seconds."""
+        return self._get_times("beats")
+
+    @property
+    def bars(self):
+        """Bar start times in seconds."""
+        return self._get_times("bars")
+
+    @property
+    def phrases(self):
+        """Phrase (8 bars) start times in seconds."""
+        return self._get_times("phrase8")
+
+    @property
+    def bar_length(self):
+        """Average bar length in seconds, 0 if the song has less than two bars."""
+        bars = self.bars
+        if len(bars) < 2:
+            return 0.0
+        return float((bars[-1] - bars[0]) / (len(bars) - 1))
+
+    def locate(self, time_seconds):
+        """
+        Maps a time to its musical position.
+
+        Times before the first beat are clamped to it. Songs without bar labels
+        are treated as a single bar.
+
+        Args:
+            time_seconds (float): Time in seconds.
+
+        Returns:
+            tuple: (bar, beat, fraction), the bar index, the index of the beat
+                within the bar (negative for pickup beats before the first bar) and
+                the fraction [0, 1) of the beat that has passed. None if the song
+                has no beat labels.
+        """
+        beats = self.beats
+        if not len(beats):
+            return None
+        beat = max(0, int(np.searchsorted(beats, time_seconds, side="right")) - 1)
+        if beat + 1 < len(beats):
+            beat_length = beats[beat + 1] - beats[beat]
+        elif len(beats) > 1:
+            beat_length = beats[-1] - beats[-2]
+        else:
+            beat_length = 0.0
+        fraction = 0.0
+        if beat_length > 0:
+            fraction = min(
+                max((time_seconds - beats[beat]) / beat_length, 0.0),
+                np.nextafter(1.0, 0.0))
+
+        bars = self.bars
+        bar = 0
+        if len(bars):
+            bar = max(0,
+                      int(np.searchsorted(bars, beats[beat], side="right")) - 1)
+            beat -= int(np.searchsorted(beats, bars[bar], side="left"))
+        return bar, beat, float(fraction)
+
+    def get_grid(self, subdivision=1):
+        """
+        Returns the beat grid: every beat time, and subdivision - 1 evenly spaced
+        times between each two consecutive beats.
+
+        Args:
+            subdivision (int): Grid points per beat, e.g. 2 for eighths, 4 for sixteenths.
+
+        Returns:
+            np.ndarray: Sorted grid times in seconds.
+        """
+        beats = self.beats
+        subdivision = max(1, int(subdivision))
+        if len(beats) < 2 or subdivision == 1:
+            return beats.copy()
+        steps = np.arange(subdivision) / subdivision
+        grid = beats[:-1, None] + np.diff(beats)[:, None] * steps[None, :]
+        return np.append(grid.ravel(), beats[-1])
+
+
+def snap_to_grid(times, grid, tolerance):
+    """
+    Snaps times to the nearest grid point, if it is within tolerance.
+
+    All times are looked up with a single np.searchsorted call.
+
+    Args:
+        times: Times to snap, in the unit of grid.
+        grid (np.ndarray): Sorted grid times.
+        tolerance (float): Maximum distance a time is moved.
+
+    Returns:
+        np.ndarray: The snapped times (times out of tolerance are unchanged).
+    """
+    times = np.asarray(times, dtype=float)
+    if not len(grid):
+        return times.copy()
+    right = np.clip(np.searchsorted(grid, times), 0, len(grid) - 1)
+    left = np.clip(right - 1, 0, len(grid) - 1)
+    nearest = np.where(
+        np.abs(times - grid[left]) <= np.abs(grid[right] - times), grid[left],
+        grid[right])
+    return np.where(np.abs(nearest - times) <= tolerance, nearest, times)
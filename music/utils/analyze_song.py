@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import wave
+
+import numpy as np
+
+from generate_audacity_labels import TEMPO_MAP_FILE, export_labels, generate_labels, label_file_name, save_tempo_map
+
+SONG_STRUCTURE_DIR = os.path.join(os.path.dirname(__file__), '..',
+                                  'song_structure')
+SONGS_DIR = os.path.join(os.path.dirname(__file__), '..', 'songs')
+
+# Audio frames read from the WAV file at a time
+CHUNK_FRAMES = 1 << 16
+# STFT frame and hop size in samples
+N_FFT = 2048
+HOP_LENGTH = 512
+# Log compression of the magnitude spectrum before the spectral flux
+LOG_COMPRESSION = 100.0
+# Upper frequency of the low band (kick drum and bass) used to find the downbeats
+LOW_BAND_HZ = 200.0
+# Window of the moving average removed from the onset envelope, in seconds
+LOCAL_MEAN_SECONDS = 0.5
+# Center and width (in octaves) of the tempo prior, favors common tempos
+# over their double and half
+TEMPO_PRIOR_BPM = 120.0
+TEMPO_PRIOR_OCTAVES = 1.0
+
+
+def read_wav_chunks(path, chunk_frames=CHUNK_FRAMES):
+    """Yield the sample rate, then mono float samples of a PCM WAV file in chunks."""
+    with wave.open(path, 'rb') as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        yield wav.getframerate()
+        while True:
+            data = wav.readframes(chunk_frames)
+            if not data:
+                break
+            if sample_width == 1:
+                samples = (np.frombuffer(data, dtype=np.uint8).astype(
+                    np.float32) - 128) / 128
+            elif sample_width == 2:
+                samples = np.frombuffer(data, dtype='<i2').astype(
+                    np.float32) / 32768
+            elif sample_width == 3:
+                raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+                samples = (raw[:, 0].astype(np.int32) |
+                           (raw[:, 1].astype(np.int32) << 8) |
+                           (raw[:, 2].astype(np.int8).astype(np.int32) << 16)
+                           ).astype(np.float32) / 8388608
+            elif sample_width == 4:
+                samples = np.frombuffer(data, dtype='<i4').astype(
+                    np.float32) / 2147483648
+            else:
+                raise ValueError(f"Unsupported sample width: {sample_width}")
+            yield samples.reshape(-1, channels).mean(axis=1)
+
+
+def onset_envelope(chunks, sample_rate, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Compute the spectral flux onset envelope of streamed audio chunks, over
+    all frequencies and over the low band only.
+
+    Returns:
+        tuple: (envelope, low band envelope, number of samples read)
+    """
+    window = np.hanning(n_fft).astype(np.float32)
+    low_bins = max(1, int(LOW_BAND_HZ * n_fft / sample_rate))
+    buffer = np.zeros(0, dtype=np.float32)
+    previous = None
+    flux = []
+    low_flux = []
+    num_samples = 0
+    for chunk in chunks:
+        num_samples += len(chunk)
+        buffer = np.concatenate([buffer, chunk])
+        if len(buffer) < n_fft:
+            continue
+        num_frames = 1 + (len(buffer) - n_fft) // hop_length
+        frames = np.lib.stride_tricks.sliding_window_view(
+            buffer, n_fft)[::hop_length][:num_frames]
+        spectrum = np.log1p(LOG_COMPRESSION *
+                            np.abs(np.fft.rfft(frames * window, axis=1)))
+        if previous is None:
+            previous = spectrum[:1]
+        # Sum of the spectral energy increases, frame over frame
+        increases = np.maximum(
+            np.diff(np.vstack([previous, spectrum]), axis=0), 0)
+        flux.append(increases.sum(axis=1))
+        low_flux.append(increases[:, :low_bins].sum(axis=1))
+        previous = spectrum[-1:]
+        buffer = buffer[num_frames * hop_length:]
+    if not flux:
+        return np.zeros(0), np.zeros(0), num_samples
+    return np.concatenate(flux), np.concatenate(low_flux), num_samples
+
+
+def normalize_envelope(envelope, frame_rate):
+    """Remove the local mean of the envelope and scale it to [0, 1]."""
+    width = max(1, int(LOCAL_MEAN_SECONDS * frame_rate))
+    local_mean = np.convolve(envelope, np.ones(width) / width, mode='same')
+    envelope = np.maximum(envelope - local_mean, 0)
+    peak = envelope.max() if len(envelope) else 0
+    return envelope / peak if peak > 0 else envelope
+
+
+def estimate_tempo(envelope, frame_rate, min_bpm, max_bpm):
+    """Estimate the beat period (in envelope frames) from the envelope autocorrelation."""
+    size = 1 << int(np.ceil(np.log2(2 * len(envelope))))
+    spectrum = np.fft.rfft(envelope - envelope.mean(), size)
+    autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum))[:len(envelope)]
+
+    min_lag = max(1, int(60 * frame_rate / max_bpm))
+    max_lag = min(len(autocorrelation) - 1, int(60 * frame_rate / min_bpm) + 1)
+    if max_lag <= min_lag:
+        raise ValueError("Audio is too short to estimate the tempo")
+    lags = np.arange(min_lag, max_lag + 1)
+    bpms = 60 * frame_rate / lags
+    prior = np.exp(-0.5 *
+                   (np.log2(bpms / TEMPO_PRIOR_BPM) / TEMPO_PRIOR_OCTAVES)**2)
+    return float(lags[np.argmax(autocorrelation[lags] * prior)])
+
+
+def comb_score(envelope, period, phase):
+    """Mean envelope value on the beats of an evenly spaced grid."""
+    positions = np.rint(np.arange(phase, len(envelope), period)).astype(int)
+    positions = positions[positions < len(envelope)]
+    return float(envelope[positions].mean()) if len(positions) else 0.0
+
+
+def _comb_scores(envelope, periods, phase_step):
+    """Best phase and its score of a beat comb over the envelope, for each period."""
+    best_phases = np.zeros(len(periods))
+    best_scores = np.zeros(len(periods))
+    for index, period in enumerate(periods):
+        phases = np.arange(0, period, phase_step)
+        beats = np.arange(int((len(envelope) - 1) / period) + 1) * period
+        positions = np.rint(phases[:, None] + beats[None, :]).astype(int)
+        valid = positions < len(envelope)
+        scores = np.where(valid, envelope[np.minimum(positions,
+                                                     len(envelope) - 1)],
+                          0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+        best = np.argmax(scores)
+        best_phases[index] = phases[best]
+        best_scores[index] = scores[best]
+    return best_phases, best_scores
+
+
+def fit_beat_grid(envelope, period, search_frames=1.0, num_periods=201):
+    """
+    Refine the beat period and find the first beat, by fitting an evenly spaced
+    beat comb to the whole envelope.
+
+    Returns:
+        tuple: (period, phase) in envelope frames
+    """
+    periods = np.linspace(period - search_frames, period + search_frames,
+                          num_periods)
+    periods = periods[periods > 1]
+    phases, scores = _comb_scores(envelope, periods, 0.25)
+    best = np.argmax(scores)
+    return float(periods[best]), float(phases[best])
+
+
+def find_downbeat(envelope, beat_frames, beats_per_bar):
+    """Index (0 to beats_per_bar - 1) of the first downbeat: the beat position in
+    the bar with the strongest (low band) onsets."""
+    positions = np.rint(beat_frames).astype(int)
+    # Strongest onset within a frame of each beat
+    neighbors = np.clip(positions[:, None] + np.arange(-1, 2)[None, :], 0,
+                        len(envelope) - 1)
+    strengths = envelope[neighbors].max(axis=1)
+    scores = [
+        strengths[offset::beats_per_bar].mean()
+        for offset in range(min(beats_per_bar, len(strengths)))
+    ]
+    return int(np.argmax(scores))
+
+
+def analyze(path, min_bpm=60.0, max_bpm=200.0, beats_per_bar=4):
+    """
+    Analyze a WAV file.
+
+    Returns:
+        dict: {"bpm", "duration", "beats", "downbeat"}, where beats are the beat
+            times in seconds and downbeat is the index of the first bar's beat.
+    """
+    chunks = read_wav_chunks(path)
+    sample_rate = next(chunks)
+    envelope, low_envelope, num_samples = onset_envelope(chunks, sample_rate)
+    frame_rate = sample_rate / HOP_LENGTH
+    envelope = normalize_envelope(envelope, frame_rate)
+    low_envelope = normalize_envelope(low_envelope, frame_rate)
+
+    period = estimate_tempo(envelope, frame_rate, min_bpm, max_bpm)
+    period, phase = fit_beat_grid(envelope, period)
+    # Off-beat hi-hats can outweigh the beats in the full band. Beats fall on
+    # the kick and bass notes, so keep the half of the grid the low band favors
+    off_beat_phase = (phase + period / 2) % period
+    if comb_score(low_envelope, period, off_beat_phase) > comb_score(
+            low_envelope, period, phase):
+        phase = off_beat_phase
+    beat_frames = np.arange(phase, len(envelope), period)
+    downbeat = find_downbeat(low_envelope, beat_frames, beats_per_bar)
+
+    # Frame i of the envelope is centered on sample i * hop + n_fft / 2
+    beats = (beat_frames * HOP_LENGTH + N_FFT / 2) / sample_rate
+    return {
+        "bpm": 60 * frame_rate / period,
+        "duration": num_samples / sample_rate,
+        "beats": beats,
+        "downbeat": downbeat,
+    }
+
+
+def find_song_audio(song):
+    """Return the first WAV file of a song under the songs directory."""
+    matches = sorted(
+        glob.glob(os.path.join(SONGS_DIR, song, '**', '*.wav'),
+                  recursive=True))
+    if not matches:
+        raise FileNotFoundError(
+            f"No WAV file found for '{song}' under {os.path.join(SONGS_DIR, song)}")
+    return matches[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate beat, bar and phrase labels from a song WAV file')
+    parser.add_argument('--song', type=str, required=True, help='Name of the song')
+    parser.add_argument('--audio', type=str,
+                        help='WAV file (default: the first .wav under music/songs/{song})')
+    parser.add_argument('--output-dir', type=str,
+                        help='Output directory (default: music/song_structure/{song})')
+    parser.add_argument('--min-bpm', type=float, default=60.0, help='Lowest tempo considered')
+    parser.add_argument('--max-bpm', type=float, default=200.0, help='Highest tempo considered')
+    parser.add_argument('--beats-per-bar', type=int, default=4, help='Beats per bar (default: 4)')
+    parser.add_argument('--bars-per-phrase', type=int, default=8, choices=[8, 16],
+                        help='Number of bars per phrase (default: 8, choices: 8 or 16)')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Overwrite existing label files')
+
+    args = parser.parse_args()
+
+    audio_path = args.audio or find_song_audio(args.song)
+    output_dir = args.output_dir or os.path.join(SONG_STRUCTURE_DIR, args.song)
+    os.makedirs(output_dir, exist_ok=True)
+
+    result = analyze(audio_path, args.min_bpm, args.max_bpm, args.beats_per_bar)
+    # The analyzed tempo is constant, so the beats are regenerated from a single
+    # segment tempo map, which is also saved for generate_audacity_labels.py --all
+    segments = [(float(result["beats"][0]), result["bpm"])]
+    labels = generate_labels(segments, result["duration"], args.beats_per_bar,
+                             result["downbeat"], (args.bars_per_phrase, ))
+
+    outputs = [label_file_name(args.song, kind, "audacity") for kind in labels]
+    outputs += ["bpm.txt", TEMPO_MAP_FILE]
+    existing = [
+        name for name in outputs if os.path.exists(os.path.join(output_dir, name))
+    ]
+    if existing and not args.overwrite:
+        raise SystemExit(
+            f"{', '.join(existing)} already exist in {output_dir}, use --overwrite to replace them")
+
+    export_labels(args.song, labels, output_dir, ("audacity", ))
+    with open(os.path.join(output_dir, "bpm.txt"), 'w') as f:
+        f.write(f"{result['bpm']:.3f}")
+    save_tempo_map(os.path.join(output_dir, TEMPO_MAP_FILE), segments,
+                   result["duration"], args.beats_per_bar, result["downbeat"])
+
+    beats, bars = labels["beats"], labels["bars"]
+    phrases = labels[f"phrase{args.bars_per_phrase}"]
+    print(f"Analyzed {audio_path} ({result['duration']:.1f}s): {result['bpm']:.2f} BPM, "
+          f"first beat at {beats[0]:.3f}s, first downbeat at {bars[0]:.3f}s")
+    print(f"Wrote {len(beats)} beats, {len(bars)} bars and {len(phrases)} phrases to {output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,245 @@
 #!/usr/bin/env python3
 
 import argparse
-import math
+import json
 import os
 
+import numpy as np
+
+SONG_STRUCTURE_DIR = os.path.join(os.path.dirname(__file__), '..',
+                                  'song_structure')
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'output')
+
+# Tempo map of a song, read by --all: {"duration": seconds, "segments": [{"start": seconds, "bpm": bpm}, ...]}
+# and optionally "beats_per_bar" and "downbeat" (index of the first beat of bar 0)
+TEMPO_MAP_FILE = "tempo_map.json"
+
+PHRASE_BARS = (8, 16)
+TIME_TOLERANCE = 1e-6
+
+# Label names in each export format: Audacity label files, and the
+# '{song}_{kind}.txt' timeline files that SongProvider reads first
+AUDACITY_PREFIXES = {"beats": "b", "bars": "br", "phrase": "phrase"}
+TIMELINE_PREFIXES = {"beats": "beat", "bars": "bar", "phrase": "phrase"}
+FORMATS = ("audacity", "timeline")
+
+
 def calculate_beat_duration(bpm):
     """Calculate the duration of one beat in seconds."""
     return 60.0 / bpm
 
-def generate_labels(bpm, duration, label_type, bars_per_phrase=8):
-    """Generate labels based on BPM and duration."""
-    beat_duration = calculate_beat_duration(bpm)
-    labels = []
-    offset = 10.2
-    
-    if label_type == "beats":
-        # Generate beat labels
-        for i in range(int(duration / beat_duration) + 1):
-            start_time = offset + i * beat_duration
-            end_time = start_time
-            labels.append(f"{start_time:.6f}\t{end_time:.6f}\tb {i}")
-            
-    elif label_type == "bars":
-        # Generate bar labels (4 beats per bar)
-        bar_duration = beat_duration * 4
-        for i in range(int(duration / bar_duration) + 1):
-            start_time = offset + i * bar_duration
-            end_time = start_time
-            labels.append(f"{start_time:.6f}\t{end_time:.6f}\tbr {i}")
-            
-    elif label_type == "phrase":
-        # Generate phrase labels (bars_per_phrase bars per phrase)
-        phrase_duration = beat_duration * 4 * bars_per_phrase
-        for i in range(int(duration / phrase_duration) + 1):
-            start_time = offset + i * phrase_duration
-            end_time = start_time
-            labels.append(f"{start_time:.6f}\t{end_time:.6f}\tphrase {i}")
-    
+
+def parse_tempo_map(text):
+    """Parse a tempo map like '0:120,32.5:128' into [(start_seconds, bpm), ...]."""
+    segments = []
+    for item in text.split(','):
+        start, bpm = item.split(':')
+        segments.append((float(start), float(bpm)))
+    return segments
+
+
+def generate_beat_times(segments, duration):
+    """
+    Generate the beat times of a piecewise constant tempo map.
+
+    Each segment starts a new beat at its start time, and its beats are evenly
+    spaced until the next segment starts (or until duration).
+
+    Args:
+        segments: (start_seconds, bpm) pairs.
+        duration (float): End of the song in seconds.
+
+    Returns:
+        np.ndarray: Beat times in seconds.
+    """
+    # Tempo changes after the end of the song add no beats
+    segments = [
+        segment for segment in sorted(segments)
+        if segment[0] <= duration + TIME_TOLERANCE
+    ]
+    starts = np.array([start for start, _ in segments], dtype=float)
+    periods = 60.0 / np.array([bpm for _, bpm in segments], dtype=float)
+    ends = np.append(starts[1:], duration)
+    # Beats in [start, end) of each segment, the last segment also keeps a beat at duration.
+    # Times are compared with a microsecond tolerance, the label files keep 6 decimals
+    spans = np.maximum(ends - starts, 0)
+    counts = np.ceil((spans - TIME_TOLERANCE) / periods).astype(int)
+    counts[-1] = int(np.floor((spans[-1] + TIME_TOLERANCE) / periods[-1])) + 1
+    counts = np.maximum(counts, 0)
+
+    first_beat = np.cumsum(counts) - counts
+    beat_in_segment = np.arange(counts.sum()) - np.repeat(first_beat, counts)
+    return np.repeat(starts, counts) + beat_in_segment * np.repeat(
+        periods, counts)
+
+
+def generate_labels(segments, duration, beats_per_bar=4, downbeat=0,
+                    phrase_bars=PHRASE_BARS):
+    """
+    Generate the beat, bar and phrase times of a song in one pass.
+
+    Args:
+        segments: (start_seconds, bpm) pairs of the tempo map.
+        duration (float): End of the song in seconds.
+        beats_per_bar (int): Beats per bar.
+        downbeat (int): Index of the beat that starts bar 0.
+        phrase_bars: Phrase lengths in bars, e.g. (8, 16).
+
+    Returns:
+        dict: Maps "beats", "bars" and "phrase{n}" to arrays of times in seconds.
+    """
+    beats = generate_beat_times(segments, duration)
+    bars = beats[downbeat::beats_per_bar]
+    labels = {"beats": beats, "bars": bars}
+    for bars_per_phrase in phrase_bars:
+        labels[f"phrase{bars_per_phrase}"] = bars[::bars_per_phrase]
     return labels
 
+
+def format_labels(times, kind, label_format):
+    """Format label times as lines of an Audacity label file or of a timeline file."""
+    base_kind = "phrase" if kind.startswith("phrase") else kind
+    indices = np.arange(len(times))
+    if label_format == "audacity":
+        prefix = AUDACITY_PREFIXES[base_kind]
+        return [
+            f"{time:.6f}\t{time:.6f}\t{prefix} {index}"
+            for time, index in zip(times, indices)
+        ]
+    prefix = TIMELINE_PREFIXES[base_kind]
+    return [f"{prefix} {index}\t{time:.6f}" for time, index in zip(times, indices)]
+
+
+def label_file_name(song, kind, label_format):
+    if label_format == "audacity":
+        return f"{song}_{kind}_labels.txt"
+    return f"{song}_{kind}.txt"
+
+
+def export_labels(song, labels, output_dir, formats=FORMATS, overwrite=True):
+    """
+    Write label times to files.
+
+    Returns:
+        list: The paths written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for label_format in formats:
+        for kind, times in labels.items():
+            output_path = os.path.join(output_dir,
+                                       label_file_name(song, kind, label_format))
+            if os.path.exists(output_path) and not overwrite:
+                raise FileExistsError(f"{output_path} already exists")
+            with open(output_path, 'w') as f:
+                f.write('\n'.join(format_labels(times, kind, label_format)))
+            written.append(output_path)
+    return written
+
+
+def load_tempo_map(path):
+    """Read a tempo map file, returns (segments, duration, beats_per_bar, downbeat)."""
+    with open(path, 'r') as f:
+        tempo_map = json.load(f)
+    segments = [(segment["start"], segment["bpm"])
+                for segment in tempo_map["segments"]]
+    return (segments, tempo_map["duration"],
+            tempo_map.get("beats_per_bar", 4), tempo_map.get("downbeat", 0))
+
+
+def save_tempo_map(path, segments, duration, beats_per_bar=4, downbeat=0):
+    with open(path, 'w') as f:
+        json.dump(
+            {
+                "duration": duration,
+                "beats_per_bar": beats_per_bar,
+                "downbeat": downbeat,
+                "segments": [{
+                    "start": start,
+                    "bpm": bpm
+                } for start, bpm in segments],
+            },
+            f,
+            indent=4)
+
+
+def generate_all(song_structure_dir, output_root, formats):
+    """Generate the labels of every song directory that has a tempo map."""
+    num_songs = 0
+    for song in sorted(os.listdir(song_structure_dir)):
+        tempo_map_path = os.path.join(song_structure_dir, song, TEMPO_MAP_FILE)
+        if not os.path.exists(tempo_map_path):
+            continue
+        segments, duration, beats_per_bar, downbeat = load_tempo_map(
+            tempo_map_path)
+        labels = generate_labels(segments, duration, beats_per_bar, downbeat)
+        output_dir = os.path.join(output_root, song)
+        export_labels(song, labels, output_dir, formats)
+        print(f"{song}: {len(labels['beats'])} beats, {len(labels['bars'])} bars -> {output_dir}")
+        num_songs += 1
+    if not num_songs:
+        print(f"No song in {song_structure_dir} has a {TEMPO_MAP_FILE}")
+
+
 def main():
     parser = argparse.ArgumentParser(description='Generate Audacity labels based on BPM')
-    parser.add_argument('--bpm', type=float, required=True, help='Beats per minute')
-    parser.add_argument('--duration', type=float, required=True, help='Duration in seconds')
-    parser.add_argument('--type', type=str, required=True, choices=['beats', 'bars', 'phrase'],
-                      help='Type of labels to generate (beats, bars, or phrase)')
-    parser.add_argument('--song', type=str, required=True, help='Name of the song')
+    parser.add_argument('--bpm', type=float, help='Beats per minute')
+    parser.add_argument('--tempo-map', type=str,
+                        help="Tempo changes as start_seconds:bpm pairs, e.g. '0:120,64.5:128'")
+    parser.add_argument('--offset', type=float, default=0.0,
+                        help='Time of the first beat in seconds, with --bpm (default: 0)')
+    parser.add_argument('--duration', type=float, help='Duration in seconds')
+    parser.add_argument('--type', type=str, default='all', choices=['beats', 'bars', 'phrase', 'all'],
+                      help='Type of labels to generate (beats, bars, phrase, or all)')
+    parser.add_argument('--song', type=str, help='Name of the song')
     parser.add_argument('--bars-per-phrase', type=int, default=8, choices=[8, 16],
-                      help='Number of bars per phrase (default: 8, choices: 8 or 16)')
-    parser.add_argument('--output', type=str, help='Output file name (default: {song_name}_{bpm}bpm_{type}_labels.txt)')
-    
+                      help='Number of bars per phrase with --type phrase (default: 8, choices: 8 or 16)')
+    parser.add_argument('--beats-per-bar', type=int, default=4, help='Beats per bar (default: 4)')
+    parser.add_argument('--downbeat', type=int, default=0,
+                        help='Index of the beat that starts the first bar (default: 0)')
+    parser.add_argument('--format', type=str, default='audacity', choices=['audacity', 'timeline', 'both'],
+                        help='Audacity label files, SongProvider timeline files, or both (default: audacity)')
+    parser.add_argument('--output', type=str, help='Output file name, with a single --type and --format')
+    parser.add_argument('--output-dir', type=str, help='Output directory (default: music/utils/output)')
+    parser.add_argument('--all', action='store_true',
+                        help=f'Generate labels for every song in music/song_structure with a {TEMPO_MAP_FILE}')
+
     args = parser.parse_args()
-    
+    formats = FORMATS if args.format == 'both' else (args.format,)
+    output_dir = args.output_dir or OUTPUT_DIR
+
+    if args.all:
+        generate_all(SONG_STRUCTURE_DIR, output_dir, formats)
+        return
+
+    if not args.song or args.duration is None or not (args.bpm or args.tempo_map):
+        parser.error('--song, --duration and --bpm or --tempo-map are required without --all')
+    segments = parse_tempo_map(args.tempo_map) if args.tempo_map else [(args.offset, args.bpm)]
+
     # Generate labels
-    labels = generate_labels(args.bpm, args.duration, args.type, args.bars_per_phrase)
-    
-    # Create output directory if it doesn't exist
-    output_dir = os.path.join(os.path.dirname(__file__), 'output')
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Set default output filename if not provided
-    if not args.output:
-        if args.type == "phrase":
-            args.output = f"{args.song}_{args.type}{args.bars_per_phrase}_labels.txt"
-        else:
-            args.output = f"{args.song}_{args.type}_labels.txt"
-    
-    # Write to file in the output directory
-    output_path = os.path.join(output_dir, args.output)
-    with open(output_path, 'w') as f:
-        f.write('\n'.join(labels))
-    
-    print(f"Generated {len(labels)} {args.type} labels and saved to {output_path}")
+    labels = generate_labels(segments, args.duration, args.beats_per_bar, args.downbeat)
+    if args.type == 'phrase':
+        labels = {f"phrase{args.bars_per_phrase}": labels[f"phrase{args.bars_per_phrase}"]}
+    elif args.type != 'all':
+        labels = {args.type: labels[args.type]}
+
+    # Write to files in the output directory
+    if args.output:
+        if len(labels) != 1 or len(formats) != 1:
+            parser.error('--output needs a single --type and --format')
+        (kind, times), = labels.items()
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, args.output)
+        with open(output_path, 'w') as f:
+            f.write('\n'.join(format_labels(times, kind, formats[0])))
+        written = [output_path]
+    else:
+        written = export_labels(args.song, labels, output_dir, formats)
+
+    for kind, times in labels.items():
+        print(f"Generated {len(times)} {kind} labels")
+    print(f"Saved to {', '.join(written)}")
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from animation.beat_quantizer import describe_moves, quantize_effects
+from music.song_timeline import (POINT_FORMAT, LabelTrack, SongTimeline,
+                                 snap_to_grid)
+
+GRID = np.array([0.0, 500.0, 1000.0, 1500.0])
+
+
+def make_timeline(num_beats=8, beat_seconds=0.5):
+    beats = np.arange(num_beats) * beat_seconds
+    labels = [f"beat {index}" for index in range(num_beats)]
+    return SongTimeline(
+        "song", {"beats": LabelTrack(beats, beats, labels, POINT_FORMAT)})
+
+
+def make_animation(*boundaries):
+    return {
+        "animation": {
+            "duration_ms": 4000,
+            "effects": [{
+                "effect_number": number,
+                "effect_config": {
+                    "start_time": start,
+                    "end_time": end
+                }
+            } for number, (start, end) in enumerate(boundaries)]
+        }
+    }
+
+
+def get_boundaries(animation):
+    return [(effect["effect_config"]["start_time"],
+             effect["effect_config"]["end_time"])
+            for effect in animation["animation"]["effects"]]
+
+
+def test_snap_to_grid_within_tolerance():
+    snapped = snap_to_grid([490.0, 530.0, 760.0, 1010.0], GRID, 20.0)
+    assert np.array_equal(snapped, [500.0, 530.0, 760.0, 1000.0])
+
+
+def test_snap_to_grid_ties_go_to_the_earlier_point():
+    assert snap_to_grid([250.0], GRID, 300.0)[0] == 0.0
+
+
+def test_snap_to_grid_outside_the_grid():
+    snapped = snap_to_grid([-10.0, 1510.0, 3000.0], GRID, 20.0)
+    assert np.array_equal(snapped, [0.0, 1500.0, 3000.0])
+
+
+def test_snap_to_empty_grid_returns_a_copy():
+    times = np.array([1.0, 2.0])
+    snapped = snap_to_grid(times, np.empty(0), 20.0)
+    assert np.array_equal(snapped, times)
+    assert snapped is not times
+
+
+def test_quantize_effects_moves_boundaries_within_tolerance():
+    animation = make_animation((10, 490), (1200, 1520))
+    quantized, moves = quantize_effects(animation,
+                                        make_timeline(),
+                                        subdivision=1,
+                                        tolerance_ms=30)
+    assert get_boundaries(quantized) == [(0, 500), (1200, 1500)]
+    assert [(move["effect_number"], move["field"], move["from"], move["to"])
+            for move in moves] == [(0, "start_time", 10, 0),
+                                   (0, "end_time", 490, 500),
+                                   (1, "end_time", 1520, 1500)]
+    # The input is not modified
+    assert get_boundaries(animation) == [(10, 490), (1200, 1520)]
+
+
+def test_quantize_effects_uses_subdivisions():
+    quantized, _ = quantize_effects(make_animation((120, 380)),
+                                    make_timeline(),
+                                    subdivision=4,
+                                    tolerance_ms=10)
+    assert get_boundaries(quantized) == [(125, 375)]
+
+
+def test_quantize_effects_keeps_effects_that_would_collapse():
+    animation = make_animation((490, 510))
+    quantized, moves = quantize_effects(animation,
+                                        make_timeline(),
+                                        subdivision=1,
+                                        tolerance_ms=30)
+    assert quantized is animation
+    assert moves == []
+
+
+@pytest.mark.parametrize("animation", [
+    {},
+    {
+        "animation": {}
+    },
+    {
+        "animation": {
+            "effects": [{
+                "effect_config": {
+                    "start_time": None,
+                    "end_time": 10
+                }
+            }]
+        }
+    },
+])
+def test_quantize_effects_without_boundaries(animation):
+    assert quantize_effects(animation, make_timeline()) == (animation, [])
+
+
+def test_quantize_effects_without_beats():
+    animation = make_animation((10, 490))
+    assert quantize_effects(animation,
+                            SongTimeline("song", {})) == (animation, [])
+
+
+def test_describe_moves():
+    assert describe_moves([]).startswith("No effect boundaries")
+    moves = [{
+        "effect_number": number,
+        "field": "start_time",
+        "from": 10,
+        "to": 0
+    } for number in range(3)]
+    report = describe_moves(moves, max_listed=2)
+    assert report.startswith("Snapped 3 effect boundaries")
+    assert "effect 1 start_time: 10 -> 0 ms" in report
+    assert report.endswith("... and 1 more")
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from animation.frameworks.kivsee.renderer.float_functions import (
+    compile_float_function, evaluate_float_function)
+
+TIMES = np.linspace(0.0, 1.0, 11)
+
+
+def test_const_value():
+    values = evaluate_float_function({"const_value": {"value": 0.3}}, TIMES)
+    assert values.shape == TIMES.shape
+    assert np.allclose(values, 0.3)
+
+
+def test_linear():
+    values = evaluate_float_function({"linear": {"start": 1.0, "end": 0.0}},
+                                     TIMES)
+    assert np.allclose(values, 1.0 - TIMES)
+
+
+def test_sin_stays_between_min_and_max():
+    values = evaluate_float_function(
+        {"sin": {
+            "min": 0.2,
+            "max": 0.8,
+            "phase": 0.0,
+            "repeats": 2.0
+        }}, np.linspace(0.0, 1.0, 101))
+    assert values.min() >= 0.2 - 1e-9
+    assert values.max() <= 0.8 + 1e-9
+    assert np.isclose(values[0], 0.5)
+
+
+def test_steps_clamps_the_last_step():
+    values = evaluate_float_function(
+        {"steps": {
+            "first_step_value": 0.0,
+            "diff_per_step": 0.25,
+            "num_steps": 4
+        }}, [0.0, 0.26, 0.5, 0.99, 1.0])
+    assert np.allclose(values, [0.0, 0.25, 0.5, 0.75, 0.75])
+
+
+def test_steps_without_steps_is_constant():
+    values = evaluate_float_function(
+        {"steps": {
+            "first_step_value": 0.4,
+            "diff_per_step": 1.0,
+            "num_steps": 0
+        }}, TIMES)
+    assert np.allclose(values, 0.4)
+
+
+def test_repeat_wraps_the_relative_time():
+    values = evaluate_float_function(
+        {
+            "repeat": {
+                "numberOfTimes": 2,
+                "funcToRepeat": {
+                    "linear": {
+                        "start": 0.0,
+                        "end": 1.0
+                    }
+                }
+            }
+        }, [0.0, 0.25, 0.5, 0.75])
+    assert np.allclose(values, [0.0, 0.5, 0.0, 0.5])
+
+
+def test_half_switches_functions_at_the_middle():
+    values = evaluate_float_function(
+        {
+            "half": {
+                "f1": {
+                    "const_value": {
+                        "value": 1.0
+                    }
+                },
+                "f2": {
+                    "linear": {
+                        "start": 0.0,
+                        "end": 1.0
+                    }
+                }
+            }
+        }, [0.0, 0.49, 0.5, 0.75])
+    assert np.allclose(values, [1.0, 1.0, 0.0, 0.5])
+
+
+def test_comb2_weights_both_functions():
+    values = evaluate_float_function(
+        {
+            "comb2": {
+                "f1": {
+                    "const_value": {
+                        "value": 1.0
+                    }
+                },
+                "f2": {
+                    "linear": {
+                        "start": 0.0,
+                        "end": 1.0
+                    }
+                },
+                "amount1": 0.5,
+                "amount2": 2.0
+            }
+        }, TIMES)
+    assert np.allclose(values, 0.5 + 2.0 * TIMES)
+
+
+def test_compiled_function_is_reusable():
+    function = compile_float_function({"linear": {"start": 0.0, "end": 2.0}})
+    assert np.allclose(function(TIMES), 2.0 * TIMES)
+    assert np.allclose(function(TIMES[:3]), 2.0 * TIMES[:3])
+
+
+@pytest.mark.parametrize("float_function", [
+    {},
+    {
+        "linear": {
+            "start": 0,
+            "end": 1
+        },
+        "const_value": {
+            "value": 1
+        }
+    },
+])
+def test_requires_exactly_one_function_type(float_function):
+    with pytest.raises(ValueError):
+        compile_float_function(float_function)
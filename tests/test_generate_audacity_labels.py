@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from music.song_timeline import LabelTrack
+from music.utils.generate_audacity_labels import (export_labels,
+                                                  generate_beat_times,
+                                                  generate_labels,
+                                                  parse_tempo_map)
+
+
+def test_constant_tempo_keeps_a_beat_at_the_end():
+    beats = generate_beat_times([(0.0, 120.0)], 2.0)
+    assert np.allclose(beats, [0.0, 0.5, 1.0, 1.5, 2.0])
+
+
+def test_constant_tempo_ending_between_beats():
+    beats = generate_beat_times([(0.0, 120.0)], 1.7)
+    assert np.allclose(beats, [0.0, 0.5, 1.0, 1.5])
+
+
+def test_tempo_change_starts_a_new_beat():
+    beats = generate_beat_times([(0.0, 60.0), (2.5, 120.0)], 3.5)
+    assert np.allclose(beats, [0.0, 1.0, 2.0, 2.5, 3.0, 3.5])
+
+
+def test_segments_are_sorted_by_start():
+    assert np.allclose(
+        generate_beat_times([(2.0, 120.0), (0.0, 60.0)], 3.0),
+        generate_beat_times([(0.0, 60.0), (2.0, 120.0)], 3.0))
+
+
+def test_segment_boundary_on_a_beat_is_not_repeated():
+    beats = generate_beat_times([(0.0, 120.0), (1.0, 60.0)], 2.0)
+    assert np.allclose(beats, [0.0, 0.5, 1.0, 2.0])
+
+
+def test_segment_after_the_end_adds_no_beats():
+    beats = generate_beat_times([(0.0, 120.0), (5.0, 60.0)], 1.0)
+    assert np.allclose(beats, [0.0, 0.5, 1.0])
+
+
+def test_generate_labels_bars_and_phrases():
+    labels = generate_labels([(0.0, 120.0)],
+                             64.0,
+                             beats_per_bar=4,
+                             downbeat=1,
+                             phrase_bars=(8, ))
+    assert np.allclose(labels["bars"][:3], [0.5, 2.5, 4.5])
+    assert np.allclose(labels["phrase8"], labels["bars"][::8])
+
+
+def test_parse_tempo_map():
+    assert parse_tempo_map("0:120,32.5:128") == [(0.0, 120.0), (32.5, 128.0)]
+
+
+@pytest.mark.parametrize("label_format", ["audacity", "timeline"])
+def test_exported_labels_parse_back(tmp_path, label_format):
+    labels = generate_labels([(0.0, 97.0)], 30.0)
+    paths = export_labels("song",
+                          labels,
+                          str(tmp_path),
+                          formats=(label_format, ))
+    assert len(paths) == len(labels)
+    beats_path = next(path for path in paths if "_beats" in path)
+    track = LabelTrack.parse(beats_path)
+    assert np.allclose(track.starts, labels["beats"], atol=1e-6)
+
+
+def test_export_without_overwrite(tmp_path):
+    labels = generate_labels([(0.0, 120.0)], 4.0)
+    export_labels("song", labels, str(tmp_path), formats=("timeline", ))
+    with pytest.raises(FileExistsError):
+        export_labels("song",
+                      labels,
+                      str(tmp_path),
+                      formats=("timeline", ),
+                      overwrite=False)
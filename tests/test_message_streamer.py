@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from controller.message_streamer import (PREV_JOURNAL_FILE, MessageStreamer,
+                                         find_journal_to_resume, read_journal)
+
+
+@pytest.fixture
+def streamers(tmp_path):
+    created = []
+
+    def create(**kwargs):
+        streamer = MessageStreamer(snapshots_dir=str(tmp_path), **kwargs)
+        created.append(streamer)
+        return streamer
+
+    yield create
+    for streamer in created:
+        streamer.close()
+
+
+def test_new_streamer_does_not_resume(tmp_path, streamers):
+    crashed = streamers()
+    crashed.add_visible("user_input", "hello", context=True)
+    crashed.flush()
+
+    new = streamers()
+    assert new.messages == []
+    assert new.journal_path != crashed.journal_path
+    assert find_journal_to_resume(str(tmp_path)) == crashed.journal_path
+
+
+def test_resume_the_journal_of_a_crashed_session(tmp_path, streamers):
+    crashed = streamers()
+    crashed.add_visible("user_input", "hello", context=True)
+    crashed.add_invisible("system_internal", "internal", context=False)
+    crashed.flush()
+
+    resumed = streamers(resume_journal=True)
+    assert resumed.journal_path == crashed.journal_path
+    assert [message["content"] for message in resumed.messages] == [
+        "hello", "internal"
+    ]
+    assert resumed.get_stats()["context_count"] == 1
+
+    resumed.add_visible("assistant", "answer", context=True)
+    resumed.flush()
+    assert len(read_journal(resumed.journal_path)) == 3
+
+
+def test_resume_skips_a_partially_written_line(tmp_path, streamers):
+    crashed = streamers()
+    crashed.add_visible("user_input", "hello", context=True)
+    crashed.flush()
+    with open(crashed.journal_path, "a") as file:
+        file.write('{"tag": "assist')
+
+    resumed = streamers(resume_journal=True)
+    assert [message["content"] for message in resumed.messages] == ["hello"]
+    assert len(read_journal(resumed.journal_path)) == 1
+
+
+def test_closed_journal_is_not_resumed(tmp_path, streamers):
+    streamer = streamers()
+    streamer.add_visible("user_input", "hello", context=True)
+    streamer.close()
+
+    assert not os.path.exists(streamer.journal_path)
+    assert os.path.exists(os.path.join(str(tmp_path), PREV_JOURNAL_FILE))
+    assert find_journal_to_resume(str(tmp_path)) is None
+    assert streamers(resume_journal=True).messages == []
+
+
+def test_empty_journal_is_not_resumed(tmp_path, streamers):
+    streamers()
+    assert find_journal_to_resume(str(tmp_path)) is None
+
+
+def test_load_does_not_notify_subscribers(tmp_path, streamers):
+    snapshot_path = tmp_path / "messages.json"
+    snapshot_path.write_text(
+        json.dumps([{
+            "tag": "user_input",
+            "content": "one two",
+            "visible": True,
+            "context": True
+        }]))
+    streamer = streamers()
+    delivered = []
+    streamer.subscribe(callback=delivered.append)
+
+    streamer.load(str(snapshot_path))
+    assert delivered == []
+    assert streamer.get_stats()["total_words"] == 2
+    assert len(read_journal(streamer.journal_path)) == 1
+
+    streamer.add_visible("assistant", "new", context=True)
+    assert [message["content"] for message in delivered] == ["new"]
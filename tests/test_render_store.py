@@ -0,0 +1,121 @@
+import pytest
+
+from animation.frameworks.kivsee.renderer.render import Render, payload_digest
+
+
+class FakeResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = "ok" if status_code == 200 else "error"
+
+
+@pytest.fixture
+def render(tmp_path, monkeypatch):
+    # Render writes its upload logs to a path relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "animation/frameworks/kivsee/renderer").mkdir(parents=True)
+    render = Render()
+    render.uploads = []
+    render.status_code = 200
+
+    def put_request(url, payload):
+        render.uploads.append(url.rstrip("/").split("/")[-1])
+        return FakeResponse(render.status_code)
+
+    render._put_request = put_request
+    return render
+
+
+def make_animation(*effects):
+    return {
+        "name": "song",
+        "animation": {
+            "duration_ms": 4000,
+            "num_repeats": 1,
+            "effects": list(effects)
+        }
+    }
+
+
+def make_effect(element, hue, start_time=0, end_time=1000):
+    return {
+        "elements": [element],
+        "effect_config": {
+            "start_time": start_time,
+            "end_time": end_time,
+            "segments": ["all"]
+        },
+        "const_color": {
+            "color": {
+                "hue": hue,
+                "sat": 1.0,
+                "val": 1.0
+            }
+        }
+    }
+
+
+def test_payload_digest_ignores_key_order():
+    assert payload_digest({"a": 1, "b": [1, 2]}) == payload_digest({
+        "b": [1, 2],
+        "a": 1
+    })
+    assert payload_digest({"a": 1}) != payload_digest({"a": 2})
+    assert payload_digest({"a": [1, 2]}) != payload_digest({"a": [2, 1]})
+
+
+def test_unchanged_elements_are_skipped(render):
+    animation = make_animation(make_effect("ring7", 0.1),
+                               make_effect("ring8", 0.2))
+    report = render.store_animation(render.preprocess_animation(animation))
+    assert sorted(report["succeeded"]) == ["ring7", "ring8"]
+
+    render.uploads.clear()
+    animation = make_animation(make_effect("ring7", 0.1),
+                               make_effect("ring8", 0.5))
+    report = render.store_animation(render.preprocess_animation(animation))
+    assert report["skipped"] == ["ring7"]
+    assert report["succeeded"] == ["ring8"]
+    assert render.uploads == ["ring8"]
+
+
+def test_force_uploads_every_element(render):
+    preprocessed = render.preprocess_animation(
+        make_animation(make_effect("ring7", 0.1)))
+    render.store_animation(preprocessed)
+    report = render.store_animation(preprocessed, force=True)
+    assert report["succeeded"] == ["ring7"]
+    assert report["skipped"] == []
+
+
+def test_failed_upload_is_retried(render):
+    preprocessed = render.preprocess_animation(
+        make_animation(make_effect("ring7", 0.1)))
+    render.status_code = 503
+    report = render.store_animation(preprocessed)
+    assert report["failed"] == ["ring7"]
+
+    render.status_code = 200
+    report = render.store_animation(preprocessed)
+    assert report["succeeded"] == ["ring7"]
+
+
+def test_digests_are_kept_per_animation_name(render):
+    animation = make_animation(make_effect("ring7", 0.1))
+    render.store_animation(render.preprocess_animation(animation))
+    report = render.store_animation(
+        render.preprocess_animation({
+            **animation, "name": "other_song"
+        }))
+    assert report["succeeded"] == ["ring7"]
+
+
+def test_clear_stored_digests(render):
+    preprocessed = render.preprocess_animation(
+        make_animation(make_effect("ring7", 0.1)))
+    render.store_animation(preprocessed)
+    render.clear_stored_digests("song")
+    report = render.store_animation(preprocessed)
+    assert report["succeeded"] == ["ring7"]
+
@@ -0,0 +1,107 @@
+import pytest
+from pydantic import BaseModel
+
+from controller.response_cache import ResponseCache
+
+
+class Answer(BaseModel):
+    text: str
+
+
+class OtherAnswer(BaseModel):
+    number: int
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr("controller.response_cache.time.time",
+                        lambda: clock["now"])
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return ResponseCache(str(tmp_path / "cache" / "responses.sqlite"),
+                         max_bytes=30,
+                         ttl_seconds=60)
+
+
+def test_put_and_get(cache):
+    assert cache.get("a") is None
+    cache.put("a", '{"text": "one"}')
+    assert cache.get("a") == '{"text": "one"}'
+    assert cache.get_stats() == {
+        "entries": 1,
+        "size_bytes": 15,
+        "hits": 1,
+        "misses": 1
+    }
+
+
+def test_put_replaces_an_entry(cache):
+    cache.put("a", "1")
+    cache.put("a", "22")
+    assert cache.get("a") == "22"
+    assert cache.get_stats()["size_bytes"] == 2
+
+
+def test_entries_expire_after_the_ttl(cache, clock):
+    cache.put("a", "1")
+    clock["now"] += 60
+    assert cache.get("a") == "1"
+    clock["now"] += 1
+    assert cache.get("a") is None
+    # The expired entry is deleted on the next write
+    assert cache.get_stats()["entries"] == 1
+    cache.put("b", "2")
+    assert cache.get_stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(cache, clock):
+    for key in ("a", "b", "c"):
+        cache.put(key, "x" * 10)
+        clock["now"] += 1
+    cache.get("a")
+    clock["now"] += 1
+
+    cache.put("d", "x" * 10)
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in ("a", "c", "d")] == [
+        True, True, True
+    ]
+    assert cache.get_stats()["size_bytes"] == 30
+
+
+def test_entry_larger_than_the_cache_is_not_kept(cache):
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 31)
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_cache_is_kept_on_disk(tmp_path, clock):
+    path = str(tmp_path / "responses.sqlite")
+    ResponseCache(path).put("a", "1")
+    assert ResponseCache(path).get("a") == "1"
+
+
+def test_make_key(cache):
+    key = cache.make_key("model", 0.5, Answer, MESSAGES)
+    marked = [{**MESSAGES[0], "cache_control": {"type": "ephemeral"}}]
+    assert cache.make_key("model", 0.5, Answer, marked) == key
+    assert cache.make_key("other", 0.5, Answer, MESSAGES) != key
+    assert cache.make_key("model", 0.7, Answer, MESSAGES) != key
+    assert cache.make_key("model", 0.5, OtherAnswer, MESSAGES) != key
+    assert cache.make_key("model", 0.5, Answer,
+                          [{"role": "user", "content": "bye"}]) != key
+
+
+def test_clear(cache):
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+from animation.frameworks.sequence_step import SequenceStep
+from animation.frameworks.step_history import (StepHistory, apply_patch,
+                                               apply_text_delta, diff_effects,
+                                               make_patch, make_text_delta,
+                                               natural_key)
+
+
+def make_step(num_effects, hue=0.5):
+    return {
+        "name": "song",
+        "animation": {
+            "duration_ms": 10000,
+            "num_repeats": 1,
+            "effects": [{
+                "effect_number": number,
+                "elements": ["ring7"],
+                "effect_config": {
+                    "start_time": number * 100,
+                    "end_time": number * 100 + 100
+                },
+                "const_color": {
+                    "color": {
+                        "hue": hue,
+                        "sat": 1.0,
+                        "val": 1.0
+                    }
+                }
+            } for number in range(num_effects)]
+        }
+    }
+
+
+@pytest.mark.parametrize("old, new", [
+    ({"a": 1}, {"a": 2}),
+    ({"a": 1}, {"b": 1}),
+    ({"a": [1, 2, 3]}, {"a": [1, 5, 3]}),
+    ({"a": [1, 2, 3]}, {"a": [1, 3]}),
+    ({"a": [1, 3]}, {"a": [1, 2, 2, 3]}),
+    ({"a/b": {"c~d": 1}}, {"a/b": {"c~d": 2}}),
+    ({"a": {"b": 1}}, {"a": [1]}),
+    ([1, 2], {"a": 1}),
+])
+def test_patch_round_trip(old, new):
+    patched = apply_patch(json.loads(json.dumps(old)), make_patch(old, new))
+    assert patched == new
+
+
+def test_patch_keeps_value_types():
+    old = {"a": 1, "b": [1, 2], "c": 0}
+    new = {"a": True, "b": [1.0, 2], "c": 0}
+    patched = apply_patch(json.loads(json.dumps(old)), make_patch(old, new))
+    assert [type(patched["a"]), type(patched["b"][0])] == [bool, float]
+
+
+def test_patch_values_are_copies():
+    new = {"a": {"b": [1]}}
+    ops = make_patch({}, new)
+    new["a"]["b"].append(2)
+    assert apply_patch({}, ops) == {"a": {"b": [1]}}
+
+
+@pytest.mark.parametrize("checkpoint_interval", [1, 3, 10])
+def test_dict_steps_round_trip(tmp_path, checkpoint_interval):
+    steps = [make_step(num_effects) for num_effects in range(12)]
+    steps[5] = make_step(5, hue=0.9)
+    history = StepHistory(steps, checkpoint_interval=checkpoint_interval)
+    assert list(history) == steps
+
+    path = tmp_path / "history.jsonl"
+    history.dump(str(path))
+    loaded = StepHistory.load(str(path))
+    assert list(loaded) == steps
+    # Read the steps out of order, so they are rebuilt from the checkpoints
+    assert [loaded[index] for index in (7, 2, 11, 0)] == [
+        steps[7], steps[2], steps[11], steps[0]
+    ]
+
+
+def test_text_steps_keep_their_text(tmp_path):
+    texts = []
+    for num_effects in range(8):
+        step = make_step(num_effects)
+        if num_effects % 3 == 0:
+            texts.append(json.dumps(step, indent=4))
+        elif num_effects % 3 == 1:
+            texts.append(json.dumps(step, indent=2))
+        else:
+            texts.append(json.dumps(step))
+    texts.insert(4, "not json")
+    history = StepHistory(texts, checkpoint_interval=3)
+
+    path = tmp_path / "history.jsonl"
+    history.dump(str(path))
+    loaded = StepHistory.load(str(path))
+    assert [loaded[index] for index in range(len(texts))] == texts
+    assert not loaded.get_step(4).is_json()
+
+
+def test_non_indented_text_is_stored_as_deltas():
+    texts = [json.dumps(make_step(num_effects)) for num_effects in range(5)]
+    history = StepHistory(texts, checkpoint_interval=10)
+    records = history._records
+    assert "text" in records[0]
+    assert all("text" not in record for record in records[1:])
+    assert all("text_delta" in record for record in records[1:])
+
+
+def test_append_sequence_step():
+    history = StepHistory()
+    history.append(SequenceStep(make_step(1)))
+    history.append(make_step(2))
+    assert history.get_step(-1).data == make_step(2)
+    assert history[0] == make_step(1)
+    with pytest.raises(IndexError):
+        history.get_step(2)
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text(json.dumps({"format": "other"}) + "\n")
+    with pytest.raises(ValueError):
+        StepHistory.load(str(path))
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", "abc"),
+    ("abc", ""),
+    ("abcdef", "abXYef"),
+    ("aaa", "aaaa"),
+    ("same", "same"),
+])
+def test_text_delta_round_trip(old, new):
+    assert apply_text_delta(old, make_text_delta(old, new)) == new
+
+
+def test_diff_effects():
+    old = make_step(3)
+    new = make_step(4)
+    new["animation"]["effects"][1]["const_color"]["color"]["hue"] = 0.1
+    del new["animation"]["effects"][0]
+    new["animation"]["duration_ms"] = 20000
+    assert diff_effects(old, new) == {
+        "added": [3],
+        "changed": [1],
+        "removed": [0],
+        "fields": ["/animation/duration_ms"],
+    }
+
+
+def test_natural_key():
+    names = ["animation_10", "animation_2", "animation_1"]
+    assert sorted(names, key=natural_key) == [
+        "animation_1", "animation_2", "animation_10"
+    ]
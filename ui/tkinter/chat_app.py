@@ -21,6 +21,7 @@ from controller.message_streamer import (
     TAG_SYSTEM,
     TAG_SYSTEM_INTERNAL,
     TAG_ACTION_RESULTS,
+    find_journal_to_resume,
 )
 from constants import MODEL_CONFIGS
 from schemes.kivsee_scheme.effects_scheme import ELEMENT_WORLDS
@@ -42,6 +43,7 @@ CHAT_FONT = "Verdana"
 active_chat_snapshot = None
 
 controller = None  # Will be initialized dynamically based on selected snapshot
+message_subscription = None  # Pushes the controller's new messages to the chat window
 active_chat_button = None  # Store the currently active chat button
 button_mapping = {}  # Dictionary to store button references
 
@@ -85,6 +87,8 @@ def initialize_logic_controller(a_snapshot):  # Updated function name
     """Initialize the LogicPlusPlus with the selected snapshot folder."""
     global controller
     snapshot_path = os.path.abspath(os.path.join(SNAPSHOTS_DIR, a_snapshot))
+    # Close the old chat's journal, so it is not resumed as a crashed session
+    close_current_chat()
     controller = LogicPlusPlus(snapshot_path)
 
 
@@ -272,32 +276,45 @@ def update_active_chat_label(button_name):
 
 
 def refresh():
-    """Refresh the chat window with new messages and save the current state."""
-    # Get any new messages that were added
-    new_messages = controller.msgs.get_new_messages()
-    # Update UI with new messages
-    for tag, message, context, visible in new_messages:
-        # Determine message type based on tag
-        if tag == TAG_USER_INPUT or tag == TAG_ACTION_RESULTS:
-            type_name = TYPE_USER
-        elif tag == TAG_ASSISTANT:
-            type_name = TYPE_ASSISTANT
-        elif tag == TAG_SYSTEM_INTERNAL:
-            type_name = TYPE_INTERNAL
-        elif tag == TAG_SYSTEM:
-            type_name = TYPE_SYSTEM
-        else:
-            type_name = TYPE_INTERNAL
+    """Make sure the chat window is subscribed to the current controller's messages.
+    Messages are pushed to the window as they are added, including mid-turn, so this
+    only needs to run when the controller or its message streamer may have changed."""
+    global message_subscription
+    if not controller or not controller.msgs:
+        return
+    if message_subscription and message_subscription.streamer is controller.msgs:
+        return
+    if message_subscription:
+        message_subscription.unsubscribe()
+    # Deliver what get_new_messages would have returned, then every new message
+    message_subscription = controller.msgs.subscribe(
+        callback=lambda msg: root.after(0, lambda m=msg: display_new_message(m)),
+        since=controller.msgs.last_checked_index)
+    controller.msgs.last_checked_index = len(controller.msgs.messages)
+
+
+def display_new_message(msg):
+    """Show a message pushed by the message streamer in the chat window."""
+    tag, message, context, visible = (msg['tag'], msg['content'],
+                                      msg['context'], msg['visible'])
+    # Determine message type based on tag
+    if tag == TAG_USER_INPUT or tag == TAG_ACTION_RESULTS:
+        type_name = TYPE_USER
+    elif tag == TAG_ASSISTANT:
+        type_name = TYPE_ASSISTANT
+    elif tag == TAG_SYSTEM_INTERNAL:
+        type_name = TYPE_INTERNAL
+    elif tag == TAG_SYSTEM:
+        type_name = TYPE_SYSTEM
+    else:
+        type_name = TYPE_INTERNAL
 
-        if type_name == TYPE_INTERNAL and not controller.config.get(
-                "print_internal_messages", False):
-            continue
+    if type_name == TYPE_INTERNAL and not controller.config.get(
+            "print_internal_messages", False):
+        return
 
-        # Schedule message display
-        sender_name = get_sender_name(type_name)
-        root.after(0,
-                   lambda s=sender_name, m=message, c=context, v=visible:
-                   append_message_to_window(s, m, c, v))
+    sender_name = get_sender_name(type_name)
+    append_message_to_window(sender_name, message, context, visible)
 
 
 def send_message(event=None):
@@ -380,7 +397,10 @@ def close_current_chat():
     """Gracefully close the current chat controller and terminate threads."""
     global controller, active_chat_snapshot
     if controller:
-        # Don't call shutdown here, just clear references
+        # Don't call shutdown here (it saves a snapshot), only close the message
+        # journal so it is not taken for the journal of a crashed session
+        if controller.msgs:
+            controller.msgs.close()
         controller = None
         active_chat_snapshot = None
 
@@ -649,6 +669,7 @@ def batch_insert_messages(messages):
 def initialize_untitled_chat():
     """Initialize a new untitled chat session with consistent welcome messages."""
     global controller, active_chat_snapshot
+    close_current_chat()
     controller = LogicPlusPlus()
     active_chat_snapshot = "untitled"
 
@@ -666,6 +687,30 @@ def initialize_untitled_chat():
     chat_window.config(state=tk.DISABLED)
     update_active_chat_label("untitled")
     update_animation_data()
+    refresh()
+
+
+def _resume_unclosed_chat():
+    """Start an untitled chat with the messages recovered from the journal of a session that did not close."""
+    global controller, active_chat_snapshot
+    controller = LogicPlusPlus(resume_journal=True)
+    active_chat_snapshot = "untitled"
+
+    chat_window.config(state=tk.NORMAL)
+    chat_window.delete("1.0", tk.END)
+    batch_insert_messages(controller.get_chat_history())
+    message = "Recovered the messages of a chat that was not closed. Save it to keep them."
+    update_chat_window(get_label_tag(TYPE_SYSTEM),
+                       get_sender_name(TYPE_SYSTEM), message)
+    print_system_info()
+
+    chat_window.config(state=tk.DISABLED)
+    update_active_chat_label("untitled")
+    update_animation_data()
+
+    # The history is already shown, only push messages added from now on
+    controller.msgs.last_checked_index = len(controller.msgs.messages)
+    refresh()
 
 
 def _load_untitled_chat():
@@ -713,6 +758,10 @@ def _load_chat(a_snapshot):
         update_active_chat_label(a_snapshot)
         update_animation_data()
 
+        # The history is already shown, only push messages added from now on
+        controller.msgs.last_checked_index = len(controller.msgs.messages)
+        refresh()
+
         controller.msgs.clear_control_flags()
         update_chat_window(get_label_tag(TYPE_INTERNAL),
                            get_sender_name(TYPE_INTERNAL),
@@ -807,8 +856,11 @@ def populate_snapshot_list():
 
     canvas.bind("<Configure>", update_buttons_width)
 
-    # Load the last chat if snapshots exist, otherwise load untitled
-    if snapshot_folders:
+    # Recover a chat that was not closed (e.g. after a crash), otherwise load
+    # the last chat if snapshots exist, or untitled
+    if find_journal_to_resume(SNAPSHOTS_DIR):
+        _resume_unclosed_chat()
+    elif snapshot_folders:
         # Sort snapshots by name (which includes timestamp) to get the most recent
         last_snapshot = sorted(snapshot_folders)[-1]
         _load_chat(last_snapshot)
@@ -912,6 +964,7 @@ def restart_with_latest_sequence():
         # Initialize new controller with restart config
         controller = LogicPlusPlus(restart_config=old_controller)
         active_chat_snapshot = "untitled"
+        old_controller.msgs.close()
 
         # Clear chat window
         chat_window.config(state=tk.NORMAL)
@@ -975,6 +1028,10 @@ def reduce_tokens():
             update_chat_window(get_label_tag(TYPE_SYSTEM),
                                get_sender_name(TYPE_SYSTEM), message)
 
+        # The new history is already shown, only push messages added from now on
+        controller.msgs.last_checked_index = len(controller.msgs.messages)
+        refresh()
+
         # Update status
         save_status_label.config(text=result, fg="light gray")
 
@@ -1061,6 +1118,7 @@ def initialize_from_config(config, chat_name):
     """
     global controller, active_chat_snapshot, button_mapping
     
+    close_current_chat()
     # No need to set world in EffectProto directly - it will be handled by KivseeFramework
     controller = LogicPlusPlus(new_config=config)
     
@@ -1101,6 +1159,8 @@ def initialize_from_config(config, chat_name):
 
     update_active_chat_label(chat_name)
     update_animation_data()
+    # Stream messages (e.g. skeleton build status) to the window as they are added
+    refresh()
 
     # Save the initial state
     save_message = controller.save_snapshot(chat_name)